@@ -130,6 +130,53 @@ CACHES = {
     }
 }
 
+# Answer dashboard requests from the call_cube materialized view when their
+# filters allow it.
+USE_CALL_CUBE = True
+
+# Estimate response time quartiles from the call_response_time_sketch
+# materialized view when the filters allow it. See core/sketches.py for the
+# error bound.
+USE_RESPONSE_TIME_SKETCHES = True
+
+# Take the bounds (and counts) of requests that only filter by date from the
+# daily stats materialized views rather than scanning the filtered rows.
+USE_DAILY_STATS = True
+
+# Counts of calls the planner expects to be at least this large are given as
+# its estimate rather than counted, unless a request asks for `exact=1`.
+# None always counts.
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+# How long dashboard results stay cached. Cache keys include each agency's
+# data version, so loading data invalidates them regardless.
+SUMMARY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How long the rows of the dimension models (beats, natures, units, shift
+# schedules and so on; see core/dimensions.py) stay in the cache, and how many
+# seconds each process may go without checking whether they've changed.
+DIMENSION_CACHE_TIMEOUT = 60 * 60
+DIMENSION_CHECK_INTERVAL = 5
+
+# The number of threads (and so extra database connections per process) used
+# to compute independent dashboard sections concurrently. 0 or 1 computes
+# them one after another on the request's own connection.
+SUMMARY_SECTION_WORKERS = 0
+
+# A local directory for the memory-mapped columnar copy of each agency's
+# calls (see core/columnar.py), which answers dashboard requests without
+# querying the database. None disables it.
+COLUMN_STORE_DIR = None
+
+# A file the API views append the filters of each request to, as JSON lines,
+# for the advise_indexes command to propose indexes from. None disables it.
+FILTER_USAGE_LOG = None
+
+# A local directory the run_export_jobs command writes the files of
+# background export jobs to (see core/export_jobs.py), and they're
+# downloaded from. None disables export jobs.
+EXPORT_JOB_DIR = None
+
 # Testing
 
 TEST_RUNNER = "cfs.test_runner.ManagedModelTestRunner"
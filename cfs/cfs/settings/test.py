@@ -10,6 +10,26 @@ INSTALLED_APPS += (
     'django_nose',
 )
 
+# Materialized views aren't refreshed as test data is created.
+USE_CALL_CUBE = False
+USE_RESPONSE_TIME_SKETCHES = False
+USE_DAILY_STATS = False
+
+# Keep counts exact, since planner estimates depend on table statistics.
+ESTIMATED_COUNT_THRESHOLD = None
+
+# Rolling back a test's transaction also undoes any change to the dimensions'
+# generation, so check it every time.
+DIMENSION_CHECK_INTERVAL = 0
+
+# Test transactions are rolled back without sending the signals that keep
+# cached data (like core.dimensions) up to date, so don't cache anything.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': True
@@ -20,6 +20,13 @@ urlpatterns = [
         views.APICallResponseTimeView.as_view()),
     url(r'^api/(?P<agency_code>[A-Za-z0-9]+)/call_map/',
         views.APICallMapView.as_view()),
+    url(r'^api/(?P<agency_code>[A-Za-z0-9]+)/call_tiles/(?P<z>\d+)/(?P<x>\d+)/'
+        r'(?P<y>\d+)\.pbf$',
+        views.APICallTileView.as_view(), name="call_tiles"),
+    url(r'^api/(?P<agency_code>[A-Za-z0-9]+)/exports/$',
+        views.ExportJobListView.as_view(), name="export_jobs"),
+    url(r'^api/(?P<agency_code>[A-Za-z0-9]+)/exports/(?P<export_job_id>\d+)/$',
+        views.ExportJobView.as_view(), name="export_job"),
     url(r'^api/', include(router.urls)),
     url(r'^docs/', include('rest_framework_swagger.urls')),
     url(r'^$', views.LandingPageView.as_view()),
@@ -33,6 +40,10 @@ urlpatterns = [
         name="calls"),
     url(r'^(?P<agency_code>[A-Za-z0-9]+)/calls.csv$',
         views.CallExportView.as_view(), name="calls_csv"),
+    url(r'^(?P<agency_code>[A-Za-z0-9]+)/calls\.(?P<format>parquet|arrow)$',
+        views.CallColumnarExportView.as_view(), name="calls_columnar"),
+    url(r'^(?P<agency_code>[A-Za-z0-9]+)/exports/(?P<export_job_id>\d+)/download$',
+        views.ExportJobDownloadView.as_view(), name="export_job_download"),
     url(r'^(?P<agency_code>[A-Za-z0-9]+)/call_map/$', views.MapView.as_view(),
         name="call_map")
 ]
@@ -5,9 +5,10 @@ from solo.admin import SingletonModelAdmin
 from adminsortable.admin import SortableAdmin
 from .models import Agency, Beat, Bureau, CallSource, CallUnit, City, \
     CloseCode, \
-    District, Division, Nature, NatureGroup, \
+    District, Division, ExportJob, Nature, NatureGroup, \
     Officer, \
-    Priority, Shift, ShiftUnit, SiteConfiguration, Squad, \
+    Priority, Shift, ShiftPeriod, ShiftSchedule, ShiftUnit, \
+    SiteConfiguration, Squad, \
     Transaction, Unit, Department
 
 
@@ -76,6 +77,14 @@ class ShiftUnitInline(admin.TabularInline):
     extra = 0
 
 
+class ShiftPeriodInline(admin.TabularInline):
+    model = ShiftPeriod
+    extra = 0
+    formfield_overrides = {
+        models.TextField: {'widget': TextInput}
+    }
+
+
 # model admin classes
 
 @admin.register(Agency)
@@ -177,6 +186,15 @@ class DivisionAdmin(admin.ModelAdmin):
     }
 
 
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('export_job_id', 'agency', 'file_format', 'status',
+                    'rows_written', 'created_at', 'finished_at',)
+    list_filter = ('agency', 'status',)
+    readonly_fields = ('rows_total', 'rows_written', 'error', 'created_at',
+                       'started_at', 'progress_saved_at', 'finished_at',)
+
+
 @admin.register(Nature)
 class NatureAdmin(admin.ModelAdmin):
     formfield_overrides = {
@@ -212,6 +230,12 @@ class ShiftAdmin(admin.ModelAdmin):
     inlines = [ShiftUnitInline]
 
 
+@admin.register(ShiftSchedule)
+class ShiftScheduleAdmin(admin.ModelAdmin):
+    list_display = ('agency', 'starts_on', 'rotation_days',)
+    inlines = [ShiftPeriodInline]
+
+
 @admin.register(ShiftUnit)
 class ShiftUnitAdmin(admin.ModelAdmin):
     pass
@@ -0,0 +1,96 @@
+from collections import OrderedDict
+
+from django.db import connection
+
+
+class GroupingSetsQuery:
+    """
+    Computes several GROUP BY breakdowns of a queryset in a single pass.
+
+    The queryset is compiled into a CTE, each dimension is computed once per
+    row, and the breakdowns are expressed as GROUPING SETS so Postgres only
+    has to scan the filtered rows one time. Requires PostgreSQL 9.5 or later.
+
+    Dimensions are SQL expressions over the columns selected by the queryset
+    (so use `.values()` to pick those columns). Their names must not collide
+    with the names of those columns. Measures are SQL aggregate expressions.
+    """
+
+    def __init__(self, qs, dimensions, measures):
+        self.qs = qs
+        self.dimensions = OrderedDict(dimensions)
+        self.measures = OrderedDict(measures)
+        self.sets = OrderedDict()
+
+    def add_set(self, name, *dimensions):
+        for dimension in dimensions:
+            if dimension not in self.dimensions:
+                raise ValueError("Unknown dimension: {}".format(dimension))
+        self.sets[name] = dimensions
+        return self
+
+    def grouping_mask(self, dimensions):
+        """
+        The value GROUPING() returns for rows from the given grouping set.
+
+        GROUPING() sets a bit for each argument that is *not* part of the
+        row's grouping set, with the first argument as the high bit.
+        """
+        names = list(self.dimensions)
+        mask = 0
+        for idx, name in enumerate(names):
+            if name not in dimensions:
+                mask |= 1 << (len(names) - idx - 1)
+        return mask
+
+    def sql_with_params(self):
+        cte_sql, params = self.qs.query.sql_with_params()
+        dimension_names = ", ".join(self.dimensions)
+
+        sql = """
+        WITH filtered AS (
+          {cte_sql}
+        ), dimensioned AS (
+          SELECT filtered.*, {dimensions}
+          FROM filtered
+        )
+        SELECT
+          GROUPING({dimension_names}) AS grouping_mask,
+          {dimension_names},
+          {measures}
+        FROM dimensioned
+        GROUP BY GROUPING SETS ({sets})
+        """.format(
+            cte_sql=cte_sql,
+            dimensions=", ".join("{} AS {}".format(expr, name)
+                                 for name, expr in self.dimensions.items()),
+            dimension_names=dimension_names,
+            measures=", ".join("{} AS {}".format(expr, name)
+                               for name, expr in self.measures.items()),
+            sets=", ".join("({})".format(", ".join(dimensions))
+                           for dimensions in self.sets.values()))
+
+        return sql, params
+
+    def execute(self):
+        """
+        Run the query and return a dict mapping each grouping set's name to
+        a list of row dicts. Each row contains that set's dimensions and all
+        of the measures.
+        """
+        masks = {self.grouping_mask(dimensions): name
+                 for name, dimensions in self.sets.items()}
+        results = OrderedDict((name, []) for name in self.sets)
+
+        sql, params = self.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            columns = [col[0] for col in cursor.description]
+            for row in cursor.fetchall():
+                row = dict(zip(columns, row))
+                name = masks[row.pop('grouping_mask')]
+                results[name].append(
+                    {k: v for k, v in row.items()
+                     if k in self.measures or k in self.sets[name]})
+
+        return results
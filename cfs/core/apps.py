@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
+
+
+class CoreConfig(AppConfig):
+    name = 'core'
+    verbose_name = 'Core'
+
+    def ready(self):
+        from core.dimensions import DIMENSION_MODELS, invalidate_dimensions
+
+        for model_name in DIMENSION_MODELS:
+            model = self.get_model(model_name)
+            post_save.connect(invalidate_dimensions, sender=model,
+                              dispatch_uid='invalidate_dimensions_' + model_name)
+            post_delete.connect(invalidate_dimensions, sender=model,
+                                dispatch_uid='invalidate_dimensions_' + model_name)
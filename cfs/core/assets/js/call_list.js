@@ -63,50 +63,55 @@ var callList = new Page({
     data: {
         page: 1,
         perPage: 50,
+        count: 0,
+        countExact: true,
         calls: {},
         config: SITE_CONFIG
     },
     computed: {
         topCount: function () {
             var count = this.get("page") * this.get("perPage");
-            return Math.min(this.get("calls.count"), count);
+            return Math.min(this.get("count"), count);
         },
         maxPage: function () {
-            return Math.ceil(this.get("calls.count") / this.get("perPage"));
+            return Math.ceil(this.get("count") / this.get("perPage"));
         }
     },
     filterUpdated: function (filter) {
         this.set("page", 1);
-        this.reloadCalls(filter, 1);
+        this.loadCalls(buildFirstPageURL(apiURL, filter));
     },
-    reloadCalls: function (filter, page) {
+    // Pages are fetched by cursor, so each costs the same however far into
+    // the list it is. Only the first page asks for the count.
+    loadCalls: function (url) {
         this.set("loading", true);
-        d3.json(
-            buildURLWithPage(apiURL, filter, page), _.bind(
-                function (error, newCalls) {
-                    if (error) throw error;
-                    this.set("loading", false);
-                    this.set("initialload", false);
-                    newCalls = cleanupData(newCalls);
-                    this.set("calls", newCalls);
-                }, this));
+        d3.json(url, _.bind(
+            function (error, newCalls) {
+                if (error) throw error;
+                this.set("loading", false);
+                this.set("initialload", false);
+                newCalls = cleanupData(newCalls);
+                if (newCalls.count !== undefined) {
+                    this.set("count", newCalls.count);
+                    this.set("countExact", newCalls.count_exact);
+                }
+                this.set("calls", newCalls);
+            }, this));
     }
 });
 
-callList.observe("page", function (newPage) {
-    callList.reloadCalls(callList.get("filter"), newPage);
-});
-
 callList.on("Pagination.nextPage", _.bind(function () {
-    if (this.get("page") < this.get("maxPage")) {
+    if (this.get("calls.next")) {
         this.set("page", this.get("page") + 1);
+        this.loadCalls(this.get("calls.next"));
     }
     return false;
 }, callList));
 
 callList.on("Pagination.prevPage", _.bind(function () {
-    if (this.get("page") > 1) {
+    if (this.get("calls.previous")) {
         this.set("page", this.get("page") - 1);
+        this.loadCalls(this.get("calls.previous"));
     }
     return false;
 }, callList));
@@ -121,8 +126,9 @@ function cleanupData(data) {
     return data;
 }
 
-function buildURLWithPage(url, filter, page) {
+function buildFirstPageURL(url, filter) {
     var params = cloneFilter(callList);
-    params.page = page;
+    params.cursor = "";
+    params.count = "true";
     return buildURL(url, params);
 }
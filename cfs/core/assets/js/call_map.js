@@ -11,7 +11,6 @@ import Q from "q";
 import L from "leaflet";
 import d3 from "d3";
 import _ from "underscore-contrib";
-import proj4 from "proj4";
 
 import "leaflet-easybutton";
 
@@ -24,8 +23,6 @@ var PruneCluster = Cluster.PruneCluster;
 
 var url = "/api/" + AGENCY.code + "/call_map/";
 
-var wgs84 = "+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs";
-
 var dashboard = new Page({
     el: document.getElementById("dashboard"),
     template: require("../templates/call_map.html"),
@@ -35,7 +32,20 @@ var dashboard = new Page({
         data: {}
     },
     filterUpdated: function (filter) {
-        d3.json(buildURL(url, filter), _.bind(function (error, newData) {
+        this.filter = filter;
+        this.fetch();
+    },
+    fetch: function () {
+        // The server sends clusters rather than points when there are many
+        // calls in the part of the map in view.
+        var params = {};
+        if (map && map.map) {
+            params.zoom = map.map.getZoom();
+            params.bbox = map.map.getBounds().toBBoxString();
+        }
+
+        d3.json(buildURL(url, _.extend({}, this.filter, params)),
+                _.bind(function (error, newData) {
             if (error) throw error;
             this.set("loading", false);
             this.set("initialload", false);
@@ -44,64 +54,28 @@ var dashboard = new Page({
     }
 });
 
-function cleanData(data) {
-    var locations = data.locations.map(function (datum) {
-        var loc = [datum[0], datum[1]];
-
-        if (AGENCY.projection) {
-            loc = proj4(AGENCY.projection, wgs84, [loc[1], loc[0]]);
-            if (Math.random() < 0.01) {
-                console.log("loc", loc)
-            }
-        }
-
-        if (AGENCY.coords_flipped) {
-            loc = [loc[1], loc[0]];
-        }
+// Locations come as [lat, lng], already reprojected by the server.
+function toLatLng(lat, lng) {
+    return {lat: lat, lng: lng};
+}
 
-        return {
-            lat: loc[0],
-            lng: loc[1],
+function cleanData(data) {
+    data.locations = data.locations.map(function (datum) {
+        return _.extend(toLatLng(datum[0], datum[1]), {
             address: datum[2],
             business: datum[3],
             nature: datum[4]
-        }
+        });
     });
 
-    data.locations = locations;
-
-    return data;
-}
-
-function getTopAddresses(locations, count) {
-    locations = _(locations).reject(function (d) {
-        return _.isNull(d.street_name) || d.street_name === "";
+    data.clusters = data.clusters.map(function (datum) {
+        return _.extend(toLatLng(datum[0], datum[1]), {
+            count: datum[2],
+            nature: datum[3]
+        });
     });
 
-    var data = d3.nest()
-        .key(function (d) { return d.address; })
-        .rollup(function (v) {
-            return {
-                count: v.length,
-                business: _.chain(v)
-                    .map(function (d) { return d.business })
-                    .compact()
-                    .unique()
-                    .value()
-                    .join(", ")
-            }
-        })
-        .entries(locations)
-        .sort(function (a, b) { return b.values.count - a.values.count })
-        .slice(0, count);
-
-    return data.map(function (d) {
-        return {
-            address: d.key,
-            business: d.values.business,
-            total: d.values.count
-        }
-    });
+    return data;
 }
 
 var ClusterMap = function (options) {
@@ -116,6 +90,7 @@ var ClusterMap = function (options) {
     this.drawn = false;
 
     this.pruneCluster = new PruneClusterForLeaflet();
+    this.clusterLayer = L.layerGroup();
 
     this.ensureDrawn = function () {
         var deferred = Q.defer();
@@ -133,19 +108,6 @@ var ClusterMap = function (options) {
         return deferred.promise;
     };
 
-    function resetTopLocations(map) {
-        var bounds = map.getBounds();
-        var locations = dashboard.get('data.locations');
-        if (locations) {
-            locations = locations.filter(function (d) {
-                return !_.isNull(d.lat)
-                    && !_.isNull(d.lng)
-                    && bounds.contains(new L.LatLng(d.lat, d.lng));
-            });
-            dashboard.set('data.top_locations', getTopAddresses(locations, 20));
-        }
-    }
-
     this.create = function () {
         var northEast = L.latLng.apply(null, MAP_INFO.neBound),
             southWest = L.latLng.apply(null, MAP_INFO.swBound),
@@ -163,6 +125,7 @@ var ClusterMap = function (options) {
         this.map = map;
 
         map.addLayer(this.pruneCluster);
+        map.addLayer(this.clusterLayer);
 
         var centerBtn = L.easyButton('fa-crosshairs', function (btn, map) {
             map.fitBounds(bounds);
@@ -170,7 +133,7 @@ var ClusterMap = function (options) {
 
         centerBtn.addTo(map);
 
-        map.on('moveend', function () { resetTopLocations(map) });
+        map.on('moveend', function () { dashboard.fetch(); });
 
 
         function resize() {
@@ -241,15 +204,30 @@ var ClusterMap = function (options) {
 
                 resize();
                 self.drawn = true;
+
+                // Fetch again for the part of the map in view.
+                if (dashboard.filter) {
+                    dashboard.fetch();
+                }
             });
     };
 
+    function clusterIcon(count) {
+        var size = count < 100 ? "small" : count < 1000 ? "medium" : "large";
+        return L.divIcon({
+            html: "<div><span>" + d3.format(",")(count) + "</span></div>",
+            className: "prunecluster prunecluster-" + size,
+            iconSize: L.point(38, 38)
+        });
+    }
+
     this._update = function (data) {
-        this.pruneCluster.RemoveMarkers();
+        var map = this.map;
 
-        var datum;
+        this.pruneCluster.RemoveMarkers();
+        this.clusterLayer.clearLayers();
 
-        var markers = data.map(function (datum) {
+        var markers = data.locations.map(function (datum) {
             var marker = new PruneCluster.Marker(datum.lat, datum.lng);
 
             if (datum.business) {
@@ -268,7 +246,18 @@ var ClusterMap = function (options) {
         this.pruneCluster.RegisterMarkers(markers);
         this.pruneCluster.ProcessView();
 
-        resetTopLocations(this.map);
+        data.clusters.forEach(function (datum) {
+            var marker = L.marker([datum.lat, datum.lng], {
+                icon: clusterIcon(datum.count),
+                title: datum.nature ? `Mostly ${datum.nature}` : ""
+            });
+
+            marker.on("click", function () {
+                map.setView(marker.getLatLng(), map.getZoom() + 2);
+            });
+
+            this.clusterLayer.addLayer(marker);
+        }, this);
     };
 
     this.update = function (newData) {
@@ -288,4 +277,4 @@ var map = new ClusterMap({
     ratio: 0.9
 });
 
-monitorChart(dashboard, "data.locations", map.update)
+monitorChart(dashboard, "data", map.update)
@@ -169,7 +169,6 @@ function cleanupData(data) {
             .value()
     }];
 
-    var shifts = ["Shift 1", "Shift 2"];
     data.volume_by_shift = [{
         key: "Volume By Shift",
         values: _.chain(data.volume_by_shift)
@@ -177,7 +176,7 @@ function cleanupData(data) {
                 return {
                     id: d.id,
                     volume: d.volume,
-                    name: shifts[d.id]
+                    name: d.name
                 };
             })
             .sortBy(
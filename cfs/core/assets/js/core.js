@@ -30,6 +30,18 @@ helpers.formatCount = function (number, singular, plural) {
   }
 }
 
+// Counts the API estimated (with count_exact false) are only shown to two
+// significant figures, as in "about 2.3M calls".
+helpers.formatEstimatedCount = function (number, exact, singular, plural) {
+  if (exact !== false || !number) {
+    return helpers.formatCount(number, singular, plural);
+  }
+  if (!plural) {
+    plural = singular + "s";
+  }
+  return "about " + d3.format(".2s")(number) + " " + plural;
+}
+
 var NavBar = Ractive.extend({
   template: "#navbar-template",
   delimiters: [ '[[', ']]' ],
@@ -101,7 +101,6 @@ function cleanupData(data) {
             .value()
     }];
 
-    var shifts = ["Shift 1", "Shift 2"];
     data.officer_response_time_by_shift = [{
         key: "Volume By Shift",
         values: _.chain(data.officer_response_time_by_shift)
@@ -109,7 +108,7 @@ function cleanupData(data) {
                 return {
                     id: d.id,
                     mean: d.mean,
-                    name: shifts[d.id]
+                    name: d.name
                 };
             })
             .sortBy(
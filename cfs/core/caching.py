@@ -0,0 +1,70 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.http import urlencode, quote_etag
+
+EXACT_SUFFIX = LOOKUP_SEP + 'exact'
+
+
+def normalize_filters(data):
+    """
+    Return a canonical query string for a set of request parameters.
+
+    Parameters are sorted, blank values are dropped, and the default
+    `exact` lookup is removed, so equivalent requests produce the same
+    string.
+    """
+    pairs = []
+    for key in data.keys():
+        if hasattr(data, 'getlist'):
+            values = data.getlist(key)
+        else:
+            values = [data[key]]
+
+        negated = key.endswith('!')
+        name = key.rstrip('!')
+        if name.endswith(EXACT_SUFFIX):
+            name = name[:-len(EXACT_SUFFIX)]
+        if negated:
+            name += '!'
+
+        pairs.extend((name, str(value)) for value in values if value != '')
+
+    return urlencode(sorted(pairs))
+
+
+def summary_cache_key(name, agency, data):
+    """
+    The cache key for the summary `name` of `agency`'s data under the given
+    filters. The agency's data version is part of the key, so loading new
+    data makes old entries unreachable.
+    """
+    digest = md5(normalize_filters(data).encode('utf-8')).hexdigest()
+    return 'summary:{}:{}:{}:{}'.format(name, agency.pk, agency.data_version,
+                                        digest)
+
+
+def cached_summary(name, agency, data, compute):
+    """
+    Return the cached summary for these filters, calling `compute` to build
+    and cache it if it isn't there yet.
+    """
+    key = summary_cache_key(name, agency, data)
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, settings.SUMMARY_CACHE_TIMEOUT)
+    return result
+
+
+def data_etag(agency, request):
+    """
+    A strong ETag for a response built from `agency`'s current data for this
+    request's path, filters and accepted media types.
+    """
+    tag = '{}:{}:{}:{}:{}'.format(request.path, agency.pk, agency.data_version,
+                                  normalize_filters(request.GET),
+                                  request.META.get('HTTP_ACCEPT', ''))
+    return quote_etag(md5(tag.encode('utf-8')).hexdigest())
@@ -0,0 +1,487 @@
+"""
+An in-process, columnar copy of each agency's calls.
+
+When COLUMN_STORE_DIR is set, each agency's calls are kept there as a set
+of NumPy arrays, one file per column, which are memory-mapped by every
+process that serves the dashboards. Filters become boolean masks over the
+columns and breakdowns become `bincount`s, so the call overviews can answer
+most requests without going to PostgreSQL.
+
+Stores are written to a directory named after the agency's data version
+and only read while that version is current, so a store is never used once
+the calls it was built from have changed. Run `refresh_column_store` after
+changing an agency's calls (the loaders do), or the `build_column_store`
+command to rebuild stores from scratch.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models.constants import LOOKUP_SEP
+
+from .dimensions import dimension_filter
+from .models import Agency, Call
+
+NULL_ID = -1
+
+# The fields read for each call, keyed by the column they're stored in.
+CALL_FIELDS = OrderedDict([
+    ('call_id', 'call_id'),
+    ('time_received', 'time_received'),
+    ('dow_received', 'dow_received'),
+    ('hour_received', 'hour_received'),
+    ('shift', 'shift_received'),
+    ('beat', 'beat_id'),
+    ('district', 'district_id'),
+    ('nature', 'nature_id'),
+    ('nature_group', 'nature__nature_group_id'),
+    ('priority', 'priority_id'),
+    ('call_source', 'call_source_id'),
+    ('self_initiated', 'call_source__is_self_initiated'),
+    ('cancelled', 'cancelled'),
+    ('response_secs', 'officer_response_time'),
+])
+
+UNIT_FIELDS = ('primary_unit_id', 'first_dispatched_id', 'reporting_unit_id')
+
+ID_COLUMNS = ('shift', 'beat', 'district', 'nature', 'nature_group',
+              'priority', 'call_source')
+
+# CallFilterSet filters the store can apply, mapped to the column they
+# filter. Filters not listed here are answered by PostgreSQL.
+FILTER_COLUMNS = {
+    'time_received': 'time_received',
+    'dow_received': 'dow_received',
+    'shift': 'shift',
+    'district': 'district',
+    'beat': 'beat',
+    'squad': 'unit_ids',
+    'unit': 'unit_ids',
+    'priority': 'priority',
+    'nature': 'nature',
+    'nature__nature_group': 'nature_group',
+    'initiated_by': 'self_initiated',
+    'call_source': 'call_source',
+    'cancelled': 'cancelled',
+}
+
+DATE_UNITS = {'month': 'M', 'day': 'D', 'hour': 'h'}
+
+# Large enough to keep the queries for a batch of loaded calls small.
+EXTRACT_BATCH_SIZE = 5000
+
+
+class UnsupportedFilter(Exception):
+    pass
+
+
+def _id_array(values):
+    return np.array([NULL_ID if v is None else v for v in values],
+                    dtype='int32')
+
+
+def _secs_array(values):
+    return np.array([np.nan if v is None else v.total_seconds()
+                     for v in values], dtype='float64')
+
+
+def _python_value(value):
+    """Convert a NumPy scalar from a dimension into what the ORM returns."""
+    if isinstance(value, np.datetime64):
+        return value.astype('M8[s]').item()
+    value = value.item()
+    return None if value == NULL_ID else value
+
+
+class CallColumns:
+    """
+    One agency's calls, stored column by column.
+
+    Besides the columns in CALL_FIELDS, the units on each call are stored
+    as pairs of `unit_rows` (the index of a call) and `unit_ids`.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.columns['call_id'])
+
+    def is_complete(self):
+        """
+        Whether every column is present. Stores written before a column was
+        added lack it, and have to be rebuilt before they can be used.
+        """
+        return set(CALL_FIELDS) | {'unit_rows', 'unit_ids'} <= \
+            set(self.columns)
+
+    @classmethod
+    def from_rows(cls, rows):
+        fields = list(CALL_FIELDS) + list(UNIT_FIELDS)
+        values = dict(zip(fields, zip(*rows))) if rows else \
+            {field: () for field in fields}
+
+        columns = {
+            'call_id': np.array(values['call_id'], dtype=str),
+            'time_received': np.array(values['time_received'],
+                                      dtype='M8[s]'),
+            'dow_received': np.array(values['dow_received'], dtype='int8'),
+            'hour_received': np.array(values['hour_received'], dtype='int8'),
+            'self_initiated': np.array([bool(v) for v in
+                                        values['self_initiated']],
+                                       dtype=bool),
+            'cancelled': np.array(values['cancelled'], dtype=bool),
+            'response_secs': _secs_array(values['response_secs']),
+        }
+        for name in ID_COLUMNS:
+            columns[name] = _id_array(values[name])
+
+        unit_rows, unit_ids = [], []
+        for row, units in enumerate(zip(*(values[f] for f in UNIT_FIELDS))):
+            for unit_id in set(units) - {None}:
+                unit_rows.append(row)
+                unit_ids.append(unit_id)
+        columns['unit_rows'] = np.array(unit_rows, dtype='int32')
+        columns['unit_ids'] = np.array(unit_ids, dtype='int32')
+
+        return cls(columns)
+
+    @classmethod
+    def extract(cls, agency, call_ids=None):
+        """Read an agency's calls, or just those in `call_ids`, from the
+        database."""
+        fields = list(CALL_FIELDS.values()) + list(UNIT_FIELDS)
+        qs = Call.objects.filter(agency=agency).order_by()
+
+        if call_ids is None:
+            rows = list(qs.values_list(*fields).iterator())
+        else:
+            call_ids = list(call_ids)
+            rows = []
+            for start in range(0, len(call_ids), EXTRACT_BATCH_SIZE):
+                batch = call_ids[start:start + EXTRACT_BATCH_SIZE]
+                rows.extend(qs.filter(call_id__in=batch).values_list(*fields))
+
+        return cls.from_rows(rows)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        columns = {}
+        for filename in os.listdir(path):
+            name, ext = os.path.splitext(filename)
+            if ext == '.npy':
+                columns[name] = np.load(os.path.join(path, filename),
+                                        mmap_mode=mmap_mode)
+        return cls(columns)
+
+    def save(self, path):
+        """Write the columns to `path`, replacing whatever is there."""
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=parent)
+        for name, column in self.columns.items():
+            np.save(os.path.join(tmp_path, name + '.npy'), column)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmp_path, path)
+
+    def without(self, call_ids):
+        """A copy without the calls in `call_ids`."""
+        keep = np.in1d(self['call_id'], np.array(list(call_ids), dtype=str),
+                       invert=True)
+        columns = {name: np.asarray(column)[keep]
+                   for name, column in self.columns.items()
+                   if not name.startswith('unit_')}
+
+        new_rows = np.cumsum(keep) - 1
+        units_kept = keep[self['unit_rows']]
+        columns['unit_rows'] = new_rows[self['unit_rows'][units_kept]] \
+            .astype('int32')
+        columns['unit_ids'] = np.asarray(self['unit_ids'])[units_kept]
+
+        return CallColumns(columns)
+
+    def concat(self, other):
+        columns = {name: np.concatenate([column, other[name]])
+                   for name, column in self.columns.items()}
+        columns['unit_rows'] = np.concatenate(
+            [self['unit_rows'], other['unit_rows'] + len(self)]) \
+            .astype('int32')
+        return CallColumns(columns)
+
+    def supports(self, specs):
+        """Whether `mask` can apply every one of `specs`."""
+        return all(self.supports_spec(spec) for spec in specs)
+
+    def supports_spec(self, spec):
+        # The filters accept any lookup, but only these become masks.
+        name = self.spec_name(spec)
+        if name == 'time_received':
+            return spec.lookup in ('gte', 'lte') and \
+                isinstance(spec.value, date)
+        return name in FILTER_COLUMNS and spec.lookup == 'exact'
+
+    def spec_name(self, spec):
+        components = list(spec.components)
+        # Filters on related models end with the related primary key.
+        if len(components) > 1 and components[-1].endswith('_id'):
+            components = components[:-1]
+        return LOOKUP_SEP.join(components)
+
+    def spec_mask(self, spec):
+        name = self.spec_name(spec)
+        value = spec.value
+
+        if name == 'time_received':
+            mask = self.time_mask(spec.lookup, value)
+        elif spec.lookup != 'exact':
+            raise UnsupportedFilter(spec)
+        elif name == 'shift':
+            mask = self['shift'] == int(value) if value != '' else None
+        elif name == 'initiated_by':
+            initiated = self['self_initiated']
+            mask = {'0': initiated, '1': ~initiated}.get(str(value))
+        elif name == 'squad':
+            mask = self.squad_mask(value) if value else None
+        elif name == 'unit':
+            mask = self.unit_mask([int(value)]) if value else None
+        elif name == 'cancelled':
+            mask = self['cancelled'] == bool(value)
+        elif name in FILTER_COLUMNS:
+            mask = self[FILTER_COLUMNS[name]] == int(value)
+        else:
+            raise UnsupportedFilter(spec)
+
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+        if spec.is_negated:
+            mask = ~mask
+        return mask
+
+    def time_mask(self, lookup, value):
+        times = self['time_received']
+
+        if isinstance(value, datetime):
+            bound = np.datetime64(value, 's')
+            if lookup == 'gte':
+                return times >= bound
+            elif lookup == 'lte':
+                return times <= bound
+        elif isinstance(value, date):
+            # Dates cover the whole day, as in BetterDjangoFilterBackend.
+            if lookup == 'gte':
+                return times >= np.datetime64(value, 's')
+            elif lookup == 'lte':
+                return times < np.datetime64(value + timedelta(days=1), 's')
+
+        raise UnsupportedFilter(lookup)
+
+    def squad_mask(self, squad_id):
+        return self.unit_mask(
+            [row['call_unit_id'] for row in
+             dimension_filter('CallUnit', squad_id=int(squad_id))])
+
+    def unit_mask(self, units):
+        mask = np.zeros(len(self), dtype=bool)
+        hits = np.in1d(self['unit_ids'], np.array(units, dtype='int32'))
+        mask[self['unit_rows'][hits]] = True
+        return mask
+
+    def mask(self, specs):
+        """The calls matching all of `specs`, as a boolean array."""
+        mask = np.ones(len(self), dtype=bool)
+        for spec in specs:
+            mask &= self.spec_mask(spec)
+        return mask
+
+
+class ColumnarCalls:
+    """
+    The calls from a CallColumns that match a filter, answering the same
+    questions CallOverview asks of its querysets.
+    """
+
+    def __init__(self, columns, mask):
+        self.columns = columns
+        self.index = np.flatnonzero(mask)
+
+    def __len__(self):
+        return len(self.index)
+
+    def column(self, name):
+        return self.columns[name][self.index]
+
+    def bounds(self):
+        if not len(self):
+            return {'min_time': None, 'max_time': None}
+        times = self.column('time_received')
+        return {'min_time': times.min().item(), 'max_time': times.max().item()}
+
+    def response_times(self):
+        """The positive officer response times, in seconds."""
+        secs = self.column('response_secs')
+        secs = secs[~np.isnan(secs)]
+        return secs[secs > 0]
+
+    def dimension(self, name, precision):
+        """The values of one of CallOverview.grouping_dimensions."""
+        if name == 'dim_date':
+            return self.column('time_received').astype(
+                'M8[{}]'.format(DATE_UNITS[precision]))
+        elif name == 'dim_source':
+            return np.where(self.column('self_initiated'), 0, 1)
+        elif name == 'dim_dow':
+            return self.column('dow_received')
+        elif name == 'dim_hour':
+            return self.column('hour_received')
+        return self.column(name[len('dim_'):])
+
+    def measure(self, kind, column, groups, count):
+        if kind == 'count':
+            return np.bincount(groups, minlength=count)
+        elif kind == 'mean':
+            values = self.column(column)
+            valid = ~np.isnan(values)
+            totals = np.bincount(groups, weights=np.where(valid, values, 0),
+                                 minlength=count)
+            counts = np.bincount(groups, weights=valid, minlength=count)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = totals / counts
+            return [None if n == 0 else m for m, n in zip(means, counts)]
+        raise ValueError("Unknown measure: {}".format(kind))
+
+    def group(self, sets, measures, precision):
+        """
+        Compute several breakdowns at once, returning the same structure as
+        GroupingSetsQuery.execute.
+
+        `sets` maps each set's name to a tuple of dimension names and
+        `measures` maps each measure's name to a (kind, column) pair, where
+        kind is 'count' or 'mean'.
+        """
+        dimensions = {}
+        results = OrderedDict()
+
+        for set_name, set_dimensions in sets.items():
+            if not set_dimensions:
+                # Like the empty grouping set, this always has one row.
+                groups = np.zeros(len(self), dtype='intp')
+                keys = [()]
+            elif not len(self):
+                results[set_name] = []
+                continue
+            else:
+                uniques, codes = [], []
+                for name in set_dimensions:
+                    if name not in dimensions:
+                        dimensions[name] = np.unique(
+                            self.dimension(name, precision),
+                            return_inverse=True)
+                    unique, code = dimensions[name]
+                    uniques.append(unique)
+                    codes.append(code)
+
+                shape = [len(unique) for unique in uniques]
+                combined = np.ravel_multi_index(codes, shape)
+                group_ids, groups = np.unique(combined, return_inverse=True)
+                coords = np.unravel_index(group_ids, shape)
+                keys = zip(*(unique[coord] for unique, coord
+                             in zip(uniques, coords)))
+
+            keys = list(keys)
+            values = {name: self.measure(kind, column, groups, len(keys))
+                      for name, (kind, column) in measures.items()}
+
+            rows = []
+            for idx, key in enumerate(keys):
+                row = {name: _python_value(value)
+                       for name, value in zip(set_dimensions, key)}
+                for name in measures:
+                    value = values[name][idx]
+                    row[name] = value if value is None else value.item()
+                rows.append(row)
+            results[set_name] = rows
+
+        return results
+
+
+_open_stores = {}
+_open_stores_lock = threading.Lock()
+
+
+def _store_root(agency):
+    return os.path.join(settings.COLUMN_STORE_DIR, agency.code)
+
+
+def _store_versions(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(int(name) for name in os.listdir(root) if name.isdigit())
+
+
+def open_column_store(agency):
+    """
+    The column store for `agency` at its current data version, or None if
+    there isn't one.
+    """
+    if not settings.COLUMN_STORE_DIR:
+        return None
+
+    key = (agency.pk, agency.data_version)
+    with _open_stores_lock:
+        if key not in _open_stores:
+            path = os.path.join(_store_root(agency), str(agency.data_version))
+            if not os.path.isdir(path):
+                return None
+            for old_key in [k for k in _open_stores if k[0] == agency.pk]:
+                del _open_stores[old_key]
+            columns = CallColumns.load(path)
+            _open_stores[key] = columns if columns.is_complete() else None
+        return _open_stores[key]
+
+
+def refresh_column_store(agency, call_ids=None, rebuild=False):
+    """
+    Write `agency`'s column store for its current data version.
+
+    Call this right after bumping the agency's data version. If there's a
+    store for the version before, nothing but the calls in `call_ids` has
+    changed since it was built, so it's reused with those calls replaced by
+    their current values. Otherwise, since other changes (like another
+    loader's, or `update_materialized_views`) may be missing from whatever
+    store there is, or when `rebuild` is true, every call is read again.
+    Does nothing unless COLUMN_STORE_DIR is set.
+    """
+    if not settings.COLUMN_STORE_DIR:
+        return
+
+    # The data version may have been bumped since `agency` was loaded.
+    agency = Agency.objects.get(pk=agency.pk)
+    root = _store_root(agency)
+    versions = _store_versions(root)
+    previous = agency.data_version - 1
+
+    if rebuild or previous not in versions:
+        columns = CallColumns.extract(agency)
+    else:
+        columns = CallColumns.load(os.path.join(root, str(previous)),
+                                   mmap_mode=None)
+        if not columns.is_complete():
+            columns = CallColumns.extract(agency)
+        elif call_ids:
+            columns = columns.without(call_ids).concat(
+                CallColumns.extract(agency, call_ids))
+
+    columns.save(os.path.join(root, str(agency.data_version)))
+
+    for version in versions:
+        if version != agency.data_version:
+            shutil.rmtree(os.path.join(root, str(version)))
@@ -0,0 +1,40 @@
+"""
+Counts of calls that settle for the planner's estimate when they're large.
+
+An exact COUNT(*) over broad filters scans every matching row, which takes
+seconds for big agencies, while the dashboards only need "about 2.3M" at
+that scale. When the planner expects a query to return at least
+ESTIMATED_COUNT_THRESHOLD rows, `count_rows` returns its estimate instead,
+flagged as inexact. Requests can pass `exact=1` to force a real count.
+"""
+from django.conf import settings
+from django.db import connection
+
+EXACT_QUERY_PARAM = 'exact'
+
+
+def wants_exact_count(data):
+    """Whether request parameters `data` ask for an exact count."""
+    return data.get(EXACT_QUERY_PARAM) in ('1', 'true')
+
+
+def planner_rows(queryset):
+    """The number of rows the planner expects `queryset` to return."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        return int(cursor.fetchone()[0][0]['Plan']['Plan Rows'])
+
+
+def count_rows(queryset, exact=False):
+    """
+    The number of rows in `queryset` and whether that number is exact,
+    which it is when `exact` is true or the estimate is below
+    ESTIMATED_COUNT_THRESHOLD.
+    """
+    threshold = settings.ESTIMATED_COUNT_THRESHOLD
+    if not exact and threshold is not None:
+        estimate = planner_rows(queryset)
+        if estimate >= threshold:
+            return estimate, False
+    return queryset.count(), True
@@ -0,0 +1,137 @@
+"""
+A cache of the small lookup tables calls refer to.
+
+The rows of each dimension model are memoized in each process, and kept in
+Django's cache for DIMENSION_CACHE_TIMEOUT so processes sharing a cache
+backend can load them from there. Both are keyed by a generation token kept
+in the database (see DimensionVersion), which is replaced whenever a
+dimension changes (see `invalidate_dimensions`). Each process checks it at
+most every DIMENSION_CHECK_INTERVAL seconds, so every process reloads soon
+after a change wherever it was made, whatever the cache backend.
+
+Saving or deleting a dimension through the ORM invalidates the cache (see
+CoreConfig.ready); code that changes them in bulk, like the loaders, has to
+call `invalidate_dimensions` itself.
+"""
+import threading
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+DIMENSION_MODELS = ('Beat', 'District', 'Nature', 'NatureGroup', 'Priority',
+                    'CallSource', 'CallUnit', 'Squad', 'Department', 'City',
+                    'ShiftSchedule', 'ShiftPeriod')
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+# The last generation read from the database, and when.
+_checked = None
+
+
+def _remember_generation(generation):
+    global _checked
+    _checked = (generation, time.monotonic())
+
+
+def _generation():
+    checked = _checked
+    if checked is not None and \
+            time.monotonic() - checked[1] < settings.DIMENSION_CHECK_INTERVAL:
+        return checked[0]
+
+    DimensionVersion = apps.get_model('core', 'DimensionVersion')
+    generation = DimensionVersion.objects \
+        .values_list('generation', flat=True).first()
+    if generation is None:
+        generation = DimensionVersion.objects.get_or_create(
+            pk=1, defaults={'generation': uuid.uuid4().hex})[0].generation
+    _remember_generation(generation)
+    return generation
+
+
+def invalidate_dimensions(**kwargs):
+    """Make every process reload the dimensions. Usable as a signal
+    receiver."""
+    generation = uuid.uuid4().hex
+    apps.get_model('core', 'DimensionVersion').objects.update_or_create(
+        pk=1, defaults={'generation': generation})
+    with _memo_lock:
+        _memo.clear()
+    _remember_generation(generation)
+
+
+def dimension_rows(model_name):
+    """
+    Every row of a dimension model, as dicts of its concrete fields (with
+    foreign keys under their `_id` names), in the model's default order.
+    """
+    generation = _generation()
+    key = (generation, model_name)
+
+    with _memo_lock:
+        rows = _memo.get(key)
+    if rows is not None:
+        return rows
+
+    cache_key = 'dimensions:{}:{}'.format(generation, model_name)
+    rows = cache.get(cache_key)
+    if rows is None:
+        model = apps.get_model('core', model_name)
+        rows = list(model.objects.values())
+        cache.set(cache_key, rows, settings.DIMENSION_CACHE_TIMEOUT)
+
+    with _memo_lock:
+        for old_key in [k for k in _memo if k[0] != generation]:
+            del _memo[old_key]
+        _memo[key] = rows
+    return rows
+
+
+def dimension_map(model_name, key, value):
+    """
+    A dict of each row's `key` field to its `value` field, memoized along
+    with the rows. Callers mustn't change it.
+    """
+    generation = _generation()
+    memo_key = (generation, model_name, key, value)
+
+    with _memo_lock:
+        mapping = _memo.get(memo_key)
+    if mapping is None:
+        mapping = {row[key]: row[value] for row in dimension_rows(model_name)}
+        with _memo_lock:
+            _memo[memo_key] = mapping
+    return mapping
+
+
+def dimension_filter(model_name, **kwargs):
+    """The rows of a dimension whose fields equal `kwargs`."""
+    return [row for row in dimension_rows(model_name)
+            if all(row[name] == value for name, value in kwargs.items())]
+
+
+def dimension_get(model_name, **kwargs):
+    """Like `Model.objects.get`, but from the cache."""
+    rows = dimension_filter(model_name, **kwargs)
+    model = apps.get_model('core', model_name)
+    if not rows:
+        raise model.DoesNotExist(
+            "{} matching query does not exist.".format(model_name))
+    if len(rows) > 1:
+        raise model.MultipleObjectsReturned(
+            "get() returned more than one {}.".format(model_name))
+    return rows[0]
+
+
+def dimension_choices(model_name, **kwargs):
+    """
+    The id and description of each matching row, in new dicts the caller
+    is free to change.
+    """
+    pk_name = apps.get_model('core', model_name)._meta.pk.name
+    return [{'id': row[pk_name], 'name': row['descr']}
+            for row in dimension_filter(model_name, **kwargs)]
@@ -10,6 +10,10 @@ from django.db import connection
 from django.db.utils import IntegrityError
 from django.core.management import call_command
 from django.core.exceptions import FieldDoesNotExist
+from core.columnar import refresh_column_store
+from core.dimensions import invalidate_dimensions
+from core.partitions import ensure_partitions
+from core.shifts import agency_schedules
 from core.models import *
 from officer_allocation.models import *
 import psycopg2
@@ -201,12 +205,19 @@ class ETL:
 
         self.connect_call_unit_squads()
         self.connect_call_unit_beat_district()
+        update_call_squads()
 
         self.create_nature_groups()
         self.create_officer_activity_types()
+        # Everything above changes the dimensions in bulk, without signals.
+        invalidate_dimensions()
 
         self.log("Updating materialized views")
-        update_materialized_views()
+        update_materialized_views(bump_versions=False)
+
+        self.log("Rebuilding column store")
+        bump_data_version(self.agency)
+        refresh_column_store(self.agency, rebuild=True)
 
     def clear_database(self):
         self.log("Clearing database")
@@ -309,11 +320,14 @@ class ETL:
 
     def create_calls(self):
         from django.forms.models import model_to_dict
+        ensure_partitions('call', map(safe_datetime, self.calls.calltime))
+        schedules = agency_schedules(self.agency.pk)
         try:
             start = 0
             while start < len(self.calls):
                 batch = self.calls[start:start + self.batch_size]
                 calls = []
+                unit_squads = unit_squad_map()
 
                 for idx, c in batch.iterrows():
                     call = Call(call_id=c.inci_id,
@@ -353,7 +367,8 @@ class ETL:
                                 close_code_id=self.map('CloseCode',
                                                        c.closecode),
                                 close_comments=c.closecomm)
-                    call.update_derived_fields()
+                    call.update_derived_fields(unit_squads=unit_squads,
+                                               schedules=schedules)
                     calls.append(call)
                 Call.objects.bulk_create(calls)
                 self.log("Call {}-{} created".format(start, start + len(batch)))
@@ -586,6 +601,8 @@ class ETL:
     def create_call_log(self):
         self.log("Creating call log...")
         existing_ids = self.get_key_set(CallLog, 'call_log_id')
+        ensure_partitions('call_log',
+                          map(safe_datetime, self.call_log['timestamp']))
 
         try:
             start = 0
@@ -0,0 +1,228 @@
+"""
+Exports of calls written in the background.
+
+Streaming a multi-year export holds a web worker and a database connection
+for the whole transfer, and a dropped connection means starting over. An
+ExportJob instead records an agency, a file format and the filters; the
+`run_export_jobs` command claims queued jobs (several workers can run at
+once, since claiming skips rows another worker has locked), writes each
+one's file to EXPORT_JOB_DIR with the same code as the streaming exports,
+and saves its progress as it goes. Running jobs whose progress hasn't been
+saved for STALE_JOB_TIMEOUT, because their worker died, are claimed again.
+Finished files are served with support for Range requests, so interrupted
+downloads can be resumed.
+"""
+import logging
+import os
+import re
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.http import QueryDict
+from django.utils import timezone
+from url_filter.filtersets import StrictMode
+
+from .counts import count_rows
+from .exports import copy_sql, stream_columnar, stream_copy
+from .filters import CallFilterSet
+from .models import Call, ExportJob
+
+logger = logging.getLogger(__name__)
+
+# How often, in seconds, a running job's progress is saved.
+PROGRESS_SAVE_INTERVAL = 2
+
+# How long, in seconds, a running job can go without saving its progress
+# before it's assumed to have lost its worker. Counting the calls comes
+# before the first save, so this has to allow for a slow count.
+STALE_JOB_TIMEOUT = 15 * 60
+
+# How many bytes of a file are read at a time when serving it.
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+
+def export_jobs_enabled():
+    return bool(settings.EXPORT_JOB_DIR)
+
+
+def job_path(job):
+    return os.path.join(settings.EXPORT_JOB_DIR, job.filename)
+
+
+def job_queryset(job):
+    """The calls a job exports. Its filters were checked when it was
+    submitted."""
+    return CallFilterSet(data=QueryDict(job.query),
+                         queryset=Call.objects.filter(agency=job.agency),
+                         strict_mode=StrictMode.drop).filter()
+
+
+def claim_job():
+    """
+    Mark the oldest queued (or stale running) job running and return it, or
+    return None if there isn't one. Jobs claimed by other workers are
+    skipped rather than waited for.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=STALE_JOB_TIMEOUT)
+    with connection.cursor() as cursor:
+        cursor.execute("""
+        UPDATE export_job
+        SET status = %s, started_at = %s, progress_saved_at = %s
+        WHERE export_job_id = (
+          SELECT export_job_id FROM export_job
+          WHERE status = %s OR
+                (status = %s AND
+                 COALESCE(progress_saved_at, started_at) < %s)
+          ORDER BY created_at, export_job_id
+          LIMIT 1
+          FOR UPDATE SKIP LOCKED)
+        RETURNING export_job_id
+        """, [ExportJob.RUNNING, now, now, ExportJob.QUEUED,
+              ExportJob.RUNNING, stale])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return ExportJob.objects.select_related('agency').get(pk=row[0])
+
+
+class Progress:
+    """Counts the rows a job has written, saving the count now and then."""
+
+    def __init__(self, job):
+        self.job = job
+        self.saved_at = time.monotonic()
+
+    def __call__(self, rows):
+        self.job.rows_written += rows
+        if time.monotonic() - self.saved_at >= PROGRESS_SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        self.job.progress_saved_at = timezone.now()
+        self.job.save(update_fields=['rows_written', 'progress_saved_at'])
+        self.saved_at = time.monotonic()
+
+
+class CSVRowCounter:
+    """
+    Counts the rows in CSV written a chunk at a time. Quoted values can
+    contain newlines, so only those outside quotes end a row; an escaped
+    quote is two quotes, so counting them keeps track of which is which.
+    """
+
+    def __init__(self):
+        self.quoted = False
+
+    def __call__(self, chunk):
+        parts = chunk.split(b'"')
+        outside = parts[1::2] if self.quoted else parts[::2]
+        if len(parts) % 2 == 0:
+            self.quoted = not self.quoted
+        return sum(part.count(b'\n') for part in outside)
+
+
+def export_chunks(job, queryset, progress):
+    """The contents of the job's file, as bytes, calling `progress` with
+    the number of rows in each chunk."""
+    if job.file_format == 'csv':
+        # COPY writes a row at a time; the header isn't a call.
+        progress(-1)
+        count_rows_in = CSVRowCounter()
+        for chunk in stream_copy(copy_sql(queryset)):
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            progress(count_rows_in(chunk))
+            yield chunk
+    else:
+        yield from stream_columnar(queryset, job.file_format, progress)
+
+
+def run_job(job):
+    """
+    Write a claimed job's file, marking the job finished, or failed with
+    the error if it couldn't be written. The file is written under another
+    name, unique to this run in case a stale job's worker is still going,
+    and moved into place once it's complete.
+    """
+    path = job_path(job)
+    partial_path = '{}.{}.part'.format(path, uuid.uuid4().hex)
+
+    try:
+        queryset = job_queryset(job)
+        job.rows_total, _ = count_rows(queryset)
+        job.rows_written = 0
+        job.progress_saved_at = timezone.now()
+        job.save(update_fields=['rows_total', 'rows_written',
+                                'progress_saved_at'])
+
+        progress = Progress(job)
+        with open(partial_path, 'wb') as f:
+            for chunk in export_chunks(job, queryset, progress):
+                f.write(chunk)
+        os.replace(partial_path, path)
+    except Exception as e:
+        logger.exception("Export job %s failed", job.pk)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        job.status = ExportJob.FAILED
+        job.error = str(e) or e.__class__.__name__
+    else:
+        job.status = ExportJob.FINISHED
+
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def byte_range(header, size):
+    """
+    The first and last byte of a file of `size` bytes that a Range header
+    asks for, or None to send the whole file, as for a missing or
+    malformed header. Only single ranges are supported; a request for
+    several gets the whole file too. Raises UnsatisfiableRange if the range
+    starts past the end of the file.
+    """
+    match = RANGE_RE.match((header or '').replace(' ', ''))
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # A suffix: the last `last` bytes.
+        if not last:
+            return None
+        if int(last) == 0 or size == 0:
+            raise UnsatisfiableRange()
+        return max(size - int(last), 0), size - 1
+
+    first = int(first)
+    last = int(last) if last else size - 1
+    if first > last:
+        return None
+    if first >= size:
+        raise UnsatisfiableRange()
+    return first, min(last, size - 1)
+
+
+def read_range(path, first, last):
+    """Yield bytes `first` through `last` of the file at `path`."""
+    with open(path, 'rb') as f:
+        f.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            data = f.read(min(DOWNLOAD_BLOCK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
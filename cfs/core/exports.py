@@ -0,0 +1,373 @@
+"""
+Exports of calls.
+
+CSV exports are written by Postgres: `copy_sql` compiles a queryset of
+calls into a `COPY (SELECT ...) TO STDOUT WITH CSV HEADER` statement
+selecting the export's columns, with the descriptions of related objects
+joined in, and `stream_copy` runs it and yields its output as Postgres
+writes it. No row passes through Python, so exports go as fast as COPY
+does. Values are in Postgres' text formats, so booleans are `t` and `f` and
+timestamps are like `2015-01-01 09:00:00`.
+
+Parquet and Arrow exports (`stream_columnar`) have the same columns, typed:
+descriptions are dictionary-encoded against the whole lookup table,
+timestamps are timestamps and durations are whole seconds. Rows are read
+from a server-side cursor in batches of EXPORT_BATCH_ROWS, each written as
+a row group or record batch. They need pyarrow, which is optional.
+"""
+import queue
+import threading
+import uuid
+
+from django.apps import apps
+from django.db import connection, transaction
+
+from .serializers import CallExportSerializer, field_lookups
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# The export's columns, in order.
+EXPORT_FIELDS = [
+    'call_id',
+    'case_id',
+    'cancelled',
+    'report_only',
+    'priority',
+    'call_source',
+    'nature',
+    'nature_group',
+    'close_code',
+
+    'time_received',
+    'month_received',
+    'week_received',
+    'dow_received',
+    'hour_received',
+
+    'time_routed',
+    'time_finished',
+    'first_unit_dispatch',
+    'first_unit_enroute',
+    'first_unit_arrive',
+    'first_unit_transport',
+    'last_unit_clear',
+    'time_closed',
+    'officer_response_time',
+    'overall_response_time',
+
+    'district',
+    'beat',
+    'business',
+    'street_address',
+    'city',
+    'zip_code',
+    'geox',
+    'geoy',
+
+    'primary_unit',
+    'first_dispatched',
+    'reporting_unit',
+]
+
+# COPY writes a row at a time; its output is passed on in blocks of about
+# this many bytes (or characters) instead.
+COPY_CHUNK_SIZE = 64 * 1024
+
+# How many chunks of COPY output to hold while the client catches up.
+COPY_BUFFER_CHUNKS = 64
+
+
+def copy_sql(queryset, fields=EXPORT_FIELDS):
+    """
+    The COPY statement writing `fields` of the calls in `queryset` as CSV,
+    with a header, with its parameters interpolated.
+    """
+    lookups = field_lookups(CallExportSerializer, fields)
+    sql, params = queryset.values_list(*lookups).query.sql_with_params()
+    # Name the columns after the export's fields rather than the columns
+    # they come from, which repeat (`descr`) for related objects.
+    sql = "COPY (SELECT * FROM ({}) AS export({})) TO STDOUT WITH CSV " \
+          "HEADER".format(sql, ", ".join(fields))
+    with connection.cursor() as cursor:
+        return cursor.mogrify(sql, params).decode('utf-8')
+
+
+class CopyCancelled(Exception):
+    pass
+
+
+class QueueWriter:
+    """
+    A file-like object that puts what's written to it on a queue, in
+    chunks of about COPY_CHUNK_SIZE. Call `flush` once writing is done to
+    put the rest.
+    """
+
+    def __init__(self, chunks, cancelled):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.pending = []
+        self.pending_size = 0
+
+    def write(self, data):
+        if self.cancelled.is_set():
+            raise CopyCancelled()
+        self.pending.append(data)
+        self.pending_size += len(data)
+        if self.pending_size >= COPY_CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.chunks.put(self.pending[0][:0].join(self.pending))
+            self.pending = []
+            self.pending_size = 0
+
+
+def stream_copy(sql):
+    """
+    Run the COPY ... TO STDOUT statement `sql`, yielding its output in
+    chunks of about COPY_CHUNK_SIZE as Postgres produces it.
+
+    psycopg2 can only copy into a file, so the copy runs in a thread
+    writing to a bounded queue, which this generator drains. If the
+    generator is closed early (the client went away), the copy is stopped
+    and the connection closed, since it's left mid-COPY.
+    """
+    chunks = queue.Queue(COPY_BUFFER_CHUNKS)
+    cancelled = threading.Event()
+    done = object()
+    errors = []
+
+    connection.ensure_connection()
+    raw_connection = connection.connection
+
+    def copy():
+        try:
+            writer = QueueWriter(chunks, cancelled)
+            with raw_connection.cursor() as cursor:
+                cursor.copy_expert(sql, writer)
+            writer.flush()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            chunks.put(done)
+
+    thread = threading.Thread(target=copy, daemon=True)
+    thread.start()
+
+    finished = False
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                finished = True
+                break
+            yield chunk
+    finally:
+        if not finished:
+            cancelled.set()
+            # Let the copy thread finish whatever write it's blocked on.
+            while chunks.get() is not done:
+                pass
+            thread.join()
+            connection.close()
+
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+# The Parquet and Arrow exports' columns, in the CSV export's order, as
+# (name, lookup, kind). The kind is an Arrow type, "duration" for intervals
+# exported as whole seconds, or (capitalized) the lookup model whose
+# descriptions a foreign key is exported as.
+COLUMNAR_FIELDS = [
+    ('call_id', 'call_id', 'string'),
+    ('case_id', 'case_id', 'int64'),
+    ('cancelled', 'cancelled', 'bool'),
+    ('report_only', 'report_only', 'bool'),
+    ('priority', 'priority', 'Priority'),
+    ('call_source', 'call_source', 'CallSource'),
+    ('nature', 'nature', 'Nature'),
+    ('nature_group', 'nature__nature_group', 'NatureGroup'),
+    ('close_code', 'close_code', 'CloseCode'),
+
+    ('time_received', 'time_received', 'timestamp'),
+    ('month_received', 'month_received', 'int32'),
+    ('week_received', 'week_received', 'int32'),
+    ('dow_received', 'dow_received', 'int32'),
+    ('hour_received', 'hour_received', 'int32'),
+
+    ('time_routed', 'time_routed', 'timestamp'),
+    ('time_finished', 'time_finished', 'timestamp'),
+    ('first_unit_dispatch', 'first_unit_dispatch', 'timestamp'),
+    ('first_unit_enroute', 'first_unit_enroute', 'timestamp'),
+    ('first_unit_arrive', 'first_unit_arrive', 'timestamp'),
+    ('first_unit_transport', 'first_unit_transport', 'timestamp'),
+    ('last_unit_clear', 'last_unit_clear', 'timestamp'),
+    ('time_closed', 'time_closed', 'timestamp'),
+    ('officer_response_time', 'officer_response_time', 'duration'),
+    ('overall_response_time', 'overall_response_time', 'duration'),
+
+    ('district', 'district', 'District'),
+    ('beat', 'beat', 'Beat'),
+    ('business', 'business', 'string'),
+    ('street_address', 'street_address', 'string'),
+    ('city', 'city', 'City'),
+    ('zip_code', 'zip_code', 'string'),
+    ('geox', 'geox', 'float64'),
+    ('geoy', 'geoy', 'float64'),
+
+    ('primary_unit', 'primary_unit', 'CallUnit'),
+    ('first_dispatched', 'first_dispatched', 'CallUnit'),
+    ('reporting_unit', 'reporting_unit', 'CallUnit'),
+]
+
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+# Rows per row group (Parquet) or record batch (Arrow).
+EXPORT_BATCH_ROWS = 50000
+
+
+def columnar_exports_available():
+    return pa is not None
+
+
+class ChunkSink:
+    """
+    A write-only file whose contents are collected to be handed out in
+    chunks by `take`, for writers that want a file to stream to.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class Dictionary:
+    """
+    The descriptions of a lookup model's rows, as an Arrow dictionary, and
+    the positions of their ids in it.
+    """
+
+    def __init__(self, model_name):
+        model = apps.get_model('core', model_name)
+        rows = list(model.objects.order_by('pk').values_list('pk', 'descr'))
+        self.positions = {pk: i for i, (pk, _) in enumerate(rows)}
+        self.values = pa.array([descr for _, descr in rows], type=pa.string())
+
+    def encode(self, ids):
+        indices = pa.array([self.positions.get(pk) for pk in ids],
+                           type=pa.int32())
+        return pa.DictionaryArray.from_arrays(indices, self.values)
+
+
+def arrow_schema(dictionaries):
+    types = {
+        'string': pa.string(),
+        'int32': pa.int32(),
+        'int64': pa.int64(),
+        'bool': pa.bool_(),
+        'float64': pa.float64(),
+        'timestamp': pa.timestamp('us'),
+        'duration': pa.int64(),
+    }
+    return pa.schema([
+        pa.field(name, pa.dictionary(pa.int32(), pa.string())
+                 if kind in dictionaries else types[kind])
+        for name, _, kind in COLUMNAR_FIELDS])
+
+
+def columnar_sql(queryset):
+    """The SQL selecting the columnar exports' columns from `queryset`."""
+    sql, params = queryset \
+        .values_list(*[lookup for _, lookup, _ in COLUMNAR_FIELDS]) \
+        .query.sql_with_params()
+    columns = ", ".join(
+        "EXTRACT(EPOCH FROM {0})::bigint AS {0}".format(name)
+        if kind == 'duration' else name
+        for name, _, kind in COLUMNAR_FIELDS)
+    names = ", ".join(name for name, _, _ in COLUMNAR_FIELDS)
+    return "SELECT {} FROM ({}) AS export({})".format(columns, sql,
+                                                      names), params
+
+
+def stream_columnar(queryset, format, progress=None):
+    """
+    Yield the calls in `queryset` as a Parquet or Arrow IPC file, as each
+    batch of rows is written. `progress`, if given, is called with the
+    number of rows in each batch.
+    """
+    dictionaries = {kind: Dictionary(kind) for _, _, kind in COLUMNAR_FIELDS
+                    if kind[:1].isupper()}
+    schema = arrow_schema(dictionaries)
+    sql, params = columnar_sql(queryset)
+
+    sink = ChunkSink()
+    if format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema)
+
+        def write(batch):
+            writer.write_table(pa.Table.from_batches([batch]))
+    else:
+        writer = pa.ipc.new_file(sink, schema)
+        write = writer.write_batch
+
+    def to_batch(rows):
+        columns = list(zip(*rows))
+        arrays = []
+        for (name, _, kind), values in zip(COLUMNAR_FIELDS, columns):
+            if kind in dictionaries:
+                arrays.append(dictionaries[kind].encode(values))
+            else:
+                arrays.append(pa.array(values,
+                                       type=schema.field(name).type))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    # Named (server-side) cursors only last as long as their transaction.
+    with transaction.atomic():
+        connection.ensure_connection()
+        with connection.connection.cursor(
+                name='export_{}'.format(uuid.uuid4().hex)) as cursor:
+            cursor.itersize = EXPORT_BATCH_ROWS
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_ROWS)
+                if not rows:
+                    break
+                write(to_batch(rows))
+                if progress is not None:
+                    progress(len(rows))
+                yield sink.take()
+
+    writer.close()
+    yield sink.take()
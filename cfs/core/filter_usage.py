@@ -0,0 +1,277 @@
+"""
+A record of the filters requests use, and the indexes they call for.
+
+When FILTER_USAGE_LOG is set, the API views append a JSON line to it for
+each filtered request, naming the filter set and the (normalized) filters.
+The `advise_indexes` command reads it back, groups the requests by the
+shape of the predicates they produce, and proposes a btree index for each
+common shape: the agency first, then the columns compared for equality,
+most used first, then the column compared by range. Boolean filters
+become the predicate of a partial index instead.
+"""
+import hashlib
+import json
+from collections import Counter, OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.http import QueryDict
+from django.utils.module_loading import import_string
+from url_filter.filtersets import StrictMode
+
+from .caching import normalize_filters
+from .models import Agency
+
+EQUALITY_LOOKUPS = ('exact', 'in')
+RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte', 'range')
+
+# Columns compared by method filters that aren't model fields. Filters not
+# here or on a model field (like `squad`, which uses a GIN index) are left
+# out of the advice.
+METHOD_FILTER_COLUMNS = {
+    'shift': 'shift_received',
+    'initiated_by': 'call_source_id',
+}
+
+Predicate = namedtuple('Predicate', ['columns', 'range_column', 'where'])
+
+
+def filter_set_path(filter_set):
+    return '{}.{}'.format(filter_set.__module__, filter_set.__name__)
+
+
+def log_filter_usage(filter_set, agency, data):
+    """Record a request for `agency` with `filter_set` and the filters in
+    `data`, if FILTER_USAGE_LOG is set."""
+    path = settings.FILTER_USAGE_LOG
+    query = normalize_filters(data)
+    if not path or not query:
+        return
+
+    record = json.dumps(OrderedDict([
+        ('filter_set', filter_set_path(filter_set)),
+        ('agency', agency.code),
+        ('query', query),
+    ]))
+    with open(path, 'a') as f:
+        f.write(record + '\n')
+
+
+def read_filter_usage(path):
+    """The records in a filter usage log, skipping any that are
+    malformed."""
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                yield record['filter_set'], record['agency'], record['query']
+            except (ValueError, KeyError):
+                continue
+
+
+def spec_column(model, spec):
+    """
+    The column of `model` that `spec` compares, or None if it compares a
+    related table's column or isn't a field at all.
+    """
+    components = list(spec.components)
+    name = components[0]
+    if name in METHOD_FILTER_COLUMNS and len(components) == 1:
+        return METHOD_FILTER_COLUMNS[name]
+
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if not getattr(field, 'column', None):
+        return None
+
+    if len(components) == 1:
+        return field.column
+    if len(components) == 2 and field.is_relation and \
+            components[1] == field.related_model._meta.pk.name:
+        return field.column
+    return None
+
+
+def is_boolean(model, column):
+    return any(field.column == column and
+               field.get_internal_type() == 'BooleanField'
+               for field in model._meta.concrete_fields)
+
+
+def predicate(model, specs):
+    """The shape of the predicate `specs` filter `model` with."""
+    equal, ranged, where = set(), [], set()
+
+    for spec in specs:
+        column = spec_column(model, spec)
+        if column is None or spec.is_negated:
+            continue
+        if spec.lookup == 'exact' and is_boolean(model, column):
+            where.add(column if spec.value else 'NOT {}'.format(column))
+        elif spec.lookup in EQUALITY_LOOKUPS:
+            equal.add(column)
+        elif spec.lookup in RANGE_LOOKUPS and column not in ranged:
+            ranged.append(column)
+
+    return Predicate(columns=frozenset(equal),
+                     range_column=ranged[0] if ranged else None,
+                     where=' AND '.join(sorted(where)) or None)
+
+
+class Proposal:
+    """
+    An index for one predicate shape, with how many logged requests used
+    it and one of them to EXPLAIN.
+    """
+
+    def __init__(self, model, predicate, column_order, requests, example):
+        self.model = model
+        self.table = model._meta.db_table
+        self.predicate = predicate
+        self.requests = requests
+        self.example = example
+
+        columns = sorted(predicate.columns, key=column_order.index)
+        if has_agency(model):
+            columns = ['agency_id'] + [c for c in columns if c != 'agency_id']
+        if predicate.range_column and predicate.range_column not in columns:
+            columns.append(predicate.range_column)
+        self.columns = columns
+
+    @property
+    def name(self):
+        digest = hashlib.md5(self.definition().encode('utf-8')).hexdigest()
+        return '{}_advised_{}_ndx'.format(self.table, digest[:8])
+
+    def definition(self, name=None):
+        sql = 'CREATE INDEX {}ON {} ({})'.format(
+            name + ' ' if name else '', self.table, ', '.join(self.columns))
+        if self.predicate.where:
+            sql += ' WHERE {}'.format(self.predicate.where)
+        return sql
+
+    def sql(self):
+        return self.definition(self.name)
+
+    def covered_by(self, indexes):
+        """Whether one of `indexes`, as returned by `table_indexes`, already
+        serves this proposal."""
+        for columns, where in indexes:
+            if columns[:len(self.columns)] == self.columns and \
+                    normalize_predicate(where) == \
+                    normalize_predicate(self.predicate.where):
+                return True
+        return False
+
+
+def has_agency(model):
+    return any(field.column == 'agency_id'
+               for field in model._meta.concrete_fields)
+
+
+def normalize_predicate(where):
+    if not where:
+        return None
+    return where.replace('(', '').replace(')', '').replace(' ', '').lower()
+
+
+def table_indexes(table):
+    """The columns and predicate of each btree index on `table`."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+        SELECT
+          ARRAY(SELECT a.attname
+                FROM unnest(ix.indkey) WITH ORDINALITY k(attnum, ord)
+                JOIN pg_attribute a ON a.attrelid = ix.indrelid
+                 AND a.attnum = k.attnum
+                ORDER BY k.ord),
+          pg_get_expr(ix.indpred, ix.indrelid)
+        FROM pg_index ix
+        JOIN pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_am am ON am.oid = i.relam
+        WHERE ix.indrelid = %s::regclass AND am.amname = 'btree'
+        """, [table])
+        return [(list(columns), where) for columns, where in cursor.fetchall()]
+
+
+def propose_indexes(records, min_requests=1):
+    """
+    Proposals for the predicate shapes used by at least `min_requests` of
+    the (filter set path, agency code, query) `records`, most used first.
+    """
+    shapes = Counter()
+    examples = {}
+    column_use = {}
+
+    for path, agency_code, query in records:
+        try:
+            filter_set = import_string(path)
+        except ImportError:
+            continue
+        model = filter_set.Meta.model
+        specs = filter_set(data=QueryDict(query),
+                           queryset=model.objects.all(),
+                           strict_mode=StrictMode.drop).get_specs()
+
+        shape = predicate(model, specs)
+        if not (shape.columns or shape.range_column or shape.where):
+            continue
+        key = (model, shape)
+        shapes[key] += 1
+        examples.setdefault(key, (filter_set, agency_code, query))
+        column_use.setdefault(model, Counter()).update(shape.columns)
+
+    # Different shapes can call for the same index, e.g. when one only
+    # adds a filter on the agency.
+    proposals = OrderedDict()
+    for (model, shape), requests in shapes.most_common():
+        column_order = [column for column, _ in
+                        sorted(column_use[model].items(),
+                               key=lambda item: (-item[1], item[0]))]
+        proposal = Proposal(model, shape, column_order, requests,
+                            examples[(model, shape)])
+        if not proposal.columns:
+            continue
+        if proposal.definition() in proposals:
+            proposals[proposal.definition()].requests += requests
+        else:
+            proposals[proposal.definition()] = proposal
+
+    return sorted((proposal for proposal in proposals.values()
+                   if proposal.requests >= min_requests),
+                  key=lambda proposal: -proposal.requests)
+
+
+def scan_nodes(plan):
+    """Describe the scans in an EXPLAIN plan, e.g. "Seq Scan on call"."""
+    nodes = []
+    if 'Relation Name' in plan:
+        node = '{} on {}'.format(plan['Node Type'], plan['Relation Name'])
+        if 'Index Name' in plan:
+            node += ' using {}'.format(plan['Index Name'])
+        nodes.append(node)
+    for child in plan.get('Plans', []):
+        nodes.extend(scan_nodes(child))
+    return nodes
+
+
+def explain(proposal):
+    """
+    The planner's estimated cost for the proposal's example request, and
+    the scans it would use.
+    """
+    filter_set, agency_code, query = proposal.example
+    qs = proposal.model.objects.all()
+    if has_agency(proposal.model):
+        qs = qs.filter(agency=Agency.objects.filter(code=agency_code).first())
+    qs = filter_set(data=QueryDict(query), queryset=qs,
+                    strict_mode=StrictMode.drop).filter()
+
+    sql, params = qs.order_by().values_list('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0][0]['Plan']
+    return plan['Total Cost'], scan_nodes(plan)
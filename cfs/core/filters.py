@@ -1,4 +1,5 @@
 import datetime
+from copy import deepcopy
 
 from django import forms
 from django.db.models.constants import LOOKUP_SEP
@@ -27,6 +28,10 @@ class BetterDjangoFilterBackend(DjangoFilterBackend):
             value = datetime.datetime(year=value.year, month=value.month,
                                       day=value.day, hour=0, minute=0, second=0)
             value = value + datetime.timedelta(days=1, microseconds=-1)
+        elif type(spec.value) is datetime.date:
+            # Compare dates as timestamps, so Postgres can check them against
+            # the bounds of tables partitioned by time and skip partitions.
+            value = datetime.datetime.combine(spec.value, datetime.time())
         else:
             value = spec.value
 
@@ -62,6 +67,7 @@ def get_form_field_for_type(ftype):
         "text": forms.CharField(),
         "date": forms.DateField(),
         "daterange": forms.DateField(),
+        "integer": forms.IntegerField(),
         "duration": forms.DurationField(),
         "boolean": forms.BooleanField(required=False),
         "select": forms.ChoiceField(),
@@ -97,7 +103,7 @@ def create_filterset(model, definition, name=None):
                 filter = filter_class()
         else:
             ftype = f.get("type", "text")
-            form_field = get_form_field_for_type(ftype)
+            form_field = get_form_field_for_type(f.get("form_type", ftype))
             if f.get("options"):
                 form_field._set_choices(f.get("options"))
             source = f.get("source", f["name"])
@@ -115,6 +121,59 @@ def create_filterset(model, definition, name=None):
     return type(name, (ModelFilterSet,), attrs)
 
 
+def filter_names(data):
+    """
+    The names of the filters used in `data`, without lookups or negation.
+    """
+    return {key.rstrip('!').split(LOOKUP_SEP)[0] for key in data.keys()}
+
+
+def create_rollup_filterset(model, filter_set):
+    """
+    Create a filter set over a rollup of `filter_set`'s model. It supports
+    the filters in `filter_set` whose names appear in `model.dimensions`.
+    """
+    definition = [deepcopy(f) for f in filter_set.definition
+                  if f["name"].split(LOOKUP_SEP)[0] in model.dimensions]
+    rollup_filterset = create_filterset(model, definition)
+    rollup_filterset.source_filterset = filter_set
+    return rollup_filterset
+
+
+def rollup_supports(rollup_filterset, data):
+    """
+    Whether every filter in `data` can be applied to the rollup. Parameters
+    that aren't filters on the source filter set are ignored.
+    """
+    source_names = {f["name"].split(LOOKUP_SEP)[0] for f in
+                    rollup_filterset.source_filterset.definition}
+    rollup_names = {f["name"].split(LOOKUP_SEP)[0] for f in
+                    rollup_filterset.definition}
+    return (filter_names(data) & source_names) <= rollup_names
+
+
+def date_range_filter(specs, field):
+    """
+    The (start, end) dates that `specs` restrict `field` to, either of which
+    may be None, or None if they filter on anything else or in a way that
+    can't be expressed in whole days.
+    """
+    start = end = None
+    for spec in specs:
+        value = spec.value
+        if LOOKUP_SEP.join(spec.components) != field or spec.is_negated or \
+                not isinstance(value, datetime.date) or \
+                isinstance(value, datetime.datetime):
+            return None
+        if spec.lookup == "gte":
+            start = value if start is None else max(start, value)
+        elif spec.lookup == "lte":
+            end = value if end is None else min(end, value)
+        else:
+            return None
+    return start, end
+
+
 class SquadFilterSet(ModelFilterSet):
 
     class Meta:
@@ -140,9 +199,10 @@ CallFilterSet = create_filterset(
     models.Call,
     [
         {"name": "time_received", "type": "daterange"},
-        {"name": "shift", "type": "select", "method": True,
-         "lookups": ["exact"],
-         "options": [[0, "Shift 1"], [1, "Shift 2"]]},
+        # Each agency has its own shifts, so build_filter fills in the
+        # options.
+        {"name": "shift", "type": "select", "form_type": "integer",
+         "method": True, "lookups": ["exact"], "agency_options": True},
         {"name": "dow_received", "label": "Day of Week", "type": "select",
          "options": [
              [0, "Monday"], [1, "Tuesday"], [2, "Wednesday"], [3, "Thursday"],
@@ -153,6 +213,8 @@ CallFilterSet = create_filterset(
         {"name": "beat", "rel": "Beat"},
         {"name": "squad", "rel": "Squad", "method": True, "rel": "Squad",
          "lookups": ["exact"]},
+        {"name": "unit", "label": "Unit", "rel": "CallUnit", "method": True,
+         "lookups": ["exact"]},
         {"name": "priority", "rel": "Priority"},
         {"name": "nature", "rel": "Nature"},
         {"name": "nature__nature_group",
@@ -162,5 +224,14 @@ CallFilterSet = create_filterset(
          "options": [[0, "Officer"], [1, "Citizen"]]},
         {"name": "call_source", "rel": "CallSource"},
         {"name": "cancelled", "type": "boolean"},
+        # Substring searches, backed by trigram indexes.
+        {"name": "search", "method": True, "lookups": ["exact"]},
+        {"name": "street_address", "label": "Address",
+         "lookups": ["icontains"]},
     ]
 )
+
+CallCubeFilterSet = create_rollup_filterset(models.CallCube, CallFilterSet)
+
+CallResponseTimeSketchFilterSet = create_rollup_filterset(
+    models.CallResponseTimeSketch, CallFilterSet)
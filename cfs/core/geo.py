@@ -0,0 +1,264 @@
+"""
+Call locations as WGS84 latitudes and longitudes, and clustering them for
+the call map.
+
+Agencies' coordinates (`geox` and `geoy`) can be in any projection, named
+by `Agency.projection`, and flipped. When a call is loaded, `lat_lon`
+reprojects them once into its `lat` and `lon`; `reproject_calls` (or the
+command of the same name) does so for calls already loaded, and must be
+run after an agency's projection or flip setting changes. Projections
+need pyproj, which is optional; agencies without one don't. Without it,
+calls with projected coordinates are loaded without a `lat` and `lon`,
+with a warning, and `reproject_calls` refuses to run until it's installed.
+
+A year of an agency's calls is too many points to send to the browser, so
+the call map asks for the part of the map in view (`bbox`) and its zoom.
+If there are at most CLUSTER_POINT_LIMIT calls in view, or the map is
+zoomed in as far as it goes, they're sent as points. Otherwise they're
+grouped in SQL into a square grid whose cells are about
+1/CLUSTER_GRID_CELLS of the view across, and each cell is sent as the mean
+position of its calls, how many there are and their most common nature.
+Cell sizes are powers of two, so the grid stays put as the map is panned
+at the same zoom.
+"""
+import logging
+import math
+from collections import namedtuple
+from functools import lru_cache, partial
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Aggregate, Avg, Count, F, FloatField, Func, \
+    IntegerField, Max, Min
+
+from .dimensions import dimension_choices
+
+try:
+    import pyproj
+except ImportError:
+    pyproj = None
+
+logger = logging.getLogger(__name__)
+
+WGS84 = '+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs'
+
+# Calls are read and updated this many at a time by reproject_calls.
+REPROJECT_BATCH_SIZE = 10000
+
+# Above this many calls in view, the call map gets clusters instead of
+# points.
+CLUSTER_POINT_LIMIT = 2000
+
+# About how many grid cells span the longer side of the view.
+CLUSTER_GRID_CELLS = 48
+
+# The call map's closest zoom, at which clusters couldn't be split by
+# zooming in, so points are always sent (and clustered by the browser).
+CLUSTER_MAX_ZOOM = 18
+
+MapView = namedtuple('MapView', ['zoom', 'bbox'])
+
+
+@lru_cache()
+def transformer(projection):
+    """
+    A function taking lists of x and y in `projection` to lists of
+    longitude and latitude, or None, with a warning (once), if pyproj isn't
+    installed.
+    """
+    if pyproj is None:
+        logger.warning("pyproj isn't installed, so calls in the projection "
+                       "%r are left without a latitude and longitude. "
+                       "Install it and run reproject_calls.", projection)
+        return None
+    if hasattr(pyproj, 'Transformer'):
+        return pyproj.Transformer.from_proj(
+            pyproj.Proj(projection), pyproj.Proj(WGS84),
+            always_xy=True).transform
+    # pyproj before 2.1.
+    return partial(pyproj.transform, pyproj.Proj(projection),
+                   pyproj.Proj(WGS84))
+
+
+def is_coordinate(value):
+    return value is not None and math.isfinite(value)
+
+
+def lat_lons(agency, points):
+    """
+    The (latitude, longitude) of each of `agency`'s (geox, geoy) `points`,
+    or (None, None) for those missing a coordinate (and for all of them
+    if they need reprojecting without pyproj). Coordinates are
+    reprojected from the agency's projection, if it has one, and then
+    swapped if they're flipped, as the call map used to do in the browser.
+    """
+    points = list(points)
+    results = [(None, None)] * len(points)
+    present = [i for i, (x, y) in enumerate(points)
+               if is_coordinate(x) and is_coordinate(y)]
+    if not present:
+        return results
+
+    xs = [points[i][0] for i in present]
+    ys = [points[i][1] for i in present]
+    if agency is not None and agency.projection:
+        transform = transformer(agency.projection)
+        if transform is None:
+            return results
+        firsts, seconds = transform(xs, ys)
+    else:
+        firsts, seconds = ys, xs
+    if agency is not None and agency.coords_flipped:
+        firsts, seconds = seconds, firsts
+
+    for i, lat, lon in zip(present, firsts, seconds):
+        if is_coordinate(lat) and is_coordinate(lon):
+            results[i] = (float(lat), float(lon))
+    return results
+
+
+def lat_lon(agency, geox, geoy):
+    return lat_lons(agency, [(geox, geoy)])[0]
+
+
+def reproject_calls(agency):
+    """
+    Set `lat` and `lon` on each of the agency's calls from its coordinates,
+    returning how many calls were updated. Raises ImproperlyConfigured if
+    the agency has a projection and pyproj isn't installed.
+    """
+    if agency.projection and pyproj is None:
+        raise ImproperlyConfigured(
+            "Reprojecting {}'s coordinates needs pyproj; pip3 install "
+            "pyproj.".format(agency.code))
+
+    if not agency.projection:
+        # Only a swap at most, which the database can do by itself.
+        lat, lon = ('geox', 'geoy') if agency.coords_flipped else \
+            ('geoy', 'geox')
+        with connection.cursor() as cursor:
+            cursor.execute("""
+            UPDATE call SET
+              lat = CASE WHEN geox = 'NaN' OR geoy = 'NaN' THEN NULL
+                         ELSE {} END,
+              lon = CASE WHEN geox = 'NaN' OR geoy = 'NaN' THEN NULL
+                         ELSE {} END
+            WHERE agency_id = %s
+            """.format(lat, lon), [agency.pk])
+            return cursor.rowcount
+
+    Call = apps.get_model('core', 'Call')
+    qs = Call.objects.filter(agency=agency).order_by('call_id')
+
+    updated = 0
+    last_id = None
+    while True:
+        batch = qs if last_id is None else qs.filter(call_id__gt=last_id)
+        rows = list(batch.values_list('call_id', 'geox', 'geoy')
+                    [:REPROJECT_BATCH_SIZE])
+        if not rows:
+            return updated
+
+        positions = lat_lons(agency, [(x, y) for _, x, y in rows])
+        with connection.cursor() as cursor:
+            values = ", ".join(
+                cursor.mogrify("(%s, %s::float8, %s::float8)",
+                               [call_id, lat, lon]).decode('utf-8')
+                for (call_id, _, _), (lat, lon) in zip(rows, positions))
+            cursor.execute("""
+            UPDATE call SET lat = v.lat, lon = v.lon
+            FROM (VALUES {}) AS v(call_id, lat, lon)
+            WHERE call.call_id = v.call_id
+            """.format(values))
+            updated += cursor.rowcount
+        last_id = rows[-1][0]
+
+
+class Floor(Func):
+    function = 'FLOOR'
+
+
+class Mode(Aggregate):
+    """The most common value, as an ordered-set aggregate."""
+    function = 'MODE'
+    template = '%(function)s() WITHIN GROUP (ORDER BY %(expressions)s)'
+
+
+def parse_zoom(value):
+    """The zoom level in a `zoom` parameter, or None if it's blank. Raises
+    ValueError if it isn't a whole number."""
+    if not value:
+        return None
+    zoom = int(value)
+    if zoom < 0:
+        raise ValueError(value)
+    return zoom
+
+
+def parse_bbox(value):
+    """
+    The (west, south, east, north) in a `bbox` parameter, given as those
+    four longitudes and latitudes separated by commas, or None if it's
+    blank. Raises ValueError if it's malformed.
+    """
+    if not value:
+        return None
+    bbox = tuple(float(n) for n in value.split(','))
+    if len(bbox) != 4 or not all(math.isfinite(n) for n in bbox) or \
+            bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        raise ValueError(value)
+    return bbox
+
+
+def located(queryset):
+    """The calls in `queryset` with a latitude and longitude."""
+    return queryset.filter(lat__isnull=False, lon__isnull=False)
+
+
+def in_bbox(queryset, bbox):
+    if bbox is None:
+        return queryset
+    west, south, east, north = bbox
+    return queryset.filter(lon__gte=west, lon__lte=east,
+                           lat__gte=south, lat__lte=north)
+
+
+def data_bbox(queryset):
+    """The bounding box of the calls in `queryset`, or None if there are
+    none."""
+    bounds = queryset.aggregate(west=Min('lon'), south=Min('lat'),
+                                east=Max('lon'), north=Max('lat'))
+    if bounds['west'] is None:
+        return None
+    return bounds['west'], bounds['south'], bounds['east'], bounds['north']
+
+
+def cell_size(bbox):
+    """The side of the grid's cells for a view of `bbox`."""
+    if bbox is None:
+        return 1.0
+    extent = max(bbox[2] - bbox[0], bbox[3] - bbox[1])
+    if extent <= 0:
+        return 1.0
+    return 2.0 ** math.floor(math.log2(extent / CLUSTER_GRID_CELLS))
+
+
+def grid_clusters(queryset, size):
+    """
+    The calls in `queryset` grouped into cells `size` degrees wide and
+    high, as (mean latitude, mean longitude, count, most common nature)
+    lists, largest first.
+    """
+    natures = {row['id']: row['name'] for row in dimension_choices('Nature')}
+    cells = queryset.order_by() \
+        .annotate(cell_x=Floor(F('lon') / size, output_field=FloatField()),
+                  cell_y=Floor(F('lat') / size, output_field=FloatField())) \
+        .values('cell_x', 'cell_y') \
+        .annotate(count=Count('call_id'),
+                  mean_lat=Avg('lat'),
+                  mean_lon=Avg('lon'),
+                  top_nature=Mode('nature', output_field=IntegerField())) \
+        .order_by('-count')
+    return [[cell['mean_lat'], cell['mean_lon'], cell['count'],
+             natures.get(cell['top_nature'])] for cell in cells]
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.filter_usage import (explain, propose_indexes, read_filter_usage,
+                               table_indexes)
+
+
+class Command(BaseCommand):
+    help = "Propose indexes for the filters recorded in FILTER_USAGE_LOG, " \
+           "and optionally create them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', nargs='?', type=str,
+                            help="The filter usage log to read. Defaults to "
+                                 "FILTER_USAGE_LOG.")
+        parser.add_argument('--min-requests', type=int, default=10,
+                            help="Only propose indexes for predicates used "
+                                 "by at least this many requests.")
+        parser.add_argument('--create', action='store_true', default=False,
+                            help="Create the proposed indexes.")
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.FILTER_USAGE_LOG
+        if not path:
+            raise CommandError("Give a log file or set FILTER_USAGE_LOG.")
+
+        proposals = propose_indexes(read_filter_usage(path),
+                                    options['min_requests'])
+        indexes = {}
+
+        for proposal in proposals:
+            if proposal.table not in indexes:
+                indexes[proposal.table] = table_indexes(proposal.table)
+            if proposal.covered_by(indexes[proposal.table]):
+                continue
+
+            cost, scans = explain(proposal)
+            print("{} requests: {}".format(proposal.requests,
+                                           proposal.example[2]))
+            print("  {};".format(proposal.sql()))
+            print("  now: cost {:.0f}, {}".format(cost, "; ".join(scans)))
+
+            if options['create']:
+                with connection.cursor() as cursor:
+                    cursor.execute(proposal.sql())
+                    cursor.execute("ANALYZE {}".format(proposal.table))
+                indexes[proposal.table] = table_indexes(proposal.table)
+
+                cost, scans = explain(proposal)
+                print("  created: cost {:.0f}, {}".format(
+                    cost, "; ".join(scans)))
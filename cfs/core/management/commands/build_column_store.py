@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.columnar import refresh_column_store
+from core.models import Agency
+
+
+class Command(BaseCommand):
+    help = "Rebuild the columnar copy of each agency's calls in " \
+           "COLUMN_STORE_DIR."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agency', type=str,
+                            help="The code for the agency to rebuild. "
+                                 "Without this option, every agency's store "
+                                 "is rebuilt.")
+
+    def handle(self, *args, **options):
+        if not settings.COLUMN_STORE_DIR:
+            raise CommandError("COLUMN_STORE_DIR is not set.")
+
+        agencies = Agency.objects.all()
+        if options['agency']:
+            agencies = agencies.filter(code=options['agency'])
+
+        for agency in agencies:
+            print("Building column store for {}...".format(agency.code))
+            refresh_column_store(agency, rebuild=True)
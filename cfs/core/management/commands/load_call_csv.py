@@ -26,11 +26,15 @@ from django.core.management.base import BaseCommand
 # - Nature Text
 # - Close Code
 # - Close Text
-from django.db import IntegrityError
 
+from core.columnar import refresh_column_store
+from core.dimensions import invalidate_dimensions
+from core.partitions import ensure_partitions
+from core.shifts import agency_schedules
 from core.models import (District, Beat, Priority, Nature, CallSource,
                          CloseCode, Call, City, Agency, Department,
-                         CallUnit)
+                         CallUnit, update_call_rollups, bump_data_version,
+                         unit_squad_map)
 
 
 def isnan(x):
@@ -140,8 +144,18 @@ class Command(BaseCommand):
             if col in self.df:
                 method()
 
+        # Calls look up their units' squads in the dimension cache.
+        invalidate_dimensions()
+
+        ensure_partitions('call', self.df['Time Received'].dropna())
         self.create_calls(update=options['update'])
 
+        self.log("Updating call summaries")
+        update_call_rollups()
+        bump_data_version(self.agency)
+        refresh_column_store(
+            self.agency, call_ids=list(self.df['Internal ID'].dropna().unique()))
+
     def update_call(self, call, **kwargs):
         for attr, value in kwargs.items():
             setattr(call, attr, value)
@@ -149,10 +163,12 @@ class Command(BaseCommand):
         call.save()
 
     def create_calls(self, update):
+        schedules = agency_schedules(self.agency.pk)
         start = 0
         while start < len(self.df):
             batch = self.df[start:start + self.batch_size]
             calls = []
+            unit_squads = unit_squad_map()
 
             for idx, c in batch.iterrows():
                 safe_get = lambda col: c[col] if col in c else None
@@ -202,20 +218,20 @@ class Command(BaseCommand):
                             primary_unit_id=safe_int(safe_get('Primary Unit ID')),
                             geox=safe_float(c['Longitude']),
                             geoy=safe_float(c['Latitude']))
-                call.update_derived_fields()
+                call.update_derived_fields(unit_squads=unit_squads,
+                                           schedules=schedules)
                 calls.append(call)
 
-            try:
-                Call.objects.bulk_create(calls)
-                self.log("Call {}-{} created".format(start, start + len(batch)))
-                start += self.batch_size
-            except IntegrityError as ex:
-                # TODO fix call
+            # Drop duplicates up front rather than waiting for the insert to
+            # fail: once `call` is partitioned, its primary key includes
+            # time_received, so duplicate IDs received at different times
+            # would go in.
+            unique_calls = uniq_list_by_key(calls, lambda call: call.call_id)
+            if len(unique_calls) < len(calls):
                 self.log("Duplicates found")
-                calls = uniq_list_by_key(calls, lambda call: call.call_id)
-                Call.objects.bulk_create(calls)
-                self.log("Call {}-{} created".format(start, start + len(batch)))
-                start += self.batch_size
+            Call.objects.bulk_create(unique_calls)
+            self.log("Call {}-{} created".format(start, start + len(batch)))
+            start += self.batch_size
 
     def create_beats(self):
         self.log("Creating beats")
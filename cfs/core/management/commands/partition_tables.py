@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.partitions import (PARTITIONED_TABLES, is_partitioned,
+                             partition_table, supports_partitioning)
+
+
+class Command(BaseCommand):
+    help = "Convert the call and call log tables to tables partitioned " \
+           "by month. Requires PostgreSQL 11 or later."
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', type=str,
+                            help="The tables to partition. Without this, "
+                                 "every partitionable table is.")
+
+    def handle(self, *args, **options):
+        if not supports_partitioning():
+            raise CommandError("Partitioning requires PostgreSQL 11 or later.")
+
+        tables = options['tables'] or sorted(PARTITIONED_TABLES)
+        for table in tables:
+            if table not in PARTITIONED_TABLES:
+                raise CommandError("{} can't be partitioned.".format(table))
+
+        for table in tables:
+            if is_partitioned(table):
+                print("{} is already partitioned.".format(table))
+                continue
+
+            print("Partitioning {} by {}...".format(
+                table, PARTITIONED_TABLES[table]))
+            try:
+                keys = partition_table(table, PARTITIONED_TABLES[table])
+            except ValueError as ex:
+                raise CommandError(str(ex))
+            for key in keys:
+                print("Dropped foreign key {}.".format(key))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from core.columnar import refresh_column_store
+from core.models import Agency, bump_data_version, update_call_rollups
+from core.shifts import recompute_shifts
+
+
+class Command(BaseCommand):
+    help = "Recompute the shift each call was received in, after an " \
+           "agency's shift schedules change."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agency', type=str,
+                            help="The code for the agency to recompute. "
+                                 "Without this option, every agency's "
+                                 "calls are.")
+
+    def handle(self, *args, **options):
+        agencies = Agency.objects.all()
+        if options['agency']:
+            agencies = agencies.filter(code=options['agency'])
+
+        changed_agencies = []
+        for agency in agencies:
+            print("Recomputing shifts for {}...".format(agency.code))
+            changed = recompute_shifts(agency)
+            print("{} calls changed shift.".format(changed))
+            if changed:
+                changed_agencies.append(agency)
+
+        if not changed_agencies:
+            return
+
+        print("Updating call summaries...")
+        update_call_rollups()
+        for agency in changed_agencies:
+            bump_data_version(agency)
+            refresh_column_store(agency, rebuild=True)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.geo import reproject_calls
+from core.models import Agency, bump_data_version
+
+
+class Command(BaseCommand):
+    help = "Recompute each call's latitude and longitude from its " \
+           "coordinates, after an agency's projection or flip setting " \
+           "changes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agency', type=str,
+                            help="The code for the agency to reproject. "
+                                 "Without this option, every agency's "
+                                 "calls are.")
+
+    def handle(self, *args, **options):
+        agencies = Agency.objects.all()
+        if options['agency']:
+            agencies = agencies.filter(code=options['agency'])
+
+        for agency in agencies:
+            print("Reprojecting calls for {}...".format(agency.code))
+            updated = reproject_calls(agency)
+            print("{} calls updated.".format(updated))
+            if updated:
+                bump_data_version(agency)
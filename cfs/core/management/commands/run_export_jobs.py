@@ -0,0 +1,41 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.export_jobs import claim_job, export_jobs_enabled, run_job
+
+
+class Command(BaseCommand):
+    help = "Write the files of queued export jobs to EXPORT_JOB_DIR, " \
+           "waiting for more when there are none."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', default=False,
+                            help="Exit once there are no queued jobs "
+                                 "instead of waiting for more.")
+        parser.add_argument('--poll-interval', type=float, default=5,
+                            help="How many seconds to wait between checks "
+                                 "for queued jobs.")
+
+    def handle(self, *args, **options):
+        if not export_jobs_enabled():
+            raise CommandError("EXPORT_JOB_DIR is not set.")
+        os.makedirs(settings.EXPORT_JOB_DIR, exist_ok=True)
+
+        while True:
+            job = claim_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            print("Exporting {}...".format(job))
+            run_job(job)
+            if job.error:
+                print("Failed: {}".format(job.error))
+            else:
+                print("{} calls written to {}.".format(job.rows_written,
+                                                       job.filename))
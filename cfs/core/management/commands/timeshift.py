@@ -1,5 +1,8 @@
 from django.core.management.base import BaseCommand
-from core.models import Call
+from core.columnar import refresh_column_store
+from core.models import Agency, Call, bump_data_version
+from core.partitions import PARTITIONED_TABLES, ensure_partitions, month_starts
+from core.shifts import recompute_shifts
 import datetime as dt
 import math
 from django.db import connection
@@ -16,6 +19,18 @@ class Command(BaseCommand):
         print("Shifting data {} weeks forward...".format(weeks))
 
         if weeks > 0:
+            # Shifted rows move to later months, which may not have
+            # partitions yet.
+            shift = dt.timedelta(weeks=weeks)
+            for table, column in PARTITIONED_TABLES.items():
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT MIN({0}), MAX({0}) FROM {1}".format(
+                        column, table))
+                    first, last = cursor.fetchone()
+                if first is not None:
+                    ensure_partitions(table, month_starts(first + shift,
+                                                          last + shift))
+
             print("Shifting calls...")
             with connection.cursor() as cursor:
                 cursor.execute("""
@@ -37,6 +52,11 @@ class Command(BaseCommand):
                     week_received = EXTRACT(WEEK FROM time_received);
                 """)
 
+                # Schedules that rotate by date may put the shifted calls
+                # in different shifts.
+                for agency in Agency.objects.all():
+                    recompute_shifts(agency)
+
                 print("Shifting call log data...")
                 cursor.execute("""
     UPDATE call_log SET time_recorded = time_recorded + INTERVAL %s;
@@ -63,8 +83,19 @@ class Command(BaseCommand):
 
                 print("Refreshing materialized views...")
                 cursor.execute("""
+    REFRESH MATERIALIZED VIEW call_cube;
+    REFRESH MATERIALIZED VIEW call_response_time_sketch;
+    REFRESH MATERIALIZED VIEW call_daily_stats;
     REFRESH MATERIALIZED VIEW in_call;
     REFRESH MATERIALIZED VIEW officer_activity;
     REFRESH MATERIALIZED VIEW time_sample;
     REFRESH MATERIALIZED VIEW discrete_officer_activity;
+    REFRESH MATERIALIZED VIEW officer_activity_daily_stats;
                 """)
+
+            bump_data_version()
+
+            # Every call's times changed, so the column stores can't be
+            # updated incrementally.
+            for agency in Agency.objects.all():
+                refresh_column_store(agency, rebuild=True)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+
+from django.db import migrations, models
+import django.db.models.deletion
+import core.models
+
+base_dir = os.path.realpath(os.path.dirname(__file__))
+
+
+def sql_path(filename):
+    return os.path.join(base_dir, "sql", filename)
+
+
+with open(sql_path("call_cube.sql")) as f:
+    call_cube_sql = f.read()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0051_agency_coords_flipped'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallCube',
+            fields=[
+                ('call_cube_id', models.IntegerField(serialize=False, primary_key=True)),
+                ('time_received', core.models.DateTimeNoTZField()),
+                ('dow_received', models.IntegerField()),
+                ('hour_received', models.IntegerField()),
+                ('cancelled', models.BooleanField(default=False)),
+                ('call_count', models.IntegerField()),
+                ('response_time_sum', models.FloatField(blank=True, null=True)),
+                ('response_time_count', models.IntegerField()),
+                ('agency', models.ForeignKey(related_name='+', blank=True, null=True, to='core.Agency', on_delete=django.db.models.deletion.DO_NOTHING)),
+                ('beat', models.ForeignKey(related_name='+', blank=True, null=True, to='core.Beat', on_delete=django.db.models.deletion.DO_NOTHING)),
+                ('call_source', models.ForeignKey(related_name='+', blank=True, null=True, to='core.CallSource', on_delete=django.db.models.deletion.DO_NOTHING)),
+                ('district', models.ForeignKey(related_name='+', blank=True, null=True, to='core.District', on_delete=django.db.models.deletion.DO_NOTHING)),
+                ('nature', models.ForeignKey(related_name='+', blank=True, null=True, to='core.Nature', on_delete=django.db.models.deletion.DO_NOTHING)),
+                ('priority', models.ForeignKey(related_name='+', blank=True, null=True, to='core.Priority', on_delete=django.db.models.deletion.DO_NOTHING)),
+            ],
+            options={
+                'db_table': 'call_cube',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(call_cube_sql,
+                          "DROP MATERIALIZED VIEW IF EXISTS call_cube;"),
+    ]
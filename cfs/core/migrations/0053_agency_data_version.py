@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0052_call_cube'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agency',
+            name='data_version',
+            field=models.PositiveIntegerField(
+                default=0, editable=False, help_text="Incremented whenever this agency's data is loaded or updated; used to invalidate cached results."),
+        ),
+    ]
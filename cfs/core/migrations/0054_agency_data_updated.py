@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0053_agency_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agency',
+            name='data_updated',
+            field=models.DateTimeField(blank=True, null=True, editable=False),
+        ),
+    ]
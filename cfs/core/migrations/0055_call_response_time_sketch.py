@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+
+from django.db import migrations, models
+import django.db.models.deletion
+import core.models
+
+base_dir = os.path.realpath(os.path.dirname(__file__))
+
+
+def sql_path(filename):
+    return os.path.join(base_dir, "sql", filename)
+
+
+with open(sql_path("call_response_time_sketch.sql")) as f:
+    sketch_sql = f.read()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0054_agency_data_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallResponseTimeSketch',
+            fields=[
+                ('call_response_time_sketch_id', models.IntegerField(serialize=False, primary_key=True)),
+                ('time_received', core.models.DateTimeNoTZField()),
+                ('dow_received', models.IntegerField()),
+                ('hour_received', models.IntegerField()),
+                ('bucket', models.IntegerField()),
+                ('call_count', models.IntegerField()),
+                ('response_time_sum', models.FloatField()),
+                ('response_time_max', models.FloatField()),
+                ('agency', models.ForeignKey(related_name='+', blank=True, null=True, to='core.Agency', on_delete=django.db.models.deletion.DO_NOTHING)),
+                ('beat', models.ForeignKey(related_name='+', blank=True, null=True, to='core.Beat', on_delete=django.db.models.deletion.DO_NOTHING)),
+                ('priority', models.ForeignKey(related_name='+', blank=True, null=True, to='core.Priority', on_delete=django.db.models.deletion.DO_NOTHING)),
+            ],
+            options={
+                'db_table': 'call_response_time_sketch',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(sketch_sql,
+                          "DROP MATERIALIZED VIEW IF EXISTS call_response_time_sketch;"),
+    ]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.contrib.postgres.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0056_call_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='call',
+            name='unit_ids',
+            field=django.contrib.postgres.fields.ArrayField(size=None, base_field=models.IntegerField(), blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='call',
+            name='squad_ids',
+            field=django.contrib.postgres.fields.ArrayField(size=None, base_field=models.IntegerField(), blank=True, default=list),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE call SET unit_ids = ARRAY(
+              SELECT DISTINCT u
+              FROM UNNEST(ARRAY[primary_unit_id, first_dispatched_id,
+                                reporting_unit_id]) u
+              WHERE u IS NOT NULL
+              ORDER BY u
+            );
+
+            UPDATE call SET squad_ids = ARRAY(
+              SELECT DISTINCT cu.squad_id
+              FROM call_unit cu
+              WHERE cu.call_unit_id = ANY(call.unit_ids)
+                AND cu.squad_id IS NOT NULL
+              ORDER BY cu.squad_id
+            );
+
+            CREATE INDEX call_unit_ids_ndx ON call USING GIN (unit_ids);
+            CREATE INDEX call_squad_ids_ndx ON call USING GIN (squad_ids);
+            """,
+            """
+            DROP INDEX call_unit_ids_ndx;
+            DROP INDEX call_squad_ids_ndx;
+            """
+        ),
+    ]
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+
+from django.db import migrations, models
+
+base_dir = os.path.realpath(os.path.dirname(__file__))
+
+
+def sql_path(filename):
+    return os.path.join(base_dir, "sql", filename)
+
+
+with open(sql_path("call_cube.sql")) as f:
+    old_call_cube_sql = f.read()
+
+with open(sql_path("call_cube2.sql")) as f:
+    call_cube_sql = f.read()
+
+with open(sql_path("call_response_time_sketch.sql")) as f:
+    old_sketch_sql = f.read()
+
+with open(sql_path("call_response_time_sketch2.sql")) as f:
+    sketch_sql = f.read()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0057_call_unit_squad_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShiftSchedule',
+            fields=[
+                ('shift_schedule_id', models.AutoField(serialize=False, primary_key=True)),
+                ('starts_on', models.DateField()),
+                ('rotation_days', models.PositiveIntegerField(default=1, help_text='How many days pass before the periods repeat.')),
+                ('agency', models.ForeignKey(related_name='shift_schedules', to='core.Agency')),
+            ],
+            options={
+                'db_table': 'shift_schedule',
+                'ordering': ['agency', 'starts_on'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='shiftschedule',
+            unique_together=set([('agency', 'starts_on')]),
+        ),
+        migrations.CreateModel(
+            name='ShiftPeriod',
+            fields=[
+                ('shift_period_id', models.AutoField(serialize=False, primary_key=True)),
+                ('shift_number', models.PositiveIntegerField(help_text='Periods of the same shift share a number, which is what calls are filtered and grouped by.')),
+                ('descr', models.TextField(verbose_name='Description')),
+                ('rotation_day', models.PositiveIntegerField(default=0, help_text='The day of the rotation the period starts on, from 0.')),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('shift_schedule', models.ForeignKey(related_name='periods', to='core.ShiftSchedule')),
+            ],
+            options={
+                'db_table': 'shift_period',
+                'ordering': ['shift_schedule', 'rotation_day', 'start_time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='call',
+            name='shift_received',
+            field=models.IntegerField(blank=True, null=True, db_index=True),
+        ),
+        # No agency has a schedule yet, so every call gets the default
+        # shifts; see core.shifts.DEFAULT_PERIODS.
+        migrations.RunSQL(
+            """
+            UPDATE call SET shift_received =
+              CASE WHEN hour_received >= 6 AND hour_received < 18
+                   THEN 0 ELSE 1 END
+            """,
+            migrations.RunSQL.noop
+        ),
+        migrations.AddField(
+            model_name='callcube',
+            name='shift_received',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='callresponsetimesketch',
+            name='shift_received',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunSQL(call_cube_sql, old_call_cube_sql),
+        migrations.RunSQL(sketch_sql, old_sketch_sql),
+    ]
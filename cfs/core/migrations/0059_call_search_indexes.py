@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Django compares `icontains` as UPPER(column) LIKE UPPER(pattern), so the
+# indexes are on the upper-cased columns for the planner to use them.
+SEARCH_COLUMNS = ['street_address', 'business', 'crossroad1', 'crossroad2',
+                  'close_comments']
+
+create_sql = "CREATE EXTENSION IF NOT EXISTS pg_trgm;\n" + "\n".join(
+    "CREATE INDEX call_{0}_trgm_ndx ON call "
+    "USING GIN (UPPER({0}) gin_trgm_ops);".format(column)
+    for column in SEARCH_COLUMNS)
+
+drop_sql = "\n".join("DROP INDEX call_{}_trgm_ndx;".format(column)
+                     for column in SEARCH_COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0058_shift_schedules'),
+    ]
+
+    operations = [
+        migrations.RunSQL(create_sql, drop_sql),
+    ]
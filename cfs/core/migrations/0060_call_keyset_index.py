@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0059_call_search_indexes'),
+    ]
+
+    operations = [
+        # Serves the call list's keyset pages; see core.pagination.
+        migrations.RunSQL(
+            "CREATE INDEX call_agency_time_received_ndx "
+            "ON call (agency_id, time_received, call_id)",
+            "DROP INDEX call_agency_time_received_ndx"
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0060_call_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('export_job_id', models.AutoField(serialize=False, primary_key=True)),
+                ('file_format', models.CharField(max_length=16, default='csv', choices=[('csv', 'CSV'), ('parquet', 'Parquet'), ('arrow', 'Arrow')])),
+                ('query', models.TextField(blank=True, help_text='The filters, as a normalized query string.')),
+                ('status', models.CharField(max_length=16, default='queued', db_index=True, choices=[('queued', 'Queued'), ('running', 'Running'), ('finished', 'Finished'), ('failed', 'Failed')])),
+                ('rows_total', models.BigIntegerField(blank=True, null=True, help_text='How many calls the export has, which may be an estimate.')),
+                ('rows_written', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('agency', models.ForeignKey(related_name='export_jobs', to='core.Agency')),
+            ],
+            options={
+                'db_table': 'export_job',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0061_export_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='call',
+            name='lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='call',
+            name='lon',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='agency',
+            name='projection',
+            field=models.CharField(max_length=1023, blank=True, null=True, help_text="The projection definition for this agency's geo coordinates, as seen on https://github.com/proj4js/proj4js. If you do not know what this is, you likely do not need it. Run the reproject_calls command after changing it."),
+        ),
+        migrations.AlterField(
+            model_name='agency',
+            name='coords_flipped',
+            field=models.BooleanField(default=False, help_text='Are your coordinates flipped in the database? Run the reproject_calls command after changing this.'),
+        ),
+        # Agencies without a projection only need their coordinates copied,
+        # swapped if they're flipped. The others need `reproject_calls`.
+        migrations.RunSQL(
+            """
+            UPDATE call SET
+              lat = CASE WHEN agency.coords_flipped THEN call.geox
+                         ELSE call.geoy END,
+              lon = CASE WHEN agency.coords_flipped THEN call.geoy
+                         ELSE call.geox END
+            FROM agency
+            WHERE call.agency_id = agency.agency_id
+              AND COALESCE(agency.projection, '') = ''
+              AND call.geox <> 'NaN' AND call.geoy <> 'NaN'
+            """,
+            migrations.RunSQL.noop
+        ),
+        # Serves the call map's and tiles' bounding boxes; see core.geo.
+        migrations.RunSQL(
+            "CREATE INDEX call_agency_lat_lon_ndx ON call (agency_id, lat, lon)",
+            "DROP INDEX call_agency_lat_lon_ndx"
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+
+from django.db import migrations
+
+base_dir = os.path.realpath(os.path.dirname(__file__))
+
+
+def sql_path(filename):
+    return os.path.join(base_dir, "sql", filename)
+
+
+with open(sql_path("call_response_time_sketch2.sql")) as f:
+    old_sketch_sql = f.read()
+
+with open(sql_path("call_response_time_sketch3.sql")) as f:
+    sketch_sql = f.read()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0062_call_lat_lon'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sketch_sql, old_sketch_sql),
+    ]
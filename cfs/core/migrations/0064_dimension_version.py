@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0063_response_time_sketch_by_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DimensionVersion',
+            fields=[
+                ('id', models.AutoField(serialize=False, primary_key=True, auto_created=True, verbose_name='ID')),
+                ('generation', models.CharField(max_length=32)),
+            ],
+            options={
+                'db_table': 'dimension_version',
+            },
+        ),
+    ]
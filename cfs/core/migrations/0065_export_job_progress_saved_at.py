@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0064_dimension_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='progress_saved_at',
+            field=models.DateTimeField(blank=True, null=True, help_text='When the running job last saved its progress. Jobs that stop saving it are claimed again.'),
+        ),
+    ]
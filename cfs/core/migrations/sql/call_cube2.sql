@@ -0,0 +1,49 @@
+/*
+Call counts and officer response time totals, rolled up by agency, by the hour
+each call was received in, and by every dimension the call volume and response
+time dashboards filter or group on.
+
+Dashboard requests that only filter on these dimensions are answered from this
+view, which has a row per combination that actually occurs rather than a row
+per call. Refresh it after loading calls.
+*/
+
+DROP MATERIALIZED VIEW IF EXISTS call_cube;
+
+CREATE MATERIALIZED VIEW call_cube AS
+SELECT
+  ROW_NUMBER() OVER (ORDER BY agency_id, time_received) AS call_cube_id,
+  cube.*
+FROM (
+  SELECT
+    agency_id,
+    DATE_TRUNC('hour', time_received) AS time_received,
+    dow_received,
+    hour_received,
+    shift_received,
+    beat_id,
+    district_id,
+    nature_id,
+    priority_id,
+    call_source_id,
+    cancelled,
+    COUNT(*) AS call_count,
+    SUM(EXTRACT(EPOCH FROM officer_response_time)) AS response_time_sum,
+    COUNT(officer_response_time) AS response_time_count
+  FROM call
+  GROUP BY
+    agency_id,
+    DATE_TRUNC('hour', time_received),
+    dow_received,
+    hour_received,
+    shift_received,
+    beat_id,
+    district_id,
+    nature_id,
+    priority_id,
+    call_source_id,
+    cancelled
+) cube;
+
+CREATE UNIQUE INDEX call_cube_call_cube_id_ndx ON call_cube (call_cube_id);
+CREATE INDEX call_cube_agency_time_received_ndx ON call_cube (agency_id, time_received);
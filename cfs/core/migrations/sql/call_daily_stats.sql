@@ -0,0 +1,29 @@
+/*
+The number of calls each agency received on each day, with the first and last
+time a call was received that day.
+
+Dashboard requests that only filter calls by date take their bounds from this
+view rather than scanning the calls. Refresh it after loading calls.
+*/
+
+DROP MATERIALIZED VIEW IF EXISTS call_daily_stats;
+
+CREATE MATERIALIZED VIEW call_daily_stats AS
+SELECT
+  ROW_NUMBER() OVER (ORDER BY agency_id, day) AS call_daily_stats_id,
+  stats.*
+FROM (
+  SELECT
+    agency_id,
+    time_received::date AS day,
+    COUNT(*) AS row_count,
+    MIN(time_received) AS min_time,
+    MAX(time_received) AS max_time
+  FROM call
+  GROUP BY
+    agency_id,
+    time_received::date
+) stats;
+
+CREATE UNIQUE INDEX call_daily_stats_call_daily_stats_id_ndx ON call_daily_stats (call_daily_stats_id);
+CREATE INDEX call_daily_stats_agency_day_ndx ON call_daily_stats (agency_id, day);
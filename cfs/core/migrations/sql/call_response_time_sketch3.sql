@@ -0,0 +1,49 @@
+/*
+Histograms of officer response times, with a row per agency, day received,
+hour of the day, shift, beat, priority and logarithmic bucket. Bucket i counts
+the response times in (1.02 ^ (i - 1), 1.02 ^ i] seconds; see
+core/sketches.py, whose GAMMA must match the base used here.
+
+Histograms for any set of cells merge by summing their counts, so response
+time quartiles for filters on these dimensions can be estimated without
+sorting every call. Only positive response times are counted, as in
+CallResponseTimeOverview.officer_response_time.
+
+Times are kept by the day (the hour of the day is a column of its own), so
+each cell holds many calls; filters on time received have to be by whole days.
+*/
+
+DROP MATERIALIZED VIEW IF EXISTS call_response_time_sketch;
+
+CREATE MATERIALIZED VIEW call_response_time_sketch AS
+SELECT
+  ROW_NUMBER() OVER (ORDER BY agency_id, time_received) AS call_response_time_sketch_id,
+  sketch.*
+FROM (
+  SELECT
+    agency_id,
+    DATE_TRUNC('day', time_received) AS time_received,
+    dow_received,
+    hour_received,
+    shift_received,
+    beat_id,
+    priority_id,
+    CEIL(LN(EXTRACT(EPOCH FROM officer_response_time)) / LN(1.02))::integer AS bucket,
+    COUNT(*) AS call_count,
+    SUM(EXTRACT(EPOCH FROM officer_response_time)) AS response_time_sum,
+    MAX(EXTRACT(EPOCH FROM officer_response_time)) AS response_time_max
+  FROM call
+  WHERE officer_response_time > INTERVAL '0'
+  GROUP BY
+    agency_id,
+    DATE_TRUNC('day', time_received),
+    dow_received,
+    hour_received,
+    shift_received,
+    beat_id,
+    priority_id,
+    bucket
+) sketch;
+
+CREATE UNIQUE INDEX call_response_time_sketch_id_ndx ON call_response_time_sketch (call_response_time_sketch_id);
+CREATE INDEX call_response_time_sketch_agency_time_received_ndx ON call_response_time_sketch (agency_id, time_received);
@@ -14,9 +14,13 @@ from datetime import timedelta
 
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.db import models
-from django.db.models import Q
-from pg.view import MaterializedView
+from django.db import models, connection
+from django.db.models import Min, Max, Q, Sum
+from django.utils import timezone
+from pg.view import MaterializedView, ViewManager
+from .dimensions import dimension_get, dimension_map
+from .geo import lat_lon
+from .shifts import shift_number
 from django.contrib.postgres.fields import ArrayField
 from solo.models import SingletonModel
 from adminsortable.models import SortableMixin
@@ -53,6 +57,18 @@ class SiteConfiguration(SingletonModel):
         verbose_name = "* Site Configuration"
 
 
+class DimensionVersion(models.Model):
+    """
+    The generation of the dimension cache (see core.dimensions), kept in
+    the database so that every process sees when it changes. There's only
+    ever one row.
+    """
+    generation = models.CharField(max_length=32)
+
+    class Meta:
+        db_table = 'dimension_version'
+
+
 class DateTimeNoTZField(models.DateTimeField):
     """
     Django automatically creates datetime fields as timestamp with
@@ -65,27 +81,90 @@ class DateTimeNoTZField(models.DateTimeField):
         return 'timestamp without time zone'
 
 
-def update_materialized_view_dependencies(view):
-    dependencies = view.dependencies()
-    updated_views = set()
+def update_materialized_view_dependencies(view, updated_views=None):
+    if updated_views is None:
+        updated_views = set()
 
-    if len(dependencies) > 0:
-        for dependency in dependencies:
-            update_materialized_view_dependencies(dependency)
-            updated_views.add(dependency)
+    for dependency in view.dependencies():
+        if dependency not in updated_views:
+            update_materialized_view_dependencies(dependency, updated_views)
 
     view.update_view()
     updated_views.add(view)
     return updated_views
 
 
-def update_materialized_views():
+def update_materialized_views(bump_versions=True):
+    """
+    Refresh every materialized view. Unless `bump_versions` is false, every
+    agency's data version is then bumped, and its column store carried
+    forward to the new version. Loaders that bump and refresh their own
+    agency's version pass false, since no other agency's data changed.
+    """
+    from .columnar import refresh_column_store
+
     updated_views = set()
 
     for view_cls in MaterializedView.__subclasses__():
         if view_cls not in updated_views:
-            new_updated_views = update_materialized_view_dependencies(view_cls)
-            updated_views.update(new_updated_views)
+            update_materialized_view_dependencies(view_cls, updated_views)
+
+    if bump_versions:
+        bump_data_version()
+        for agency in Agency.objects.all():
+            refresh_column_store(agency)
+
+
+def unit_squad_map():
+    """The squad of each call unit, by the unit's id, from the dimension
+    cache."""
+    return dimension_map('CallUnit', 'call_unit_id', 'squad_id')
+
+
+def update_call_squads(call_unit_ids=None):
+    """
+    Recompute `Call.squad_ids` from the units' current squads, for the calls
+    involving any of `call_unit_ids` or, if it's None, for every call. Run
+    this after changing units' squads without saving each unit.
+    """
+    sql = """
+    UPDATE call SET squad_ids = ARRAY(
+      SELECT DISTINCT cu.squad_id
+      FROM call_unit cu
+      WHERE cu.call_unit_id = ANY(call.unit_ids)
+        AND cu.squad_id IS NOT NULL
+      ORDER BY cu.squad_id
+    )
+    """
+    params = []
+    if call_unit_ids is not None:
+        sql += "WHERE call.unit_ids && %s::integer[]"
+        params.append(list(call_unit_ids))
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def update_call_rollups():
+    """
+    Refresh the materialized views that summarize calls; run this after
+    loading or changing calls.
+    """
+    CallCube.update_view()
+    CallResponseTimeSketch.update_view()
+    CallDailyStats.update_view()
+
+
+def bump_data_version(agency=None):
+    """
+    Mark an agency's data (or every agency's, if none is given) as changed,
+    invalidating anything cached from it.
+    """
+    agencies = Agency.objects.all()
+    if agency is not None:
+        agencies = agencies.filter(pk=agency.pk)
+    agencies.update(data_version=models.F('data_version') + 1,
+                    data_updated=timezone.now())
 
 
 class ModelWithDescr(models.Model):
@@ -141,12 +220,19 @@ class Agency(models.Model):
         max_length=1023,
         blank=True,
         null=True,
-        help_text="The projection definition for this agency's geo coordinates, as seen on https://github.com/proj4js/proj4js. If you do not know what this is, you likely do not need it."
+        help_text="The projection definition for this agency's geo coordinates, as seen on https://github.com/proj4js/proj4js. If you do not know what this is, you likely do not need it. Run the reproject_calls command after changing it."
     )
     coords_flipped = models.BooleanField(
         default=False,
-        help_text="Are your coordinates flipped in the database?"
+        help_text="Are your coordinates flipped in the database? Run the reproject_calls command after changing this."
+    )
+    data_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Incremented whenever this agency's data is loaded or "
+                  "updated; used to invalidate cached results."
     )
+    data_updated = models.DateTimeField(blank=True, null=True, editable=False)
 
     class Meta:
         verbose_name_plural = 'agencies'
@@ -169,42 +255,62 @@ class Bureau(ModelWithDescr):
         db_table = 'bureau'
 
 
-class CallQuerySet(models.QuerySet):
+def self_initiated_source_id():
+    return dimension_get('CallSource',
+                         is_self_initiated=True)['call_source_id']
 
-    def squad(self, value):
-        if value:
-            query = Q(primary_unit__squad_id=value) | Q(
-                first_dispatched__squad_id=value) | Q(
-                    reporting_unit__squad_id=value)
-            return self.filter(query)
+
+class CallDimensionQuerySet(models.QuerySet):
+    """
+    Filter methods shared by calls and the rollups built from them.
+    """
+
+    def initiated_by(self, value):
+        if str(value) == "0":
+            return self.filter(call_source_id=self_initiated_source_id())
+        elif str(value) == "1":
+            return self.exclude(call_source_id=self_initiated_source_id())
         else:
             return self
 
-    def unit(self, value):
+    def shift(self, value):
+        if value not in (None, ''):
+            return self.filter(shift_received=int(value))
+        else:
+            return self
+
+
+# The text columns the `search` filter looks in. Each has a trigram index on
+# its upper-cased value, which is what `icontains` compares; see migration
+# 0059_call_search_indexes.
+SEARCH_FIELDS = ('street_address', 'business', 'crossroad1', 'crossroad2',
+                 'close_comments')
+
+
+class CallQuerySet(CallDimensionQuerySet):
+
+    def search(self, value):
+        value = (value or '').strip()
         if value:
-            query = Q(primary_unit_id=value) | Q(
-                first_dispatched_id=value) | Q(reporting_unit_id=value)
+            query = Q()
+            for field in SEARCH_FIELDS:
+                query |= Q(**{field + '__icontains': value})
             return self.filter(query)
         else:
             return self
 
-    def initiated_by(self, value):
-        if str(value) == "0":
-            return self.filter(call_source=CallSource.objects.get(
-                is_self_initiated=True))
-        elif str(value) == "1":
-            return self.exclude(call_source=CallSource.objects.get(
-                is_self_initiated=True))
+    # Both of these use the GIN-indexed arrays maintained on each call; see
+    # Call.update_derived_fields and update_call_squads.
+
+    def squad(self, value):
+        if value:
+            return self.filter(squad_ids__contains=[int(value)])
         else:
             return self
 
-    def shift(self, value):
-        if str(value) == "0":
-            query = Q(hour_received__gte=6) & Q(hour_received__lt=18)
-            return self.filter(query)
-        elif str(value) == "1":
-            query = Q(hour_received__lt=6) | Q(hour_received__gte=18)
-            return self.filter(query)
+    def unit(self, value):
+        if value:
+            return self.filter(unit_ids__contains=[int(value)])
         else:
             return self
 
@@ -224,6 +330,10 @@ class Call(models.Model):
     week_received = models.IntegerField(db_index=True)
     dow_received = models.IntegerField(db_index=True)
     hour_received = models.IntegerField(db_index=True)
+    # The number of the agency's shift the call was received in; see
+    # core.shifts.
+    shift_received = models.IntegerField(blank=True, null=True,
+                                         db_index=True)
     case_id = models.BigIntegerField(blank=True, null=True)
     call_source = models.ForeignKey('CallSource', blank=True, null=True)
     primary_unit = models.ForeignKey(
@@ -239,6 +349,10 @@ class Call(models.Model):
     crossroad2 = models.TextField(blank=True, null=True)
     geox = models.FloatField(blank=True, null=True)
     geoy = models.FloatField(blank=True, null=True)
+    # The WGS84 latitude and longitude of geox and geoy, reprojected with the
+    # agency's projection when the call is loaded; see core.geo.
+    lat = models.FloatField(blank=True, null=True)
+    lon = models.FloatField(blank=True, null=True)
     beat = models.ForeignKey(Beat, blank=True, null=True)
     district = models.ForeignKey('District', blank=True, null=True)
     business = models.TextField(blank=True, null=True)
@@ -260,12 +374,35 @@ class Call(models.Model):
     overall_response_time = models.DurationField(blank=True, null=True)
     department = models.ForeignKey('Department', blank=True, null=True)
 
-    def update_derived_fields(self):
+    # The primary, first dispatched and reporting units, and their squads,
+    # denormalized so the squad and unit filters can use a GIN index.
+    unit_ids = ArrayField(models.IntegerField(), blank=True, default=list)
+    squad_ids = ArrayField(models.IntegerField(), blank=True, default=list)
+
+    def update_derived_fields(self, unit_squads=None, schedules=None):
+        """
+        Set the fields computed from the others. Loaders can look up the
+        `unit_squads` map (see `unit_squad_map`) and the agency's shift
+        `schedules` (see `core.shifts.agency_schedules`) once for many
+        calls and pass them in.
+        """
+        self.unit_ids = sorted({self.primary_unit_id,
+                                self.first_dispatched_id,
+                                self.reporting_unit_id} - {None})
+        if unit_squads is None:
+            unit_squads = unit_squad_map()
+        self.squad_ids = sorted({unit_squads.get(unit_id)
+                                 for unit_id in self.unit_ids} - {None})
+
         self.month_received = self.time_received.month
         self.hour_received = self.time_received.hour
+        self.shift_received = shift_number(self.agency_id, self.time_received,
+                                           schedules)
         self.year_received, self.week_received, _ = \
             self.time_received.isocalendar()
         self.dow_received = self.time_received.weekday()
+        self.lat, self.lon = lat_lon(self.agency if self.agency_id else None,
+                                     self.geox, self.geoy)
 
         if self.first_unit_arrive is not None and self.time_received is not \
                 None:
@@ -299,6 +436,135 @@ class Call(models.Model):
         index_together = [['dow_received', 'hour_received']]
 
 
+class CallCube(MaterializedView):
+    """
+    Call counts and officer response time totals rolled up by hour and by
+    the dimensions the dashboards filter and group on.
+
+    `time_received` holds the hour each group of calls was received in, so
+    date filters line up with it exactly.
+    """
+    objects = ViewManager.from_queryset(CallDimensionQuerySet)()
+
+    # The filters (by their first component) the cube can answer.
+    dimensions = ('time_received', 'shift', 'dow_received', 'district',
+                  'beat', 'priority', 'nature', 'initiated_by',
+                  'call_source', 'cancelled')
+
+    call_cube_id = models.IntegerField(primary_key=True)
+    agency = models.ForeignKey('Agency', blank=True, null=True,
+                               related_name="+",
+                               on_delete=models.DO_NOTHING)
+    time_received = DateTimeNoTZField()
+    dow_received = models.IntegerField()
+    hour_received = models.IntegerField()
+    shift_received = models.IntegerField(blank=True, null=True)
+    beat = models.ForeignKey('Beat', blank=True, null=True, related_name="+",
+                             on_delete=models.DO_NOTHING)
+    district = models.ForeignKey('District', blank=True, null=True,
+                                 related_name="+",
+                                 on_delete=models.DO_NOTHING)
+    nature = models.ForeignKey('Nature', blank=True, null=True,
+                               related_name="+",
+                               on_delete=models.DO_NOTHING)
+    priority = models.ForeignKey('Priority', blank=True, null=True,
+                                 related_name="+",
+                                 on_delete=models.DO_NOTHING)
+    call_source = models.ForeignKey('CallSource', blank=True, null=True,
+                                    related_name="+",
+                                    on_delete=models.DO_NOTHING)
+    cancelled = models.BooleanField(default=False)
+    call_count = models.IntegerField()
+    response_time_sum = models.FloatField(blank=True, null=True)
+    response_time_count = models.IntegerField()
+
+    class Meta:
+        db_table = 'call_cube'
+        managed = False
+
+
+class CallResponseTimeSketch(MaterializedView):
+    """
+    Histograms of positive officer response times by day, hour of the day,
+    shift, beat and priority; see core.sketches.
+    """
+    objects = ViewManager.from_queryset(CallDimensionQuerySet)()
+
+    # The filters (by their first component) the sketches can answer.
+    dimensions = ('time_received', 'shift', 'dow_received', 'beat',
+                  'priority')
+
+    call_response_time_sketch_id = models.IntegerField(primary_key=True)
+    agency = models.ForeignKey('Agency', blank=True, null=True,
+                               related_name="+",
+                               on_delete=models.DO_NOTHING)
+    time_received = DateTimeNoTZField()
+    dow_received = models.IntegerField()
+    hour_received = models.IntegerField()
+    shift_received = models.IntegerField(blank=True, null=True)
+    beat = models.ForeignKey('Beat', blank=True, null=True, related_name="+",
+                             on_delete=models.DO_NOTHING)
+    priority = models.ForeignKey('Priority', blank=True, null=True,
+                                 related_name="+",
+                                 on_delete=models.DO_NOTHING)
+    bucket = models.IntegerField()
+    call_count = models.IntegerField()
+    response_time_sum = models.FloatField()
+    response_time_max = models.FloatField()
+
+    class Meta:
+        db_table = 'call_response_time_sketch'
+        managed = False
+
+
+class DailyStatsQuerySet(models.QuerySet):
+
+    def days(self, start=None, end=None):
+        """The days between `start` and `end` (inclusive; either may be
+        None)."""
+        qs = self
+        if start is not None:
+            qs = qs.filter(day__gte=start)
+        if end is not None:
+            qs = qs.filter(day__lte=end)
+        return qs
+
+    def bounds(self, start=None, end=None):
+        """
+        The first and last times from the days between `start` and `end`,
+        in the same form as aggregating the underlying rows' Min and Max
+        times.
+        """
+        return self.days(start, end).aggregate(min_time=Min('min_time'),
+                                               max_time=Max('max_time'))
+
+    def total(self, start=None, end=None):
+        """The number of rows from the days between `start` and `end`."""
+        return self.days(start, end) \
+            .aggregate(total=Sum('row_count'))['total'] or 0
+
+
+class CallDailyStats(MaterializedView):
+    """
+    The number of calls each agency received each day, and the first and
+    last time one was received.
+    """
+    objects = ViewManager.from_queryset(DailyStatsQuerySet)()
+
+    call_daily_stats_id = models.IntegerField(primary_key=True)
+    agency = models.ForeignKey('Agency', blank=True, null=True,
+                               related_name="+",
+                               on_delete=models.DO_NOTHING)
+    day = models.DateField()
+    row_count = models.IntegerField()
+    min_time = DateTimeNoTZField()
+    max_time = DateTimeNoTZField()
+
+    class Meta:
+        db_table = 'call_daily_stats'
+        managed = False
+
+
 class CallLog(models.Model):
     call_log_id = models.AutoField(primary_key=True)
     call = models.ForeignKey('Call', blank=True, null=True)
@@ -339,6 +605,19 @@ class CallUnit(models.Model):
         else:
             return super().__str__()
 
+    def save(self, *args, **kwargs):
+        squad_changed = False
+        if self.pk is not None:
+            old_squad_ids = CallUnit.objects.filter(pk=self.pk) \
+                .values_list('squad_id', flat=True)
+            squad_changed = any(squad_id != self.squad_id
+                                for squad_id in old_squad_ids)
+
+        super().save(*args, **kwargs)
+
+        if squad_changed:
+            update_call_squads([self.pk])
+
     class Meta:
         db_table = 'call_unit'
         ordering = ['descr']
@@ -392,6 +671,74 @@ class Division(ModelWithDescr):
         db_table = 'division'
 
 
+class ExportJob(models.Model):
+    """
+    An export of an agency's calls, written in the background by the
+    run_export_jobs command and downloaded once it's finished; see
+    core.export_jobs.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (FINISHED, "Finished"),
+        (FAILED, "Failed"),
+    )
+    FORMAT_CHOICES = (
+        ('csv', "CSV"),
+        ('parquet', "Parquet"),
+        ('arrow', "Arrow"),
+    )
+
+    export_job_id = models.AutoField(primary_key=True)
+    agency = models.ForeignKey('Agency', related_name="export_jobs")
+    file_format = models.CharField(max_length=16, choices=FORMAT_CHOICES,
+                                   default='csv')
+    query = models.TextField(
+        blank=True,
+        help_text="The filters, as a normalized query string.")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES,
+                              default=QUEUED, db_index=True)
+    rows_total = models.BigIntegerField(
+        blank=True, null=True,
+        help_text="How many calls the export has, which may be an "
+                  "estimate.")
+    rows_written = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    progress_saved_at = models.DateTimeField(
+        blank=True, null=True,
+        help_text="When the running job last saved its progress. Jobs that "
+                  "stop saving it are claimed again.")
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    @property
+    def filename(self):
+        return 'calls-{}.{}'.format(self.pk, self.file_format)
+
+    @property
+    def progress(self):
+        """The fraction of the calls written, or None before they're
+        counted. The count may be an estimate, so this stops at 1."""
+        if self.status == self.FINISHED:
+            return 1.0
+        if not self.rows_total:
+            return None
+        return min(self.rows_written / self.rows_total, 1.0)
+
+    def __str__(self):
+        return "{} export {} for {}".format(self.get_file_format_display(),
+                                            self.pk, self.agency)
+
+    class Meta:
+        db_table = 'export_job'
+        ordering = ['created_at']
+
+
 class Nature(ModelWithDescr):
     nature_id = models.AutoField(primary_key=True)
     nature_group = models.ForeignKey('NatureGroup', blank=True, null=True)
@@ -438,6 +785,58 @@ class Shift(models.Model):
         db_table = 'shift'
 
 
+class ShiftSchedule(models.Model):
+    """
+    How an agency divides its days into shifts, from `starts_on` until its
+    next schedule starts. An agency's first schedule also covers the calls
+    before it.
+
+    The periods of a schedule repeat every `rotation_days` days, counted
+    from `starts_on`, so schedules that change from day to day can be
+    described too.
+    """
+    shift_schedule_id = models.AutoField(primary_key=True)
+    agency = models.ForeignKey('Agency', related_name="shift_schedules")
+    starts_on = models.DateField()
+    rotation_days = models.PositiveIntegerField(
+        default=1,
+        help_text="How many days pass before the periods repeat.")
+
+    def __str__(self):
+        return "{} from {}".format(self.agency, self.starts_on)
+
+    class Meta:
+        db_table = 'shift_schedule'
+        ordering = ['agency', 'starts_on']
+        unique_together = [['agency', 'starts_on']]
+
+
+class ShiftPeriod(models.Model):
+    """
+    The part of a day in a shift schedule's rotation that belongs to a
+    shift. A period whose end time isn't after its start time runs past
+    midnight into the next day.
+    """
+    shift_period_id = models.AutoField(primary_key=True)
+    shift_schedule = models.ForeignKey(ShiftSchedule, related_name="periods")
+    shift_number = models.PositiveIntegerField(
+        help_text="Periods of the same shift share a number, which is what "
+                  "calls are filtered and grouped by.")
+    descr = models.TextField("Description")
+    rotation_day = models.PositiveIntegerField(
+        default=0,
+        help_text="The day of the rotation the period starts on, from 0.")
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    def __str__(self):
+        return self.descr
+
+    class Meta:
+        db_table = 'shift_period'
+        ordering = ['shift_schedule', 'rotation_day', 'start_time']
+
+
 class ShiftUnit(models.Model):
     shift_unit_id = models.AutoField(primary_key=True)
     call_unit = models.ForeignKey(
@@ -0,0 +1,123 @@
+"""
+Keyset pagination for the call list.
+
+Page number pagination counts the filtered calls and skips `OFFSET` rows
+for every page, so late pages of an agency's whole history are slow.
+`KeysetPagination` instead orders calls by (time_received, call_id), which
+call_agency_time_received_ndx covers, and starts each page after the last
+row of the one before, so every page costs the same. Its cursors are
+opaque tokens naming that row and the direction to read in.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from dateutil.parser import parse as dtparse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .counts import count_rows, wants_exact_count
+
+
+def encode_cursor(time_received, call_id, reverse=False):
+    data = json.dumps([time_received.isoformat(), call_id, reverse])
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """The (time received, call id, reverse) a cursor names."""
+    try:
+        data = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        time_received, call_id, reverse = json.loads(data.decode('utf-8'))
+        return dtparse(time_received), str(call_id), bool(reverse)
+    except (TypeError, ValueError):
+        raise NotFound("Invalid cursor.")
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pages of calls after (or, for previous pages, before) a cursor. Pass an
+    empty `cursor` for the first page, and `count=true` to include the
+    number of calls matching the filters in it, which may be an estimate;
+    see core.counts.
+    The order is fixed, so `ordering` is ignored.
+    """
+    page_size = 50
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+
+        if cursor:
+            time_received, call_id, self.reverse = decode_cursor(cursor)
+            operator = '<' if self.reverse else '>'
+            queryset = queryset.extra(
+                where=['(call.time_received, call.call_id) {} (%s, %s)'
+                       .format(operator)],
+                params=[time_received, call_id])
+        else:
+            self.reverse = False
+
+        # Later pages leave the count out; clients keep the first one.
+        self.count = None
+        if not cursor and request.query_params.get(
+                self.count_query_param) in ('1', 'true'):
+            self.count, self.count_exact = count_rows(
+                queryset, wants_exact_count(request.query_params))
+
+        if self.reverse:
+            queryset = queryset.order_by('-time_received', '-call_id')
+        else:
+            queryset = queryset.order_by('time_received', 'call_id')
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        self.rows = rows
+        # Going forward, there's a previous page if we started after a
+        # cursor; going back, there's a next page.
+        self.has_next = self.has_more if not self.reverse else True
+        self.has_previous = bool(cursor) if not self.reverse else \
+            self.has_more
+        return rows
+
+    def position(self, row):
+        """The time received and id of a call or a `values()` row."""
+        if isinstance(row, dict):
+            return row['time_received'], row['call_id']
+        return row.time_received, row.call_id
+
+    def page_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.count_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param,
+            encode_cursor(*self.position(row), reverse=reverse))
+
+    def get_next_link(self):
+        if not self.rows or not self.has_next:
+            return None
+        return self.page_link(self.rows[-1], False)
+
+    def get_previous_link(self):
+        if not self.rows or not self.has_previous:
+            return None
+        return self.page_link(self.rows[0], True)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+        if self.count is not None:
+            response['count'] = self.count
+            response['count_exact'] = self.count_exact
+        return Response(response)
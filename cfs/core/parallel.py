@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.query import QuerySet
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    """
+    The process-wide pool sections run on. It's shared between requests so
+    the number of extra database connections stays bounded by
+    SUMMARY_SECTION_WORKERS.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SUMMARY_SECTION_WORKERS)
+    return _executor
+
+
+def run_section(func):
+    # Each worker thread gets its own database connection from Django;
+    # evaluate the result here and close it so it isn't left idle.
+    try:
+        result = func()
+        if isinstance(result, QuerySet):
+            result = list(result)
+        return result
+    finally:
+        connections.close_all()
+
+
+def run_sections(sections):
+    """
+    Compute a dict of independent summary sections, given as an ordered
+    mapping of names to callables.
+
+    With SUMMARY_SECTION_WORKERS set above 1, the sections run concurrently,
+    each on its own connection, so they may see slightly different
+    snapshots of the data if it's being loaded at the same time. Otherwise
+    they run one after another on the request's connection.
+    """
+    if settings.SUMMARY_SECTION_WORKERS <= 1 or len(sections) <= 1:
+        return OrderedDict((name, func()) for name, func in sections.items())
+
+    executor = get_executor()
+    futures = [(name, executor.submit(run_section, func))
+               for name, func in sections.items()]
+    return OrderedDict((name, future.result()) for name, future in futures)
@@ -0,0 +1,274 @@
+"""
+Monthly range partitioning of the largest, time-keyed tables.
+
+`partition_table` converts a table in place to a partitioned table with one
+partition per month of its partition column, plus a default partition for
+rows where that column is null. Postgres then skips the partitions a query's
+time bounds rule out, so date-bounded queries only read the months they
+cover. This needs PostgreSQL 11 or later; see the `partition_tables` command.
+
+Loaders have to call `ensure_partitions` before inserting rows, since rows
+for a month without a partition would otherwise land in the default one.
+It does nothing for tables that haven't been partitioned.
+"""
+import datetime
+
+from django.db import connection, transaction
+
+# Each partitionable table, mapped to the column it's partitioned on.
+PARTITIONED_TABLES = {
+    'call': 'time_received',
+    'call_log': 'time_recorded',
+}
+
+MIN_SERVER_VERSION = 110000
+
+
+def supports_partitioning():
+    return connection.pg_version >= MIN_SERVER_VERSION
+
+
+def month_start(time):
+    return datetime.date(time.year, time.month, 1)
+
+
+def next_month(month):
+    if month.month == 12:
+        return datetime.date(month.year + 1, 1, 1)
+    return datetime.date(month.year, month.month + 1, 1)
+
+
+def month_starts(start, end):
+    """The first day of each month from `start`'s through `end`'s."""
+    month, last = month_start(start), month_start(end)
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def partition_name(table, month):
+    return '{}_y{:04d}m{:02d}'.format(table, month.year, month.month)
+
+
+def is_partitioned(table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass",
+                       [table])
+        return cursor.fetchone()[0] == 'p'
+
+
+def create_partition(cursor, table, month):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} "
+        "FOR VALUES FROM (%s) TO (%s)".format(partition_name(table, month),
+                                              table),
+        [month, next_month(month)])
+
+
+def ensure_partitions(table, times):
+    """
+    Create the partitions of `table` for every month one of `times` falls
+    in, if `table` is partitioned. None values are ignored.
+    """
+    months = {month_start(time) for time in times if time is not None}
+    if not months or not is_partitioned(table):
+        return
+
+    with connection.cursor() as cursor:
+        for month in sorted(months):
+            create_partition(cursor, table, month)
+
+
+def dependent_views(table):
+    """
+    The views and materialized views that depend on `table`, directly or
+    through other views, in an order they can be created in. Each is a
+    (name, relkind, definition, index definitions) tuple.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+        WITH RECURSIVE deps(oid, depends_on) AS (
+          SELECT r.ev_class, d.refobjid
+          FROM pg_depend d
+          JOIN pg_rewrite r ON r.oid = d.objid
+          WHERE d.refobjid = %s::regclass
+            AND r.ev_class <> d.refobjid
+          UNION
+          SELECT r.ev_class, d.refobjid
+          FROM deps
+          JOIN pg_depend d ON d.refobjid = deps.oid
+          JOIN pg_rewrite r ON r.oid = d.objid
+          WHERE r.ev_class <> d.refobjid
+        )
+        SELECT c.relname, c.relkind, pg_get_viewdef(c.oid),
+               ARRAY(SELECT indexdef FROM pg_indexes i
+                     WHERE i.tablename = c.relname),
+               ARRAY(SELECT DISTINCT dep.relname
+                     FROM deps JOIN pg_class dep ON dep.oid = deps.depends_on
+                     WHERE deps.oid = c.oid)
+        FROM pg_class c
+        WHERE c.oid IN (SELECT oid FROM deps)
+        """, [table])
+        rows = cursor.fetchall()
+
+    views = {name: (name, relkind, definition, indexes)
+             for name, relkind, definition, indexes, _ in rows}
+    depends_on = {name: set(deps) & set(views)
+                  for name, _, _, _, deps in rows}
+
+    ordered = []
+    while depends_on:
+        ready = sorted(name for name, deps in depends_on.items()
+                       if not deps - set(ordered))
+        ordered.extend(ready)
+        for name in ready:
+            del depends_on[name]
+    return [views[name] for name in ordered]
+
+
+def partition_table(table, column):
+    """
+    Replace `table` with a copy partitioned by month on `column`, keeping
+    its data, columns, defaults, indexes, outgoing foreign keys and the
+    views that depend on it.
+
+    Postgres requires a partitioned table's unique indexes to include the
+    partition column, so the primary key becomes (pk, `column`), or a
+    unique index on them if `column` is nullable, and `column` is appended
+    to the table's other unique indexes. The pk alone is then no longer
+    guaranteed to be unique: two rows can share it if their `column`s
+    differ. Foreign keys referencing `table` can't point at that, so
+    they're dropped; their names are returned.
+    """
+    old_table = '{}_unpartitioned'.format(table)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        views = dependent_views(table)
+        for name, relkind, _, _ in reversed(views):
+            cursor.execute("DROP {} {}".format(
+                "MATERIALIZED VIEW" if relkind == 'm' else "VIEW", name))
+
+        cursor.execute("""
+        SELECT conrelid::regclass::text, conname
+        FROM pg_constraint
+        WHERE confrelid = %s::regclass AND contype = 'f'
+        """, [table])
+        inbound_keys = cursor.fetchall()
+        for referencing_table, name in inbound_keys:
+            cursor.execute("ALTER TABLE {} DROP CONSTRAINT {}".format(
+                referencing_table, name))
+
+        cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+          AND (SELECT relkind FROM pg_class WHERE oid = confrelid) <> 'p'
+        """, [table])
+        outbound_keys = cursor.fetchall()
+
+        cursor.execute("""
+        SELECT a.attname
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid
+         AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = %s::regclass AND i.indisprimary
+        """, [table])
+        pk_columns = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute("""
+        SELECT indexdef FROM pg_indexes i
+        JOIN pg_index ix ON ix.indexrelid = (i.schemaname || '.' ||
+                                             i.indexname)::regclass
+        WHERE i.tablename = %s AND NOT ix.indisprimary AND NOT ix.indisunique
+        """, [table])
+        indexes = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute("""
+        SELECT c.relname,
+               ARRAY(SELECT a.attname
+                     FROM unnest(ix.indkey) WITH ORDINALITY k(attnum, n)
+                     JOIN pg_attribute a ON a.attrelid = ix.indrelid
+                      AND a.attnum = k.attnum
+                     ORDER BY k.n),
+               pg_get_expr(ix.indpred, ix.indrelid),
+               0 = ANY(ix.indkey)
+        FROM pg_index ix
+        JOIN pg_class c ON c.oid = ix.indexrelid
+        WHERE ix.indrelid = %s::regclass AND ix.indisunique
+          AND NOT ix.indisprimary
+        """, [table])
+        unique_indexes = []
+        for name, columns, predicate, on_expression in cursor.fetchall():
+            if on_expression:
+                raise ValueError(
+                    "{} can't be partitioned: its unique index {} is on an "
+                    "expression.".format(table, name))
+            unique_indexes.append((name, columns, predicate))
+
+        cursor.execute("""
+        SELECT attnotnull FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attname = %s
+        """, [table, column])
+        column_not_null = cursor.fetchone()[0]
+
+        cursor.execute("SELECT MIN({0}), MAX({0}) FROM {1}".format(column,
+                                                                  table))
+        first, last = cursor.fetchone()
+
+        cursor.execute("ALTER TABLE {} RENAME TO {}".format(table, old_table))
+        cursor.execute("""
+        CREATE TABLE {} (
+          LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+        ) PARTITION BY RANGE ({})
+        """.format(table, old_table, column))
+
+        # Keep the sequences behind serial columns from going away with the
+        # old table.
+        cursor.execute("""
+        SELECT attname, pg_get_serial_sequence(%s, attname)
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        """, [old_table, old_table])
+        for name, sequence in cursor.fetchall():
+            if sequence:
+                cursor.execute("ALTER SEQUENCE {} OWNED BY {}.{}".format(
+                    sequence, table, name))
+
+        if first is not None:
+            for month in month_starts(first, last):
+                create_partition(cursor, table, month)
+        cursor.execute("CREATE TABLE {0}_default PARTITION OF {0} "
+                       "DEFAULT".format(table))
+
+        cursor.execute("INSERT INTO {} SELECT * FROM {}".format(table,
+                                                               old_table))
+        cursor.execute("DROP TABLE {}".format(old_table))
+
+        if pk_columns and column_not_null:
+            cursor.execute("ALTER TABLE {} ADD PRIMARY KEY ({})".format(
+                table, ", ".join(pk_columns + [column])))
+        elif pk_columns:
+            cursor.execute("CREATE UNIQUE INDEX {}_pk_ndx ON {} ({})".format(
+                table, table, ", ".join(pk_columns + [column])))
+
+        for indexdef in indexes:
+            cursor.execute(indexdef)
+        for name, columns, predicate in unique_indexes:
+            if column not in columns:
+                columns = columns + [column]
+            cursor.execute("CREATE UNIQUE INDEX {} ON {} ({}){}".format(
+                name, table, ", ".join(columns),
+                " WHERE {}".format(predicate) if predicate else ""))
+        for name, definition in outbound_keys:
+            cursor.execute("ALTER TABLE {} ADD CONSTRAINT {} {}".format(
+                table, name, definition))
+
+        for name, relkind, definition, view_indexes in views:
+            cursor.execute("CREATE {} {} AS {}".format(
+                "MATERIALIZED VIEW" if relkind == 'm' else "VIEW",
+                name, definition.rstrip().rstrip(';')))
+            for indexdef in view_indexes:
+                cursor.execute(indexdef)
+
+    return ["{}.{}".format(referencing_table, name)
+            for referencing_table, name in inbound_keys]
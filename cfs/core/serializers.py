@@ -1,10 +1,15 @@
 from collections import OrderedDict
+from types import SimpleNamespace
 
+from django.core.urlresolvers import reverse
+from django.utils.encoding import is_protected_type
 from rest_framework import serializers
-from rest_framework.fields import SkipField, CharField
+from rest_framework.fields import SkipField, CharField, IntegerField, \
+    ModelField
+from rest_framework.relations import PrimaryKeyRelatedField
 
 from .models import Call, CallUnit, Nature, CloseCode, CallSource, Beat, \
-    District, Priority, NatureGroup, Squad
+    District, ExportJob, Priority, NatureGroup, Squad
 
 
 class NonNullSerializer(serializers.ModelSerializer):
@@ -39,6 +44,35 @@ class NonNullSerializer(serializers.ModelSerializer):
         return ret
 
 
+class SparseFieldsSerializer(NonNullSerializer):
+    """
+    Serializes only the fields named in the `fields` argument, if it's
+    given. Subclasses map each field that reads a related object to the
+    relations to `select_related` for it in `related_fields`.
+    """
+    related_fields = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def related(cls, fields=None):
+        """The relations `fields` (by default, all fields) read."""
+        if fields is None:
+            fields = cls.Meta.fields
+        return sorted({relation for name in fields
+                       for relation in cls.related_fields.get(name, ())})
+
+    @classmethod
+    def model_fields(cls, fields):
+        """The model fields serializing `fields` reads."""
+        declared = cls().fields
+        return sorted({declared[name].source.split('.')[0] for name in fields})
+
+
 class SquadSerializer(serializers.ModelSerializer):
     class Meta:
         model = Squad
@@ -128,7 +162,23 @@ class CallExportSerializer(NonNullSerializer):
             'overall_response_time')
 
 
-class CallSerializer(NonNullSerializer):
+CALL_FIELDS = (
+    'call_id', 'city', 'zip_code', 'district', 'beat',
+    'street_address', 'crossroad1', 'crossroad2', 'geox',
+    'geoy',
+    'call_source', 'primary_unit', 'first_dispatched', 'close_code',
+    'nature', 'nature_group',
+    'reporting_unit', 'month_received', 'week_received', 'dow_received',
+    'hour_received', 'case_id',
+    'business', 'priority', 'report_only', 'cancelled', 'time_received',
+    'time_routed',
+    'time_finished', 'first_unit_dispatch', 'first_unit_enroute',
+    'first_unit_arrive', 'first_unit_transport',
+    'last_unit_clear', 'time_closed', 'officer_response_time',
+    'overall_response_time')
+
+
+class CallSerializer(SparseFieldsSerializer):
     city = CharField(source="city.descr", read_only=True)
 
     primary_unit = CallUnitSerializer(read_only=True, allow_null=False)
@@ -142,19 +192,172 @@ class CallSerializer(NonNullSerializer):
     call_source = CallSourceSerializer(allow_null=True, read_only=True)
     nature_group = NatureGroupSerializer(source='nature.nature_group', allow_null=True, read_only=True)
 
+    related_fields = {
+        'city': ['city'],
+        'district': ['district'],
+        'beat': ['beat'],
+        'priority': ['priority'],
+        'call_source': ['call_source'],
+        'nature': ['nature'],
+        'nature_group': ['nature__nature_group'],
+        'primary_unit': ['primary_unit__squad'],
+        'first_dispatched': ['first_dispatched__squad'],
+        'reporting_unit': ['reporting_unit__squad'],
+    }
+
     class Meta:
         model = Call
-        fields = (
-            'call_id', 'city', 'zip_code', 'district', 'beat',
-            'street_address', 'crossroad1', 'crossroad2', 'geox',
-            'geoy',
-            'call_source', 'primary_unit', 'first_dispatched', 'close_code',
-            'nature', 'nature_group',
-            'reporting_unit', 'month_received', 'week_received', 'dow_received',
-            'hour_received', 'case_id',
-            'business', 'priority', 'report_only', 'cancelled', 'time_received',
-            'time_routed',
-            'time_finished', 'first_unit_dispatch', 'first_unit_enroute',
-            'first_unit_arrive', 'first_unit_transport',
-            'last_unit_clear', 'time_closed', 'officer_response_time',
-            'overall_response_time')
+        fields = CALL_FIELDS
+
+
+class CallCompactSerializer(SparseFieldsSerializer):
+    """
+    Calls with the ids of related objects in place of the objects, which
+    needs no joins except for the nature group.
+    """
+    nature_group = IntegerField(source='nature.nature_group_id',
+                                read_only=True)
+
+    related_fields = {
+        'nature_group': ['nature'],
+    }
+
+    class Meta:
+        model = Call
+        fields = CALL_FIELDS
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ('export_job_id', 'file_format', 'query', 'status',
+                  'rows_total', 'rows_written', 'progress', 'error',
+                  'created_at', 'started_at', 'finished_at', 'download_url')
+
+    def get_download_url(self, job):
+        if job.status != ExportJob.FINISHED:
+            return None
+        url = reverse('export_job_download', kwargs={
+            'agency_code': job.agency.code, 'export_job_id': job.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+# Fields whose representation of a value from the database is the value.
+PLAIN_FIELDS = (serializers.BooleanField, serializers.CharField,
+                serializers.FloatField, serializers.IntegerField,
+                serializers.ReadOnlyField, PrimaryKeyRelatedField)
+
+
+def value_converter(field):
+    """
+    The function turning a value from the database into `field`'s
+    representation of it, or None if it's represented as it is.
+    """
+    if type(field) in PLAIN_FIELDS:
+        return None
+    if isinstance(field, ModelField):
+        model_field = field.model_field
+
+        def convert(value):
+            if is_protected_type(value):
+                return value
+            return model_field.value_to_string(
+                SimpleNamespace(**{model_field.attname: value}))
+
+        return convert
+    return field.to_representation
+
+
+def model_path(model, source):
+    """The lookup path of a serializer field's dotted `source`."""
+    path = []
+    for name in source.split('.'):
+        field = model._meta.get_field(name)
+        path.append(field.name)
+        if name != field.name:
+            # `name` is a foreign key's attname, which is the related id.
+            break
+        if field.is_relation:
+            model = field.related_model
+    return path
+
+
+def field_lookups(serializer_class, names):
+    """The lookups of the values of `serializer_class`'s fields `names`."""
+    serializer = serializer_class()
+    model = serializer_class.Meta.model
+    return ['__'.join(model_path(model, serializer.fields[name].source))
+            for name in names]
+
+
+class RowSerializer:
+    """
+    Serializes calls the way a NonNullSerializer subclass does, but from
+    `values()` rows rather than model instances, so no instances, related
+    objects or per-field attribute lookups are needed.
+
+    The serializer's fields are compiled once into the lookups to select
+    and a converter for each. Keys with null values are left out, as with
+    NonNullSerializer, except inside nested objects, which keep all their
+    keys as plain ModelSerializers do.
+    """
+
+    def __init__(self, serializer_class, fields=None, include=()):
+        if issubclass(serializer_class, SparseFieldsSerializer):
+            serializer = serializer_class(fields=fields)
+        else:
+            serializer = serializer_class()
+        self.columns = list(include)
+        self.build = self.compile(serializer, [], nested=False)
+
+    def column(self, path):
+        column = '__'.join(path)
+        if column not in self.columns:
+            self.columns.append(column)
+        return column
+
+    def compile(self, serializer, prefix, nested):
+        model = serializer.Meta.model
+        entries = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            path = prefix + model_path(model, field.source)
+            if isinstance(field, serializers.BaseSerializer):
+                # A null relation has a null primary key.
+                pk = self.column(path + [field.Meta.model._meta.pk.name])
+                entries.append((name, pk, None,
+                                self.compile(field, path, nested=True)))
+            else:
+                entries.append((name, self.column(path),
+                                value_converter(field), None))
+
+        def build(row):
+            ret = OrderedDict()
+            for name, column, convert, children in entries:
+                value = row[column]
+                if value is not None:
+                    if children is not None:
+                        value = children(row)
+                    elif convert is not None:
+                        value = convert(value)
+                if value is not None or nested:
+                    ret[name] = value
+            return ret
+
+        return build
+
+    def values(self, queryset):
+        """The rows of `queryset` to pass to `to_representation`."""
+        return queryset.values(*self.columns)
+
+    def to_representation(self, row):
+        return self.build(row)
+
+    def serialize(self, queryset):
+        for row in self.values(queryset).iterator():
+            yield self.build(row)
@@ -0,0 +1,129 @@
+"""
+Which of its agency's shifts each call was received in.
+
+Agencies describe their shifts with ShiftSchedules; agencies without one
+use DEFAULT_PERIODS, a day shift from 0600 to 1800 and a night shift from
+1800 to 0600. Each call stores its shift's number in `shift_received` when
+it's loaded, so filtering and grouping by shift don't have to evaluate the
+schedule. Run `recompute_shifts` (or the command of the same name) after
+changing a schedule.
+"""
+import datetime
+
+from django.apps import apps
+
+from .dimensions import dimension_filter
+
+DEFAULT_PERIODS = [
+    {'shift_number': 0, 'descr': "Shift 1", 'rotation_day': 0,
+     'start_time': datetime.time(6), 'end_time': datetime.time(18)},
+    {'shift_number': 1, 'descr': "Shift 2", 'rotation_day': 0,
+     'start_time': datetime.time(18), 'end_time': datetime.time(6)},
+]
+
+# Calls are read and updated this many at a time by recompute_shifts.
+RECOMPUTE_BATCH_SIZE = 10000
+
+
+def agency_schedules(agency_id):
+    """
+    The agency's schedules, from the dimension cache, as (schedule,
+    periods) pairs in order of when they start.
+    """
+    schedules = sorted(dimension_filter('ShiftSchedule', agency_id=agency_id),
+                       key=lambda row: row['starts_on'])
+    return [(schedule, dimension_filter(
+        'ShiftPeriod', shift_schedule_id=schedule['shift_schedule_id']))
+        for schedule in schedules]
+
+
+def schedule_on(schedules, day):
+    """The schedule in effect on `day`, and its periods."""
+    current = schedules[0]
+    for schedule, periods in schedules:
+        if schedule['starts_on'] > day:
+            break
+        current = schedule, periods
+    return current
+
+
+def period_covers(period, time_of_day, rotation_day, previous_rotation_day):
+    start, end = period['start_time'], period['end_time']
+    if start < end:
+        return period['rotation_day'] == rotation_day and \
+            start <= time_of_day < end
+    # The period runs past midnight, so it also covers the start of the day
+    # after its rotation day.
+    return (period['rotation_day'] == rotation_day and
+            time_of_day >= start) or \
+        (period['rotation_day'] == previous_rotation_day and
+         time_of_day < end)
+
+
+def shift_number(agency_id, time, schedules=None):
+    """
+    The number of the shift `time` falls in for the agency, or None if its
+    schedule leaves that time out. Pass the agency's `schedules` to avoid
+    looking them up again.
+    """
+    if time is None:
+        return None
+    if schedules is None:
+        schedules = agency_schedules(agency_id)
+
+    day = time.date()
+    if schedules:
+        schedule, periods = schedule_on(schedules, day)
+        days = (day - schedule['starts_on']).days
+        rotation_day = days % schedule['rotation_days']
+        previous_rotation_day = (days - 1) % schedule['rotation_days']
+    else:
+        periods = DEFAULT_PERIODS
+        rotation_day = previous_rotation_day = 0
+
+    for period in periods:
+        if period_covers(period, time.time(), rotation_day,
+                         previous_rotation_day):
+            return period['shift_number']
+    return None
+
+
+def shift_choices(agency_id):
+    """The id and name of each of the agency's shifts, in order."""
+    names = {}
+    for _, periods in agency_schedules(agency_id) or [(None,
+                                                       DEFAULT_PERIODS)]:
+        for period in periods:
+            names.setdefault(period['shift_number'], period['descr'])
+    return [{'id': number, 'name': names[number]} for number in sorted(names)]
+
+
+def recompute_shifts(agency):
+    """
+    Set `shift_received` on each of the agency's calls from its current
+    schedules, returning how many calls changed shift.
+    """
+    Call = apps.get_model('core', 'Call')
+    schedules = agency_schedules(agency.pk)
+    qs = Call.objects.filter(agency=agency).order_by('call_id')
+
+    changed = 0
+    last_id = None
+    while True:
+        batch = qs if last_id is None else qs.filter(call_id__gt=last_id)
+        rows = list(batch.values_list('call_id', 'time_received',
+                                      'shift_received')
+                    [:RECOMPUTE_BATCH_SIZE])
+        if not rows:
+            return changed
+
+        updates = {}
+        for call_id, time_received, old_shift in rows:
+            shift = shift_number(agency.pk, time_received, schedules)
+            if shift != old_shift:
+                updates.setdefault(shift, []).append(call_id)
+
+        for shift, call_ids in updates.items():
+            changed += Call.objects.filter(call_id__in=call_ids) \
+                .update(shift_received=shift)
+        last_id = rows[-1][0]
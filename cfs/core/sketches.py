@@ -0,0 +1,101 @@
+"""
+Mergeable summaries of officer response times.
+
+Response times are counted in logarithmically sized buckets: bucket `i`
+holds the times in (GAMMA ** (i - 1), GAMMA ** i] seconds. Because the
+buckets are fixed, histograms for any set of cells can be merged by adding
+their counts, which lets the call_response_time_sketch view store one
+histogram per agency, day, hour of the day, shift, beat and priority and
+combine them for any filter that lines up with those cells.
+
+Estimating a quantile as the midpoint of its bucket is off by at most
+RELATIVE_ERROR (about 1%) of the true value at that rank. Averages and
+maximums are tracked exactly.
+"""
+import math
+from collections import Counter
+
+# Must match the base of the logarithm in
+# core/migrations/sql/call_response_time_sketch3.sql.
+GAMMA = 1.02
+
+RELATIVE_ERROR = (GAMMA - 1) / (GAMMA + 1)
+
+
+def bucket_for(secs):
+    """The bucket a positive response time, in seconds, is counted in."""
+    return math.ceil(math.log(secs) / math.log(GAMMA))
+
+
+def bucket_value(bucket):
+    """
+    The value representing a bucket: the point that minimizes the largest
+    relative error to anything in it.
+    """
+    return 2 * GAMMA ** bucket / (GAMMA + 1)
+
+
+class ResponseTimeHistogram:
+
+    def __init__(self):
+        self.counts = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+
+    def add(self, bucket, count, total=None, max=None):
+        """Add the summary of `count` response times in `bucket`."""
+        self.counts[bucket] += count
+        self.count += count
+        if total is not None:
+            self.total += total
+        if max is not None and (self.max is None or max > self.max):
+            self.max = max
+
+    def add_value(self, secs):
+        self.add(bucket_for(secs), 1, secs, secs)
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.add(bucket, count)
+        self.total += other.total
+        if other.max is not None and (self.max is None or
+                                      other.max > self.max):
+            self.max = other.max
+
+    def quantile(self, q):
+        """
+        Estimate the `q` quantile, using the same rank (q * (n - 1)) as the
+        lower end of PostgreSQL's percentile_cont.
+        """
+        if not self.count:
+            return None
+
+        rank = math.floor(q * (self.count - 1))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen > rank:
+                value = bucket_value(bucket)
+                if self.max is not None:
+                    value = min(value, self.max)
+                return value
+
+    def quartiles(self):
+        return [self.quantile(q) for q in (0.25, 0.5, 0.75)]
+
+    def summary(self):
+        """
+        The same statistics CallResponseTimeOverview.officer_response_time
+        reports, or an empty dict if there's nothing to summarize.
+        """
+        if not self.count:
+            return {}
+
+        quartiles = self.quartiles()
+        return {
+            'quartiles': quartiles,
+            'avg': self.total / self.count,
+            'max': self.max,
+            'iqr': quartiles[2] - quartiles[0],
+        }
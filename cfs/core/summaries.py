@@ -1,14 +1,29 @@
-from collections import Counter
+from collections import Counter, OrderedDict, defaultdict
 from datetime import timedelta
+from functools import partial
+from operator import attrgetter, methodcaller
 
+import numpy as np
+from django.conf import settings
+from django.utils.functional import cached_property
 from django.contrib.postgres.fields import ArrayField
 from django.db.models import Min, Max, Count, Case, When, IntegerField, F, \
-    Avg, DurationField, Q
+    Avg, DurationField, Sum, Func, Value, FloatField, ExpressionWrapper
 from postgres_stats import Extract, DateTrunc, Percentile
 from url_filter.filtersets import StrictMode
 
-from .filters import CallFilterSet
-from .models import Call, Beat, NatureGroup, District
+from .aggregates import GroupingSetsQuery
+from .columnar import ColumnarCalls, open_column_store
+from .counts import count_rows
+from .filters import CallFilterSet, CallCubeFilterSet, \
+    CallResponseTimeSketchFilterSet, rollup_supports, date_range_filter
+from .geo import CLUSTER_MAX_ZOOM, CLUSTER_POINT_LIMIT, MapView, cell_size, \
+    data_bbox, grid_clusters, in_bbox, located
+from .dimensions import dimension_rows, dimension_filter, dimension_choices
+from .models import Call, CallCube, CallResponseTimeSketch, CallDailyStats
+from .parallel import run_sections
+from .shifts import shift_choices
+from .sketches import ResponseTimeHistogram
 
 
 def merge_dicts(*dict_args):
@@ -29,28 +44,206 @@ class Secs(Extract):
         super().__init__(expression, subfield='EPOCH', **extra)
 
 
-class CallOverview:
+class NullIf(Func):
+    function = 'NULLIF'
+
+
+class Overview:
+    """
+    A summary made of named sections. Subclasses list their sections in
+    `sections`, each mapped to a function of the overview that computes it.
+    """
+    sections = OrderedDict()
+
+    # Cached properties that more than one section reads, each mapped to
+    # those sections. When several of them are requested, the property is
+    # computed up front rather than by each section's thread at once.
+    shared_properties = {}
+
+    @classmethod
+    def section_names(cls):
+        return list(cls.sections)
+
+    def select_sections(self, names=None):
+        """
+        The requested section names in their usual order, or all of them if
+        `names` is None.
+        """
+        all_names = self.section_names()
+        if names is None:
+            return all_names
+
+        unknown = set(names) - set(all_names)
+        if unknown:
+            raise ValueError(
+                "Unknown sections: {}".format(", ".join(sorted(unknown))))
+        return [name for name in all_names if name in names]
+
+    def compute_sections(self, names):
+        for name, readers in sorted(self.shared_properties.items()):
+            if len(set(readers) & set(names)) > 1:
+                getattr(self, name)
+
+        # Sections are otherwise independent, so they can be run in
+        # parallel; see core.parallel.
+        return run_sections(OrderedDict(
+            (name, partial(self.sections[name], self)) for name in names))
+
+    def to_dict(self, sections=None):
+        """
+        The overview's sections, or only those named in `sections`. Nothing
+        is computed for the sections left out.
+        """
+        return self.compute_sections(self.select_sections(sections))
+
+
+class CallOverview(Overview):
+    filter_set_class = CallFilterSet
+
+    # Columns each filtered call contributes to the grouping sets query.
+    grouping_fields = ('time_received', 'dow_received', 'hour_received',
+                       'shift_received', 'district', 'beat', 'nature',
+                       'nature__nature_group', 'call_source__is_self_initiated')
+
+    # Whether this overview can be answered from the call cube. Subclasses
+    # that do must define `rollup_annotations` (and `rollup_measures` and
+    # `rollup_fields` if they use the grouping sets query) to use in place
+    # of their per-call equivalents.
+    use_rollup = False
+
+    # Measures for answering this overview from the column store, as
+    # (kind, column) pairs; see core.columnar. Overviews without them
+    # always query the database.
+    columnar_measures = None
+
+    # Whether to count calls even when the planner expects a large count;
+    # see core.counts.
+    exact_count = False
+
+    sections = OrderedDict([
+        ('filter', attrgetter('filter.data')),
+        ('bounds', attrgetter('bounds')),
+    ])
+
+    shared_properties = {
+        'bounds': ('bounds', 'precision'),
+        'counted': ('count', 'count_exact'),
+    }
 
     def __init__(self, agency, filters):
         self.agency = agency
         self._filters = filters
-        self.filter = CallFilterSet(data=filters,
-                                    queryset=Call.objects.filter(
-                                        agency=self.agency),
-                                    strict_mode=StrictMode.fail)
-        self.bounds = self.qs.aggregate(min_time=Min('time_received'),
-                                        max_time=Max('time_received'))
-        if self.bounds['max_time'] and self.bounds['min_time']:
-            self.span = self.bounds['max_time'] - self.bounds['min_time']
+        self.filter = self.filter_set_class(data=filters,
+                                            queryset=Call.objects.filter(
+                                                agency=self.agency),
+                                            strict_mode=StrictMode.fail)
+        self.columns = self.columnar_calls()
+
+        if self.columns is not None:
+            self.rollup_filter = None
+        elif self.use_rollup and settings.USE_CALL_CUBE and \
+                rollup_supports(CallCubeFilterSet, filters):
+            self.rollup_filter = CallCubeFilterSet(
+                data=filters,
+                queryset=CallCube.objects.filter(agency=self.agency),
+                strict_mode=StrictMode.fail)
+            self.annotations = self.rollup_annotations
+            self.grouping_measures = getattr(self, 'rollup_measures', None)
+            self.grouping_fields = self.grouping_fields + \
+                getattr(self, 'rollup_fields', ())
         else:
-            self.span = timedelta(0, 0)
+            self.rollup_filter = None
 
-    @property
-    def qs(self):
+    @cached_property
+    def bounds(self):
+        return self.get_bounds()
+
+    @cached_property
+    def span(self):
+        if self.bounds['max_time'] and self.bounds['min_time']:
+            return self.bounds['max_time'] - self.bounds['min_time']
+        return timedelta(0, 0)
+
+    def get_bounds(self):
+        """
+        The first and last times calls matching the filters were received,
+        taken from the column store or the daily call stats if possible.
+        """
+        if self.columns is not None:
+            return self.columns.bounds()
+
+        if settings.USE_DAILY_STATS:
+            days = date_range_filter(self.filter.get_specs(), 'time_received')
+            if days is not None:
+                return CallDailyStats.objects \
+                    .filter(agency=self.agency) \
+                    .bounds(*days)
+
+        return self.call_qs.aggregate(min_time=Min('time_received'),
+                                      max_time=Max('time_received'))
+
+    def columnar_calls(self):
+        """
+        The filtered calls from the agency's column store, or None if the
+        store is disabled, out of date or can't apply the filters.
+        """
+        if not self.columnar_measures:
+            return None
+
+        store = open_column_store(self.agency)
+        if store is None:
+            return None
+
+        specs = self.filter.get_specs()
+        if not store.supports(specs):
+            return None
+        return ColumnarCalls(store, store.mask(specs))
+
+    @cached_property
+    def call_qs(self):
+        """The filtered calls themselves."""
         return self.filter.filter()
 
+    @cached_property
+    def qs(self):
+        """The filtered calls, or their rollup in the call cube if it can
+        answer this request."""
+        if self.rollup_filter:
+            return self.rollup_filter.filter()
+        return self.call_qs
+
+    def count_annotation(self, field):
+        if self.rollup_filter:
+            return Sum('call_count')
+        return Count(field)
+
+    @cached_property
+    def counted(self):
+        """
+        The number of calls matching the filters, and whether that's exact;
+        see core.counts. Counts from the column store, the call cube and
+        the daily call stats are always exact.
+        """
+        if self.columns is not None:
+            return len(self.columns), True
+        if self.rollup_filter:
+            return self.qs.aggregate(
+                count=Sum('call_count'))['count'] or 0, True
+
+        if settings.USE_DAILY_STATS:
+            days = date_range_filter(self.filter.get_specs(), 'time_received')
+            if days is not None:
+                return CallDailyStats.objects \
+                    .filter(agency=self.agency) \
+                    .total(*days), True
+
+        return count_rows(self.call_qs, exact=self.exact_count)
+
     def count(self):
-        return self.qs.count()
+        return self.counted[0]
+
+    def count_exact(self):
+        return self.counted[1]
 
     def precision(self):
         if self.span >= timedelta(days=365):
@@ -72,12 +265,13 @@ class CallOverview:
         return src_data
 
     def beat_ids(self):
-        return dict(Beat.objects.all().values_list('descr', 'beat_id'))
+        return {row['descr']: row['beat_id']
+                for row in dimension_rows('Beat')}
 
     def district_ids(self):
-        return dict(
-            District.objects.filter(agency=self.agency).values_list('descr',
-                                                                    'district_id'))
+        return {row['descr']: row['district_id']
+                for row in dimension_filter('District',
+                                            agency_id=self.agency.pk)}
 
     def by_dow(self):
         results = self.qs \
@@ -89,32 +283,39 @@ class CallOverview:
 
     def by_shift(self):
         results = self.qs \
-            .annotate(id=Case(
-                When(Q(hour_received__gte=6) & Q(
-                    hour_received__lt=18), then=0),
-                default=1,
-                output_field=IntegerField())) \
+            .annotate(id=F('shift_received')) \
             .values("id") \
             .annotate(**self.annotations)
 
-        return self.merge_data(results, [0, 1])
+        return self.named_shifts(results)
 
-    def by_nature_group(self):
-        all_in_field = NatureGroup.objects.annotate(
-            name=F("descr"),
-            id=F("nature_group_id")).values('name', 'id')
+    def named_shifts(self, rows):
+        """Name the rows of a breakdown by shift and add any missing
+        shifts."""
+        names = {row['id']: row['name']
+                 for row in shift_choices(self.agency.pk)}
+        return [merge_dicts(row, {'name': names.get(row['id'])})
+                for row in self.merge_data(rows, names)]
 
-        results = self.qs \
-            .annotate(id=F("nature__nature_group_id"),
-                      name=F("nature__nature_group__descr")) \
-            .values("name", "id") \
-            .annotate(**self.annotations)
+    def all_in_field(self, field):
+        if field == 'nature_group':
+            return dimension_choices('NatureGroup')
 
-        results = list(results)
+        field_model = getattr(self.qs.model, field).field.related_model
+        return dimension_choices(field_model.__name__)
+
+    def fill_field(self, field, results, all_in_field=None):
+        """
+        Add a row with default values for each value of `field` missing
+        from the results, as long as there are any results at all.
+        """
+        if all_in_field is None:
+            all_in_field = self.all_in_field(field)
 
+        results = list(results)
         present_ids = set(x['id'] for x in results)
 
-        if len(present_ids) > 0:
+        if results:
             for row in all_in_field:
                 if row['id'] not in present_ids:
                     row.update(**self.default)
@@ -122,11 +323,16 @@ class CallOverview:
 
         return results
 
+    def by_nature_group(self):
+        results = self.qs \
+            .annotate(id=F("nature__nature_group_id"),
+                      name=F("nature__nature_group__descr")) \
+            .values("name", "id") \
+            .annotate(**self.annotations)
+
+        return self.fill_field('nature_group', results)
+
     def by_field(self, field):
-        field_model = getattr(self.qs.model, field).field.related_model
-        all_in_field = field_model.objects.annotate(
-            name=F("descr"),
-            id=F(field + "_id")).values('name', 'id')
         results = self.qs \
             .annotate(id=F(field + "_id"),
                       name=F(field + '__descr')) \
@@ -134,28 +340,115 @@ class CallOverview:
             .exclude(id=None) \
             .annotate(**self.annotations)
 
-        results = list(results)
-        present_ids = set(x['id'] for x in results)
-
-        if results:
-            for row in all_in_field:
-                if row['id'] not in present_ids:
-                    row.update(**self.default)
-                    results.append(row)
-
-        return results
+        return self.fill_field(field, results)
+
+    def grouping_dimensions(self):
+        return [
+            ('dim_date', "DATE_TRUNC('{}', time_received)".format(
+                self.precision())),
+            ('dim_source', "CASE WHEN is_self_initiated THEN 0 ELSE 1 END"),
+            ('dim_district', "district_id"),
+            ('dim_beat', "beat_id"),
+            ('dim_nature', "nature_id"),
+            ('dim_nature_group', "nature_group_id"),
+            ('dim_dow', "dow_received"),
+            ('dim_hour', "hour_received"),
+            ('dim_shift', "shift_received"),
+        ]
+
+    def grouping_query(self):
+        return GroupingSetsQuery(self.qs.values(*self.grouping_fields),
+                                 dimensions=self.grouping_dimensions(),
+                                 measures=self.grouping_measures)
+
+    def grouped_rows(self, sets):
+        """
+        Compute the grouping sets in `sets`, a dict mapping each set's name
+        to its dimensions, from the column store if possible and otherwise
+        with a grouping sets query.
+        """
+        if self.columns is not None:
+            return self.columns.group(sets, self.columnar_measures,
+                                      self.precision())
+
+        query = self.grouping_query()
+        for name, dimensions in sets.items():
+            query.add_set(name, *dimensions)
+        return query.execute()
+
+    def grouped_by_id(self, rows, dimension):
+        return [merge_dicts({'id': row.pop(dimension)}, row) for row in rows]
+
+    def grouped_by_field(self, field, rows):
+        """
+        Shape rows from a single-field grouping set like `by_field` does,
+        taking the names from the field's lookup table.
+        """
+        all_in_field = list(self.all_in_field(field))
+        names = {row['id']: row['name'] for row in all_in_field}
+        results = []
+
+        for row in self.grouped_by_id(rows, 'dim_' + field):
+            if row['id'] is None and field != 'nature_group':
+                continue
+            row['name'] = names.get(row['id'])
+            results.append(row)
+
+        return self.fill_field(field, results, all_in_field)
 
 
 class CallVolumeOverview(CallOverview):
     annotations = dict(volume=Count("id"))
+    grouping_measures = dict(volume="COUNT(*)")
     default = dict(volume=0)
 
+    use_rollup = True
+    rollup_annotations = dict(volume=Sum("call_count"))
+    rollup_measures = dict(volume="SUM(call_count)")
+    rollup_fields = ('call_count',)
+
+    columnar_measures = dict(volume=('count', None))
+
+    sections = OrderedDict(list(CallOverview.sections.items()) + [
+        ('precision', methodcaller('precision')),
+        ('beat_ids', methodcaller('beat_ids')),
+        ('district_ids', methodcaller('district_ids')),
+    ])
+
+    # Sections computed together by `grouped_sections`, each mapped to the
+    # grouping set it comes from.
+    grouped_section_sets = OrderedDict([
+        ('count', ('count', ())),
+        ('volume_by_date', ('date', ('dim_date',))),
+        ('volume_by_source', ('source', ('dim_source',))),
+        ('volume_by_district', ('district', ('dim_district',))),
+        ('volume_by_beat', ('beat', ('dim_beat',))),
+        ('volume_by_nature', ('nature', ('dim_nature',))),
+        ('volume_by_nature_group', ('nature_group', ('dim_nature_group',))),
+        ('volume_by_dow', ('dow', ('dim_dow',))),
+        ('volume_by_shift', ('shift', ('dim_shift',))),
+        ('heatmap', ('heatmap', ('dim_dow', 'dim_hour'))),
+    ])
+
+    @classmethod
+    def section_names(cls):
+        return super().section_names() + list(cls.grouped_section_sets)
+
+    def compute_sections(self, names):
+        grouped_names = [name for name in names
+                         if name in self.grouped_section_sets]
+        results = super().compute_sections(
+            [name for name in names if name not in self.grouped_section_sets])
+        if grouped_names:
+            results.update(self.grouped_sections(grouped_names))
+        return results
+
     def volume_by_date(self):
         results = self.qs \
             .annotate(
                 date=DateTrunc('time_received', precision=self.precision())) \
             .values("date") \
-            .annotate(volume=Count("date")) \
+            .annotate(volume=self.count_annotation("date")) \
             .order_by("date")
 
         return results
@@ -174,16 +467,20 @@ class CallVolumeOverview(CallOverview):
     def day_hour_heatmap(self):
         if self.span == timedelta(0, 0):
             return []
+        results = self.qs \
+            .values('dow_received', 'hour_received') \
+            .annotate(volume=self.count_annotation('dow_received')) \
+            .order_by('dow_received', 'hour_received')
+        return self.heatmap_rows(results)
+
+    def heatmap_rows(self, results):
         # In order for this to show average volume, we need to know the number
         # of times each day of the week occurs.
         start = self.bounds['min_time'].date()
         end = self.bounds['max_time'].date()
         weekdays = Counter((start + timedelta(days=x)).weekday() for x in
                            range(0, (end - start).days + 1))
-        results = self.qs \
-            .values('dow_received', 'hour_received') \
-            .annotate(volume=Count('dow_received')) \
-            .order_by('dow_received', 'hour_received')
+        results = list(results)
         for result in results:
             result['freq'] = weekdays[result['dow_received']]
             result['total'] = result['volume']
@@ -193,32 +490,161 @@ class CallVolumeOverview(CallOverview):
                 result['volume'] = 0
         return results
 
-    def to_dict(self):
-        return {
-            'filter': self.filter.data,
-            'bounds': self.bounds,
-            'precision': self.precision(),
-            'count': self.count(),
-            'volume_by_date': self.volume_by_date(),
-            'volume_by_source': self.volume_by_source(),
-            'volume_by_district': self.by_field('district'),
-            'volume_by_beat': self.by_field('beat'),
-            'volume_by_nature': self.by_field('nature'),
-            'volume_by_nature_group': self.by_nature_group(),
-            'volume_by_dow': self.by_dow(),
-            'volume_by_shift': self.by_shift(),
-            'heatmap': self.day_hour_heatmap(),
-            'beat_ids': self.beat_ids(),
-            'district_ids': self.district_ids(),
+    def grouped_sections(self, names=None):
+        """
+        Compute the named sections in `grouped_section_sets` (all of them if
+        `names` is None) in a single pass over the filtered calls.
+        """
+        if names is None:
+            names = list(self.grouped_section_sets)
+
+        grouped = self.grouped_rows(OrderedDict(
+            self.grouped_section_sets[name] for name in names))
+
+        def count(rows):
+            return rows[0]['volume'] if rows else 0
+
+        def by_date(rows):
+            return sorted(({'date': row['dim_date'], 'volume': row['volume']}
+                           for row in rows),
+                          key=lambda row: row['date'])
+
+        def by_field(field):
+            return partial(self.grouped_by_field, field)
+
+        def by_dow(rows):
+            rows = [merge_dicts(row, {'name': row['id']}) for row in
+                    self.grouped_by_id(rows, 'dim_dow')]
+            return self.merge_data(rows, range(0, 7))
+
+        def by_id(dimension, all_ids):
+            return lambda rows: self.merge_data(
+                self.grouped_by_id(rows, dimension), all_ids)
+
+        def heatmap(rows):
+            if self.span == timedelta(0, 0):
+                return []
+            return self.heatmap_rows(sorted(
+                ({'dow_received': row['dim_dow'],
+                  'hour_received': row['dim_hour'],
+                  'volume': row['volume']} for row in rows),
+                key=lambda row: (row['dow_received'], row['hour_received'])))
+
+        shapes = {
+            'count': count,
+            'volume_by_date': by_date,
+            'volume_by_source': by_id('dim_source', [0, 1]),
+            'volume_by_district': by_field('district'),
+            'volume_by_beat': by_field('beat'),
+            'volume_by_nature': by_field('nature'),
+            'volume_by_nature_group': by_field('nature_group'),
+            'volume_by_dow': by_dow,
+            'volume_by_shift': lambda rows: self.named_shifts(
+                self.grouped_by_id(rows, 'dim_shift')),
+            'heatmap': heatmap,
         }
 
+        return OrderedDict(
+            (name, shapes[name](grouped[self.grouped_section_sets[name][0]]))
+            for name in names)
+
 
 class CallResponseTimeOverview(CallOverview):
     annotations = dict(mean=Avg(Secs("officer_response_time")))
     default = dict(mean=0)
 
+    use_rollup = True
+    rollup_annotations = dict(mean=ExpressionWrapper(
+        Sum("response_time_sum") / NullIf(Sum("response_time_count"),
+                                          Value(0)),
+        output_field=FloatField()))
+
+    columnar_measures = dict(mean=('mean', 'response_secs'))
+
+    sections = OrderedDict(list(CallOverview.sections.items()) + [
+        ('beat_ids', methodcaller('beat_ids')),
+        ('district_ids', methodcaller('district_ids')),
+        ('count', methodcaller('count')),
+        ('count_exact', methodcaller('count_exact')),
+        ('officer_response_time', methodcaller('officer_response_time')),
+        ('officer_response_time_by_beat', methodcaller('by_field', 'beat')),
+        ('officer_response_time_by_priority',
+         methodcaller('by_field', 'priority')),
+        ('officer_response_time_by_district',
+         methodcaller('by_field', 'district')),
+        ('officer_response_time_by_nature',
+         methodcaller('by_field', 'nature')),
+        ('officer_response_time_by_nature_group',
+         methodcaller('by_nature_group')),
+        ('officer_response_time_by_dow', methodcaller('by_dow')),
+        ('officer_response_time_by_shift', methodcaller('by_shift')),
+    ])
+
+    # The grouping set behind each breakdown, when answering from the
+    # column store.
+    columnar_section_fields = OrderedDict([
+        ('officer_response_time_by_beat', 'beat'),
+        ('officer_response_time_by_priority', 'priority'),
+        ('officer_response_time_by_district', 'district'),
+        ('officer_response_time_by_nature', 'nature'),
+        ('officer_response_time_by_nature_group', 'nature_group'),
+        ('officer_response_time_by_dow', 'dow'),
+        ('officer_response_time_by_shift', 'shift'),
+    ])
+
+    def __init__(self, agency, filters):
+        super().__init__(agency, filters)
+
+        if self.columns is None and settings.USE_RESPONSE_TIME_SKETCHES and \
+                rollup_supports(CallResponseTimeSketchFilterSet, filters) and \
+                self.whole_days():
+            self.sketch_filter = CallResponseTimeSketchFilterSet(
+                data=filters,
+                queryset=CallResponseTimeSketch.objects.filter(
+                    agency=self.agency),
+                strict_mode=StrictMode.fail)
+        else:
+            self.sketch_filter = None
+
+    def whole_days(self):
+        """Whether the filters on time received, if any, are by whole days,
+        which is how finely the sketches are kept."""
+        specs = [spec for spec in self.filter.get_specs()
+                 if spec.components[0] == 'time_received']
+        return date_range_filter(specs, 'time_received') is not None
+
+    @cached_property
+    def sketch_qs(self):
+        return self.sketch_filter.filter()
+
+    def sketch_histograms(self, field=None):
+        """
+        Merge the response time sketches matching the filters into one
+        histogram, keyed by None, or into one per value of `field`.
+        """
+        fields = ('bucket',) if field is None else (field, 'bucket')
+        rows = self.sketch_qs \
+            .values(*fields) \
+            .annotate(count=Sum('call_count'),
+                      total=Sum('response_time_sum'),
+                      max=Max('response_time_max'))
+
+        histograms = defaultdict(ResponseTimeHistogram)
+        for row in rows:
+            histograms[row.get(field)].add(row['bucket'], row['count'],
+                                           row['total'], row['max'])
+        return histograms
+
     def officer_response_time(self):
-        results = self.qs.filter(
+        if self.columns is not None:
+            return self.columnar_response_time()
+
+        if self.sketch_filter:
+            return self.sketch_histograms()[None].summary()
+
+        # Exact quartiles need the individual response times, so this
+        # reads from the calls themselves.
+        results = self.call_qs.filter(
             officer_response_time__gt=timedelta(0)).aggregate(
             avg=Avg(Secs('officer_response_time')),
             quartiles=Percentile(Secs('officer_response_time'),
@@ -240,31 +666,138 @@ class CallResponseTimeOverview(CallOverview):
 
     def by_field(self, field):
         results = super().by_field(field)
+        return self.sorted_by_mean(self.with_quartiles(field, results))
+
+    def with_quartiles(self, field, results):
+        """
+        Add the quartiles of each row's response times, estimated from the
+        sketches. They're None when the sketches can't answer for `field`,
+        since exact quartiles per row would mean sorting every call.
+        """
+        histograms = {}
+        if self.sketch_filter and field in CallResponseTimeSketch.dimensions:
+            histograms = self.sketch_histograms(field)
+
+        for row in results:
+            histogram = histograms.get(row['id'])
+            row['quartiles'] = histogram.quartiles() if histogram else None
+        return results
+
+    def sorted_by_mean(self, results):
         return sorted(results, key=lambda x: -x['mean'] if x['mean'] else 0)
 
-    def to_dict(self):
+    def columnar_response_time(self):
+        secs = self.columns.response_times()
+        if not len(secs):
+            return {}
+
+        quartiles = [float(q) for q in np.percentile(secs, [25, 50, 75])]
         return {
-            'filter': self.filter.data,
-            'bounds': self.bounds,
-            'count': self.count(),
-            'officer_response_time': self.officer_response_time(),
-            'officer_response_time_by_beat': self.by_field('beat'),
-            'officer_response_time_by_priority': self.by_field('priority'),
-            'officer_response_time_by_district': self.by_field('district'),
-            'officer_response_time_by_nature': self.by_field('nature'),
-            'officer_response_time_by_nature_group': self.by_nature_group(),
-            'officer_response_time_by_dow': self.by_dow(),
-            'officer_response_time_by_shift': self.by_shift(),
-            'beat_ids': self.beat_ids(),
-            'district_ids': self.district_ids(),
+            'quartiles': quartiles,
+            'avg': float(secs.mean()),
+            'max': float(secs.max()),
+            'iqr': quartiles[2] - quartiles[0],
         }
 
+    def columnar_sections(self, names):
+        """The named sections, computed from the column store."""
+        fields = [self.columnar_section_fields[name] for name in names
+                  if name in self.columnar_section_fields]
+        grouped = self.grouped_rows(OrderedDict(
+            (field, ('dim_' + field,)) for field in fields))
+
+        def shape(field, rows):
+            if field == 'dow':
+                rows = [merge_dicts(row, {'name': row['id']}) for row in
+                        self.grouped_by_id(rows, 'dim_dow')]
+                return self.merge_data(rows, range(0, 7))
+            elif field == 'shift':
+                return self.named_shifts(
+                    self.grouped_by_id(rows, 'dim_shift'))
+            elif field == 'nature_group':
+                return self.grouped_by_field(field, rows)
+            return self.sorted_by_mean(
+                self.with_quartiles(field, self.grouped_by_field(field, rows)))
+
+        results = OrderedDict()
+        for name in names:
+            if name in self.columnar_section_fields:
+                field = self.columnar_section_fields[name]
+                results[name] = shape(field, grouped[field])
+            elif name == 'count':
+                results[name] = len(self.columns)
+            elif name == 'officer_response_time':
+                results[name] = self.columnar_response_time()
+            else:
+                results[name] = self.sections[name](self)
+        return results
+
+    def compute_sections(self, names):
+        if self.columns is not None:
+            return self.columnar_sections(names)
+        return super().compute_sections(names)
+
 
 class CallMapOverview(CallOverview):
+    """
+    The calls to plot on the call map: points, or grid clusters when there
+    are too many in view; see core.geo.
+    """
+    sections = OrderedDict(list(CallOverview.sections.items()) + [
+        ('count', methodcaller('count')),
+        ('count_exact', methodcaller('count_exact')),
+        ('locations', methodcaller('locations')),
+        ('clusters', methodcaller('clusters')),
+        ('top_locations', methodcaller('top_locations')),
+    ])
+
+    shared_properties = dict(CallOverview.shared_properties,
+                             points=('locations', 'clusters'))
+
+    # The part of the map in view and its zoom. Without a bounding box, all
+    # of the calls are in view.
+    map_view = MapView(zoom=None, bbox=None)
+
+    @cached_property
+    def located_qs(self):
+        """The filtered calls with coordinates in view."""
+        return in_bbox(located(self.call_qs), self.map_view.bbox)
+
+    @cached_property
+    def points(self):
+        """The calls in view, or None if they should be clustered."""
+        points = self.located_qs.values_list(
+            'lat', 'lon', 'street_address', 'business', 'nature__descr')
+        zoom = self.map_view.zoom
+        if zoom is not None and zoom >= CLUSTER_MAX_ZOOM:
+            return list(points)
+
+        points = list(points[:CLUSTER_POINT_LIMIT + 1])
+        if len(points) > CLUSTER_POINT_LIMIT:
+            return None
+        return points
 
     def locations(self):
-        return self.qs.exclude(geox="NaN").exclude(geoy="NaN") \
-            .values_list('geoy', 'geox', 'street_address', 'business', 'nature__descr')
+        return self.points or []
+
+    def clusters(self):
+        if self.points is not None:
+            return []
+        bbox = self.map_view.bbox or data_bbox(self.located_qs)
+        return grid_clusters(self.located_qs, cell_size(bbox))
+
+    def top_locations(self):
+        """The 20 addresses in view with the most calls."""
+        rows = self.located_qs \
+            .exclude(street_address__isnull=True) \
+            .exclude(street_address="") \
+            .order_by() \
+            .values('street_address') \
+            .annotate(total=Count('call_id'), any_business=Max('business')) \
+            .order_by('-total')[:20]
+        return [{'address': row['street_address'],
+                 'business': row['any_business'],
+                 'total': row['total']} for row in rows]
 
     def top_users(self):
         return self.qs. \
@@ -272,11 +805,3 @@ class CallMapOverview(CallOverview):
             values('street_address', 'business'). \
             annotate(total=Count('street_address')). \
             order_by('-total')[:20]
-
-    def to_dict(self):
-        return {
-            'filter': self.filter.data,
-            'bounds': self.bounds,
-            'count': self.count(),
-            'locations': self.locations()
-        }
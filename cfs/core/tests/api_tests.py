@@ -1,6 +1,10 @@
+from datetime import datetime
+from unittest.mock import patch
+
 from rest_framework.test import APITestCase
 
-from ..models import District, CallUnit, Squad
+from ..models import Agency, District, CallUnit, Squad
+from ..pagination import KeysetPagination, decode_cursor, encode_cursor
 from .test_helpers import create_call
 
 class CallTestCase(APITestCase):
@@ -35,3 +39,81 @@ class CallTestCase(APITestCase):
     def test_squad_can_be_queried(self):
         response = self.client.get('/api/calls/?squad=1')
         self.assertEqual(response.data['count'], 3)
+
+
+def test_cursors_round_trip():
+    cursor = encode_cursor(datetime(2015, 1, 2, 9, 30), '15-0001', True)
+    assert decode_cursor(cursor) == (datetime(2015, 1, 2, 9, 30), '15-0001',
+                                     True)
+
+
+@patch.object(KeysetPagination, 'page_size', 2)
+class KeysetPaginationTestCase(APITestCase):
+
+    def setUp(self):
+        agency = Agency.objects.create(code='A', descr='A')
+        for call_id, time_received in [('1', '2015-01-01T09:00'),
+                                       ('3', '2015-01-02T09:00'),
+                                       ('2', '2015-01-02T09:00'),
+                                       ('4', '2015-01-03T09:00'),
+                                       ('5', '2015-01-04T09:00')]:
+            create_call(call_id=call_id, time_received=time_received,
+                        agency=agency)
+
+    def call_ids(self, response):
+        return [call['call_id'] for call in response.data['results']]
+
+    def test_pages_follow_the_cursors(self):
+        first = self.client.get('/api/A/calls/?cursor=&count=true')
+        self.assertEqual(self.call_ids(first), ['1', '2'])
+        self.assertEqual(first.data['count'], 5)
+        self.assertIsNone(first.data['previous'])
+
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self.call_ids(second), ['3', '4'])
+        self.assertNotIn('count', second.data)
+
+        last = self.client.get(second.data['next'])
+        self.assertEqual(self.call_ids(last), ['5'])
+        self.assertIsNone(last.data['next'])
+
+        back = self.client.get(last.data['previous'])
+        self.assertEqual(self.call_ids(back), ['3', '4'])
+        back = self.client.get(back.data['previous'])
+        self.assertEqual(self.call_ids(back), ['1', '2'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_filters_apply_to_every_page(self):
+        first = self.client.get(
+            '/api/A/calls/?cursor=&time_received__gte=2015-01-02')
+        self.assertEqual(self.call_ids(first), ['2', '3'])
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self.call_ids(second), ['4', '5'])
+
+    def test_invalid_cursors_are_not_found(self):
+        response = self.client.get('/api/A/calls/?cursor=nonsense')
+        self.assertEqual(response.status_code, 404)
+
+
+class CallFieldsTestCase(APITestCase):
+
+    def setUp(self):
+        agency = Agency.objects.create(code='A', descr='A')
+        district = District.objects.create(district_id=1, descr="D1")
+        create_call(call_id='1', time_received='2015-01-01T09:00',
+                    agency=agency, district=district, business="Store")
+
+    def test_fields_limit_each_call(self):
+        response = self.client.get('/api/A/calls/?fields=call_id,district')
+        self.assertEqual(response.data['results'], [
+            {'call_id': '1', 'district': {'district_id': 1, 'descr': 'D1'}}])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/A/calls/?fields=call_id,secret')
+        self.assertEqual(response.status_code, 400)
+
+    def test_compact_format_gives_ids(self):
+        response = self.client.get(
+            '/api/A/calls/?format=compact&fields=call_id,district,business')
+        self.assertEqual(response.data['results'], [
+            {'call_id': '1', 'district': 1, 'business': 'Store'}])
@@ -0,0 +1,27 @@
+from django.http import QueryDict
+
+from ..caching import normalize_filters
+
+
+def test_normalize_filters_ignores_parameter_order():
+    assert normalize_filters(QueryDict("beat=1&district=2")) == \
+        normalize_filters(QueryDict("district=2&beat=1"))
+
+
+def test_normalize_filters_drops_blank_values():
+    assert normalize_filters(QueryDict("beat=1&district=")) == \
+        normalize_filters(QueryDict("beat=1"))
+
+
+def test_normalize_filters_removes_default_lookup():
+    assert normalize_filters(QueryDict("beat__exact=1")) == \
+        normalize_filters(QueryDict("beat=1"))
+    assert normalize_filters(QueryDict("beat__exact!=1")) == \
+        normalize_filters(QueryDict("beat!=1"))
+
+
+def test_normalize_filters_keeps_distinct_filters_apart():
+    assert normalize_filters(QueryDict("time_received__gte=2015-01-01")) != \
+        normalize_filters(QueryDict("time_received__lte=2015-01-01"))
+    assert normalize_filters(QueryDict("beat=1")) != \
+        normalize_filters(QueryDict("beat!=1"))
@@ -0,0 +1,182 @@
+import shutil
+import tempfile
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from django.test import TestCase, override_settings
+
+from ..columnar import CallColumns, ColumnarCalls, open_column_store, \
+    refresh_column_store
+from ..models import Agency, District, bump_data_version, \
+    update_materialized_views
+from ..summaries import CallVolumeOverview
+from .test_helpers import create_call, q
+
+Spec = namedtuple('Spec', ['components', 'lookup', 'value', 'is_negated'])
+
+ROWS = [
+    # call_id, time_received, dow, hour, shift, beat, district, nature,
+    # nature_group, priority, call_source, self_initiated, cancelled,
+    # officer_response_time, primary_unit, first_dispatched, reporting_unit
+    ('1', datetime(2015, 1, 1, 7), 3, 7, 0, 1, 10, 5, 2, 1, 4, True, False,
+     timedelta(seconds=60), 1, 1, None),
+    ('2', datetime(2015, 1, 2, 20), 4, 20, 1, 2, 10, 5, 2, 2, 3, False, False,
+     timedelta(seconds=120), 2, None, 3),
+    ('3', datetime(2015, 2, 2, 9), 0, 9, 0, None, 11, 6, None, 1, None, None,
+     True, None, None, None, None),
+]
+
+
+def matching(*specs):
+    columns = CallColumns.from_rows(ROWS)
+    return list(columns['call_id'][columns.mask(specs)])
+
+
+def test_filters_by_related_id():
+    assert matching(Spec(['beat', 'beat_id'], 'exact', 1, False)) == ['1']
+
+
+def test_negated_filters_include_nulls():
+    assert matching(Spec(['beat', 'beat_id'], 'exact', 1, True)) == \
+        ['2', '3']
+
+
+def test_date_filters_cover_the_whole_day():
+    assert matching(
+        Spec(['time_received'], 'gte', date(2015, 1, 2), False),
+        Spec(['time_received'], 'lte', date(2015, 1, 2), False)) == ['2']
+
+
+def test_filters_by_shift_and_initiator():
+    assert matching(Spec(['shift'], 'exact', '1', False)) == ['2']
+    assert matching(Spec(['initiated_by'], 'exact', '1', False)) == \
+        ['2', '3']
+
+
+def test_groups_like_grouping_sets():
+    columns = CallColumns.from_rows(ROWS)
+    calls = ColumnarCalls(columns, columns.mask([]))
+    grouped = calls.group(
+        {'count': (), 'beat': ('dim_beat',), 'date': ('dim_date',)},
+        {'volume': ('count', None), 'mean': ('mean', 'response_secs')},
+        'month')
+
+    assert grouped['count'] == [{'volume': 3, 'mean': 90.0}]
+    assert grouped['beat'] == [
+        {'dim_beat': None, 'volume': 1, 'mean': None},
+        {'dim_beat': 1, 'volume': 1, 'mean': 60.0},
+        {'dim_beat': 2, 'volume': 1, 'mean': 120.0},
+    ]
+    assert grouped['date'] == [
+        {'dim_date': datetime(2015, 1, 1), 'volume': 2, 'mean': 90.0},
+        {'dim_date': datetime(2015, 2, 1), 'volume': 1, 'mean': None},
+    ]
+
+
+def test_empty_selection_still_has_a_total():
+    columns = CallColumns.from_rows(ROWS)
+    calls = ColumnarCalls(
+        columns, columns.mask([Spec(['beat', 'beat_id'], 'exact', 99, False)]))
+    grouped = calls.group({'count': (), 'beat': ('dim_beat',)},
+                          {'volume': ('count', None)}, 'day')
+
+    assert grouped['count'] == [{'volume': 0}]
+    assert grouped['beat'] == []
+    assert calls.bounds() == {'min_time': None, 'max_time': None}
+
+
+def test_replacing_calls_keeps_units_aligned():
+    columns = CallColumns.from_rows(ROWS)
+    changed = list(ROWS[0])
+    changed[14] = 7
+    columns = columns.without(['1']).concat(CallColumns.from_rows([changed]))
+
+    assert list(columns['call_id']) == ['2', '3', '1']
+    units = sorted(zip(columns['call_id'][columns['unit_rows']],
+                       columns['unit_ids']))
+    assert units == [('1', 1), ('1', 7), ('2', 2), ('2', 3)]
+
+
+def test_stores_missing_a_column_are_incomplete():
+    columns = CallColumns.from_rows(ROWS)
+    assert columns.is_complete()
+
+    del columns.columns['shift']
+    assert not columns.is_complete()
+
+
+def test_supports_only_lookups_it_can_mask():
+    columns = CallColumns.from_rows(ROWS)
+    assert columns.supports([Spec(['district', 'district_id'], 'exact', 10,
+                                  False),
+                             Spec(['time_received'], 'gte', date(2015, 1, 2),
+                                  False)])
+    assert not columns.supports([Spec(['district', 'district_id'], 'in',
+                                      [10, 11], False)])
+    assert not columns.supports([Spec(['priority', 'priority_id'], 'gt', 1,
+                                      False)])
+    assert not columns.supports([Spec(['time_received'], 'exact',
+                                      date(2015, 1, 2), False)])
+
+
+class ColumnStoreTest(TestCase):
+
+    def setUp(self):
+        self.store_dir = tempfile.mkdtemp()
+        self.store_settings = override_settings(
+            COLUMN_STORE_DIR=self.store_dir)
+        self.store_settings.enable()
+
+        self.agency = Agency.objects.create(code='A', descr='A')
+        self.district = District.objects.create(district_id=1, descr="D1")
+        create_call(call_id='1', time_received='2015-01-01T09:00',
+                    agency=self.agency, district=self.district)
+        bump_data_version(self.agency)
+        refresh_column_store(self.agency, rebuild=True)
+
+    def tearDown(self):
+        self.store_settings.disable()
+        shutil.rmtree(self.store_dir)
+
+    def store(self):
+        self.agency.refresh_from_db()
+        return open_column_store(self.agency)
+
+    def test_unsupported_lookups_fall_back_to_the_database(self):
+        self.agency.refresh_from_db()
+        overview = CallVolumeOverview(self.agency, q('district__in=1,2'))
+        assert overview.columns is None
+        assert overview.to_dict(sections=['count'])['count'] == 1
+
+    def test_store_is_patched_after_one_load(self):
+        create_call(call_id='2', time_received='2015-01-02T09:00',
+                    agency=self.agency)
+        bump_data_version(self.agency)
+        refresh_column_store(self.agency, call_ids=['2'])
+        assert sorted(self.store()['call_id']) == ['1', '2']
+
+    def test_store_is_rebuilt_after_other_changes(self):
+        # Another load that didn't refresh the store.
+        create_call(call_id='2', time_received='2015-01-02T09:00',
+                    agency=self.agency)
+        bump_data_version()
+
+        create_call(call_id='3', time_received='2015-01-03T09:00',
+                    agency=self.agency)
+        bump_data_version(self.agency)
+        refresh_column_store(self.agency, call_ids=['3'])
+        assert sorted(self.store()['call_id']) == ['1', '2', '3']
+
+    def test_refreshing_views_carries_every_store_forward(self):
+        other = Agency.objects.create(code='B', descr='B')
+        refresh_column_store(other, rebuild=True)
+
+        update_materialized_views()
+        assert list(self.store()['call_id']) == ['1']
+        other.refresh_from_db()
+        assert open_column_store(other) is not None
+
+    def test_loaders_can_bump_only_their_agency(self):
+        version = Agency.objects.get(pk=self.agency.pk).data_version
+        update_materialized_views(bump_versions=False)
+        assert Agency.objects.get(pk=self.agency.pk).data_version == version
@@ -0,0 +1,51 @@
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from ..counts import count_rows, wants_exact_count
+from ..models import Agency, Call
+from .test_helpers import create_call
+
+
+def test_wants_exact_count():
+    assert wants_exact_count(QueryDict("exact=1"))
+    assert wants_exact_count(QueryDict("exact=true&beat=1"))
+    assert not wants_exact_count(QueryDict("exact=0"))
+    assert not wants_exact_count(QueryDict("beat=1"))
+
+
+class CountRowsTest(TestCase):
+
+    def setUp(self):
+        for call_id in range(3):
+            create_call(call_id=call_id, time_received='2015-01-01T09:00')
+
+    def test_small_counts_are_exact(self):
+        assert count_rows(Call.objects.all()) == (3, True)
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=0)
+    def test_large_counts_are_estimated(self):
+        count, exact = count_rows(Call.objects.all())
+        assert not exact
+        assert count >= 0
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=0)
+    def test_exact_counts_can_be_forced(self):
+        assert count_rows(Call.objects.all(), exact=True) == (3, True)
+
+
+@override_settings(ESTIMATED_COUNT_THRESHOLD=0)
+class CallListCountTest(APITestCase):
+
+    def setUp(self):
+        agency = Agency.objects.create(code='A', descr='A')
+        create_call(call_id='1', time_received='2015-01-01T09:00',
+                    agency=agency)
+
+    def test_counts_say_whether_they_are_exact(self):
+        response = self.client.get('/api/A/calls/')
+        self.assertFalse(response.data['count_exact'])
+
+        response = self.client.get('/api/A/calls/?exact=1')
+        self.assertEqual(response.data['count'], 1)
+        self.assertTrue(response.data['count_exact'])
@@ -0,0 +1,84 @@
+from django.test import TestCase, override_settings
+
+from ..dimensions import dimension_rows, dimension_get, dimension_map, \
+    invalidate_dimensions
+from ..models import Beat, CallSource, DimensionVersion
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dimension-tests',
+    }
+}, DIMENSION_CHECK_INTERVAL=60)
+class DimensionCacheTest(TestCase):
+
+    def setUp(self):
+        invalidate_dimensions()
+
+    def test_caches_rows(self):
+        Beat.objects.create(beat_id=1, descr='B1')
+        dimension_rows('Beat')
+
+        with self.assertNumQueries(0):
+            rows = dimension_rows('Beat')
+        assert [row['descr'] for row in rows] == ['B1']
+
+    def test_saving_invalidates(self):
+        beat = Beat.objects.create(beat_id=1, descr='B1')
+        dimension_rows('Beat')
+
+        beat.descr = 'B2'
+        beat.save()
+        assert [row['descr'] for row in dimension_rows('Beat')] == ['B2']
+
+        beat.delete()
+        assert dimension_rows('Beat') == []
+
+    def test_bulk_changes_need_explicit_invalidation(self):
+        Beat.objects.create(beat_id=1, descr='B1')
+        dimension_rows('Beat')
+
+        Beat.objects.update(descr='B2')
+        assert [row['descr'] for row in dimension_rows('Beat')] == ['B1']
+
+        invalidate_dimensions()
+        assert [row['descr'] for row in dimension_rows('Beat')] == ['B2']
+
+    def test_sees_changes_from_other_processes(self):
+        Beat.objects.create(beat_id=1, descr='B1')
+        dimension_rows('Beat')
+
+        # What invalidating the dimensions elsewhere looks like here.
+        Beat.objects.update(descr='B2')
+        DimensionVersion.objects.update(generation='elsewhere')
+        assert [row['descr'] for row in dimension_rows('Beat')] == ['B1']
+
+        with self.settings(DIMENSION_CHECK_INTERVAL=0):
+            assert [row['descr'] for row in dimension_rows('Beat')] == ['B2']
+
+    def test_maps_are_memoized_with_the_rows(self):
+        beat = Beat.objects.create(beat_id=1, descr='B1')
+        dimension_map('Beat', 'beat_id', 'descr')
+
+        with self.assertNumQueries(0):
+            mapping = dimension_map('Beat', 'beat_id', 'descr')
+        assert mapping == {1: 'B1'}
+
+        beat.descr = 'B2'
+        beat.save()
+        assert dimension_map('Beat', 'beat_id', 'descr') == {1: 'B2'}
+
+    def test_get_behaves_like_the_orm(self):
+        CallSource.objects.create(call_source_id=1, descr='Citizen',
+                                  code='C')
+        CallSource.objects.create(call_source_id=2, descr='Officer',
+                                  code='S', is_self_initiated=True)
+
+        source = dimension_get('CallSource', is_self_initiated=True)
+        assert source['call_source_id'] == 2
+
+        with self.assertRaises(CallSource.DoesNotExist):
+            dimension_get('CallSource', code='X')
+        with self.assertRaises(CallSource.MultipleObjectsReturned):
+            dimension_get('CallSource')
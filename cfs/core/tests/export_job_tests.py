@@ -0,0 +1,200 @@
+import csv
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from nose.tools import assert_equal, assert_raises
+from rest_framework.test import APITestCase
+
+from ..export_jobs import STALE_JOB_TIMEOUT, CSVRowCounter, \
+    UnsatisfiableRange, byte_range, claim_job, job_path, run_job
+from ..models import Agency, Call, District, ExportJob
+from .test_helpers import create_call
+
+
+def test_byte_range():
+    assert_equal(byte_range(None, 100), None)
+    assert_equal(byte_range('bytes=0-9', 100), (0, 9))
+    assert_equal(byte_range('bytes=90-', 100), (90, 99))
+    assert_equal(byte_range('bytes=90-200', 100), (90, 99))
+    assert_equal(byte_range('bytes=-10', 100), (90, 99))
+    assert_equal(byte_range('bytes=-200', 100), (0, 99))
+
+
+def test_byte_range_ignores_what_it_cant_serve():
+    assert_equal(byte_range('bytes=0-9,20-29', 100), None)
+    assert_equal(byte_range('bytes=9-0', 100), None)
+    assert_equal(byte_range('items=0-9', 100), None)
+
+
+def test_byte_range_past_the_end():
+    assert_raises(UnsatisfiableRange, byte_range, 'bytes=100-', 100)
+    assert_raises(UnsatisfiableRange, byte_range, 'bytes=-0', 100)
+
+
+def test_csv_row_counter_skips_quoted_newlines():
+    count = CSVRowCounter()
+    assert_equal(count(b'a,b\n1,"x\ny"\n2,"say ""hi'), 2)
+    assert_equal(count(b'\n"" there"\n'), 1)
+
+
+class ExportJobTestCase(TestCase):
+
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.settings = override_settings(EXPORT_JOB_DIR=self.export_dir)
+        self.settings.enable()
+
+        self.agency = Agency.objects.create(code='A', descr='A')
+        district = District.objects.create(district_id=1, descr="D1")
+        create_call(call_id='1', time_received='2015-01-01T09:00',
+                    agency=self.agency, district=district)
+        create_call(call_id='2', time_received='2015-01-02T09:00',
+                    agency=self.agency)
+        create_call(call_id='3', time_received='2015-01-03T09:00')
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.export_dir)
+
+    def test_claim_job_takes_the_oldest_queued_job(self):
+        first = ExportJob.objects.create(agency=self.agency)
+        ExportJob.objects.create(agency=self.agency)
+
+        job = claim_job()
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual(job.status, ExportJob.RUNNING)
+        self.assertIsNotNone(job.started_at)
+
+        self.assertNotEqual(claim_job().pk, first.pk)
+        self.assertIsNone(claim_job())
+
+    def test_claim_job_takes_over_stale_jobs(self):
+        job = ExportJob.objects.create(agency=self.agency)
+        claim_job()
+        self.assertIsNone(claim_job())
+
+        # The worker died without saving any progress.
+        ExportJob.objects.filter(pk=job.pk).update(
+            progress_saved_at=timezone.now() -
+            timedelta(seconds=STALE_JOB_TIMEOUT + 1))
+        self.assertEqual(claim_job().pk, job.pk)
+        self.assertIsNone(claim_job())
+
+    def test_run_job_writes_the_agencys_filtered_calls(self):
+        ExportJob.objects.create(agency=self.agency, query='district=1')
+        job = run_job(claim_job())
+
+        self.assertEqual(job.status, ExportJob.FINISHED)
+        self.assertEqual(job.rows_written, 1)
+        self.assertEqual(job.progress, 1.0)
+        with open(job_path(job)) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['call_id'] for row in rows], ['1'])
+        self.assertEqual(os.listdir(self.export_dir), [job.filename])
+
+    def test_run_job_counts_rows_with_newlines_once(self):
+        Call.objects.filter(call_id='1').update(
+            street_address='1 MAIN ST\nAPT "2"')
+        ExportJob.objects.create(agency=self.agency)
+        job = run_job(claim_job())
+
+        self.assertEqual(job.rows_total, 2)
+        self.assertEqual(job.rows_written, 2)
+
+    def test_run_job_records_failures(self):
+        ExportJob.objects.create(agency=self.agency)
+        job = claim_job()
+        shutil.rmtree(self.export_dir)
+
+        try:
+            run_job(job)
+        finally:
+            os.makedirs(self.export_dir)
+        self.assertEqual(job.status, ExportJob.FAILED)
+        self.assertTrue(job.error)
+
+
+class ExportJobAPITestCase(APITestCase):
+
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.settings = override_settings(EXPORT_JOB_DIR=self.export_dir)
+        self.settings.enable()
+
+        self.agency = Agency.objects.create(code='A', descr='A')
+        create_call(call_id='1', time_received='2015-01-01T09:00',
+                    agency=self.agency)
+        create_call(call_id='2', time_received='2015-01-02T09:00',
+                    agency=self.agency)
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.export_dir)
+
+    def finished_job(self):
+        response = self.client.post('/api/A/exports/?time_received__gte='
+                                    '2015-01-01')
+        run_job(claim_job())
+        return self.client.get(response['Location'])
+
+    def test_submit_job(self):
+        response = self.client.post('/api/A/exports/?district=1'
+                                    '&file_format=csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], ExportJob.QUEUED)
+        self.assertEqual(response.data['query'], 'district=1')
+        self.assertIsNone(response.data['download_url'])
+
+        response = self.client.get(response['Location'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], ExportJob.QUEUED)
+
+    def test_submit_job_with_bad_filters_or_format(self):
+        response = self.client.post('/api/A/exports/?no_such_filter=1')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/A/exports/?file_format=xls')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_submit_job_when_disabled(self):
+        with override_settings(EXPORT_JOB_DIR=None):
+            response = self.client.post('/api/A/exports/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_download(self):
+        response = self.client.get(self.finished_job().data['download_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        content = b''.join(response.streaming_content)
+        rows = list(csv.DictReader(StringIO(content.decode('utf-8'))))
+        self.assertEqual([row['call_id'] for row in rows], ['1', '2'])
+
+    def test_download_range(self):
+        url = self.finished_job().data['download_url']
+        whole = b''.join(self.client.get(url).streaming_content)
+
+        response = self.client.get(url, HTTP_RANGE='bytes=10-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'],
+                         'bytes 10-{0}/{1}'.format(len(whole) - 1, len(whole)))
+        self.assertEqual(b''.join(response.streaming_content), whole[10:])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=10-',
+                                   HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            url, HTTP_RANGE='bytes={}-'.format(len(whole)))
+        self.assertEqual(response.status_code, 416)
+
+    def test_download_unfinished_job(self):
+        response = self.client.post('/api/A/exports/')
+        url = '/A/exports/{}/download'.format(response.data['export_job_id'])
+        self.assertEqual(self.client.get(url).status_code, 404)
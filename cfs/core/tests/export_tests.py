@@ -0,0 +1,87 @@
+import csv
+import queue
+import threading
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from ..exports import EXPORT_FIELDS, COLUMNAR_FIELDS, QueueWriter, \
+    copy_sql, columnar_exports_available, pa, pq, stream_columnar, \
+    stream_copy
+from ..models import Call, District, Nature, NatureGroup
+from .test_helpers import create_call
+
+
+@patch('core.exports.COPY_CHUNK_SIZE', 10)
+def test_queue_writer_puts_blocks_of_rows():
+    chunks = queue.Queue()
+    writer = QueueWriter(chunks, threading.Event())
+    for row in (b'1,a\n', b'2,b\n', b'3,c\n', b'4,d\n'):
+        writer.write(row)
+    assert chunks.get_nowait() == b'1,a\n2,b\n3,c\n'
+    assert chunks.empty()
+
+    writer.flush()
+    assert chunks.get_nowait() == b'4,d\n'
+    writer.flush()
+    assert chunks.empty()
+
+
+class CopyExportTest(TestCase):
+
+    def setUp(self):
+        group = NatureGroup.objects.create(nature_group_id=1, descr="G1")
+        nature = Nature.objects.create(nature_id=1, descr="Robbery",
+                                       nature_group=group)
+        district = District.objects.create(district_id=1, descr="D1")
+        create_call(call_id='1', time_received='2015-01-01T09:00',
+                    nature=nature, district=district,
+                    street_address='100 MAIN ST, "REAR"')
+        create_call(call_id='2', time_received='2015-01-02T09:00')
+
+    def export(self, queryset):
+        output = ''.join(
+            chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+            for chunk in stream_copy(copy_sql(queryset)))
+        return list(csv.DictReader(StringIO(output)))
+
+    def test_export_has_the_export_columns(self):
+        rows = self.export(Call.objects.order_by('call_id'))
+        self.assertEqual(sorted(rows[0]), sorted(EXPORT_FIELDS))
+
+        self.assertEqual(rows[0]['call_id'], '1')
+        self.assertEqual(rows[0]['nature'], 'Robbery')
+        self.assertEqual(rows[0]['nature_group'], 'G1')
+        self.assertEqual(rows[0]['district'], 'D1')
+        self.assertEqual(rows[0]['street_address'], '100 MAIN ST, "REAR"')
+        self.assertEqual(rows[1]['nature'], '')
+
+    def test_export_applies_the_queryset_filters(self):
+        rows = self.export(Call.objects.filter(district_id=1))
+        self.assertEqual([row['call_id'] for row in rows], ['1'])
+
+    @skipUnless(columnar_exports_available(), "pyarrow isn't installed")
+    def test_parquet_export(self):
+        data = b''.join(stream_columnar(Call.objects.order_by('call_id'),
+                                        'parquet'))
+        table = pq.read_table(BytesIO(data))
+
+        self.assertEqual(table.column_names,
+                         [name for name, _, _ in COLUMNAR_FIELDS])
+        self.assertTrue(pa.types.is_dictionary(
+            table.schema.field('nature').type))
+        self.assertTrue(pa.types.is_timestamp(
+            table.schema.field('time_received').type))
+        rows = table.to_pylist()
+        self.assertEqual(rows[0]['nature'], 'Robbery')
+        self.assertEqual(rows[0]['nature_group'], 'G1')
+        self.assertIsNone(rows[1]['nature'])
+
+    @skipUnless(columnar_exports_available(), "pyarrow isn't installed")
+    def test_arrow_export(self):
+        data = b''.join(stream_columnar(Call.objects.filter(district_id=1),
+                                        'arrow'))
+        table = pa.ipc.open_file(pa.BufferReader(data)).read_all()
+        self.assertEqual(table.column('call_id').to_pylist(), ['1'])
@@ -5,7 +5,7 @@ from django.http import QueryDict
 from django.test import TestCase
 from nose.tools import nottest
 from ..filters import create_filterset, create_rel_filterset, \
-    CallFilterSet
+    CallFilterSet, date_range_filter
 from officer_allocation.filters import OfficerActivityFilterSet
 from ..models import Call, District, CallUnit, Squad, CallSource, ZipCode, \
     OfficerActivity, Nature, OfficerActivityType, Beat, CallLog, InCallPeriod, \
@@ -202,13 +202,17 @@ class CallFilterSetTest(TestCase):
                                       time_received='2015-01-01T09:00-05:00',
                                       district=d1, primary_unit=cu1,
                                       officer_response_time=timedelta(
-                                          seconds=1), call_source=cs1)
+                                          seconds=1), call_source=cs1,
+                                      street_address="100 MAIN ST",
+                                      business="Corner Store")
         self.c2 = create_call(call_id=2,
                                       time_received='2015-01-02T09:00-05:00',
                                       district=d2, primary_unit=cu2,
                                       first_dispatched=cu1,
                                       officer_response_time=timedelta(
-                                          seconds=90), call_source=cs1)
+                                          seconds=90), call_source=cs1,
+                                      street_address="200 ELM ST",
+                                      crossroad1="Main St")
         self.c3 = create_call(call_id=3,
                                       time_received='2015-01-03T09:00-05:00',
                                       district=d2, primary_unit=cu3,
@@ -229,9 +233,60 @@ class CallFilterSetTest(TestCase):
         filter = CallFilterSet(data=QueryDict("squad=2"), queryset=Call.objects.all())
         assert filter.filter().count() == 1
 
+    def test_squad_filter_follows_unit_changes(self):
+        cu3 = CallUnit.objects.get(call_unit_id=3)
+        cu3.squad_id = 1
+        cu3.save()
+
+        filter = CallFilterSet(data=QueryDict("squad=2"), queryset=Call.objects.all())
+        assert filter.filter().count() == 0
+        assert Call.objects.get(call_id=3).squad_ids == [1]
+
+    def test_unit_filter(self):
+        filter = CallFilterSet(data=QueryDict("unit=1"), queryset=Call.objects.all())
+        assert filter.filter().count() == 3
+
+        filter = CallFilterSet(data=QueryDict("unit=3"), queryset=Call.objects.all())
+        assert filter.filter().count() == 1
+
+    def test_search_filter(self):
+        filter = CallFilterSet(data=QueryDict("search=main"), queryset=Call.objects.all())
+        assert set(filter.filter()) == {self.c1, self.c2}
+
+        filter = CallFilterSet(data=QueryDict("search=corner+store"), queryset=Call.objects.all())
+        assert list(filter.filter()) == [self.c1]
+
+    def test_street_address_filter(self):
+        filter = CallFilterSet(data=QueryDict("street_address=main"), queryset=Call.objects.all())
+        assert list(filter.filter()) == [self.c1]
+
+        filter = CallFilterSet(data=QueryDict("street_address__icontains=st"), queryset=Call.objects.all())
+        assert filter.filter().count() == 2
+
     def test_initiated_by_filter(self):
         filter = CallFilterSet(data=QueryDict("initiated_by=1"), queryset=Call.objects.all())
         assert filter.filter().count() == 1
 
         filter = CallFilterSet(data=QueryDict("initiated_by=0"), queryset=Call.objects.all())
         assert filter.filter().count() == 2
+
+
+def call_date_range(query):
+    filter_set = CallFilterSet(data=QueryDict(query),
+                               queryset=Call.objects.all())
+    return date_range_filter(filter_set.get_specs(), 'time_received')
+
+
+def test_date_range_filter_without_filters():
+    assert call_date_range("") == (None, None)
+
+
+def test_date_range_filter_with_dates():
+    start, end = call_date_range(
+        "time_received__gte=2015-01-01&time_received__lte=2015-01-31")
+    assert (str(start), str(end)) == ("2015-01-01", "2015-01-31")
+
+
+def test_date_range_filter_with_other_filters():
+    assert call_date_range("time_received__gte=2015-01-01&beat=1") is None
+    assert call_date_range("time_received__gte!=2015-01-01") is None
@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+from django.http import QueryDict
+from django.test import override_settings
+
+from ..filter_usage import (filter_set_path, log_filter_usage, propose_indexes,
+                            read_filter_usage)
+from ..filters import CallFilterSet
+from ..models import Agency
+
+CALLS = filter_set_path(CallFilterSet)
+
+
+def proposals(*queries):
+    return propose_indexes((CALLS, 'CPD', query) for query in queries)
+
+
+def test_equality_columns_precede_the_range_column():
+    [proposal] = proposals("nature=1&time_received__gte=2015-01-01")
+    assert proposal.columns == ['agency_id', 'nature_id', 'time_received']
+    assert proposal.requests == 1
+
+
+def test_boolean_filters_become_partial_predicates():
+    [proposal] = proposals("cancelled=false&time_received__gte=2015-01-01")
+    assert proposal.columns == ['agency_id', 'time_received']
+    assert proposal.predicate.where == 'NOT cancelled'
+    assert proposal.sql().endswith(
+        'ON call (agency_id, time_received) WHERE NOT cancelled')
+
+
+def test_more_used_columns_come_first():
+    ordered = proposals("district=1", "district=2",
+                        "district=1&nature=3&time_received__gte=2015-01-01")
+    assert [p.columns for p in ordered] == [
+        ['agency_id', 'district_id'],
+        ['agency_id', 'district_id', 'nature_id', 'time_received'],
+    ]
+
+
+def test_min_requests():
+    assert propose_indexes([(CALLS, 'CPD', "district=1")],
+                           min_requests=2) == []
+
+
+def test_existing_indexes_cover_their_prefixes():
+    [proposal] = proposals("district=1")
+    assert proposal.covered_by([(['agency_id', 'district_id',
+                                  'time_received'], None)])
+    assert not proposal.covered_by([(['agency_id', 'district_id'],
+                                     '(NOT cancelled)')])
+    assert not proposal.covered_by([(['district_id'], None)])
+
+
+def test_log_filter_usage():
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        agency = Agency(code='CPD')
+        with override_settings(FILTER_USAGE_LOG=path):
+            log_filter_usage(CallFilterSet, agency,
+                             QueryDict("nature=1&district="))
+            log_filter_usage(CallFilterSet, agency, QueryDict(""))
+        with override_settings(FILTER_USAGE_LOG=None):
+            log_filter_usage(CallFilterSet, agency, QueryDict("nature=2"))
+
+        with open(path, 'a') as f:
+            f.write('not json\n')
+
+        assert list(read_filter_usage(path)) == [(CALLS, 'CPD', 'nature=1')]
+    finally:
+        os.remove(path)
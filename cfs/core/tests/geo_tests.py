@@ -0,0 +1,163 @@
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from nose.tools import assert_equal, assert_raises
+from rest_framework.test import APITestCase
+
+from ..geo import MapView, cell_size, lat_lon, parse_bbox, parse_zoom, \
+    pyproj, reproject_calls, transformer
+from ..models import Agency, Call, Nature
+from ..summaries import CallMapOverview
+from .test_helpers import create_call, q
+
+
+def test_parse_bbox():
+    assert_equal(parse_bbox(''), None)
+    assert_equal(parse_bbox('1,2,3.5,4'), (1, 2, 3.5, 4))
+    assert_raises(ValueError, parse_bbox, '1,2,3')
+    assert_raises(ValueError, parse_bbox, '3,2,1,4')
+    assert_raises(ValueError, parse_bbox, '1,2,nan,4')
+
+
+def test_parse_zoom():
+    assert_equal(parse_zoom(None), None)
+    assert_equal(parse_zoom('12'), 12)
+    assert_raises(ValueError, parse_zoom, '1.5')
+
+
+def test_cell_size_is_a_power_of_two():
+    assert_equal(cell_size((0, 0, 48, 10)), 1)
+    assert_equal(cell_size((0, 0, 10, 100)), 2)
+    assert_equal(cell_size((0, 0, 0.5, 0.5)), 2 ** -7)
+    assert_equal(cell_size((5, 5, 5, 5)), 1)
+
+
+def test_lat_lon():
+    plain = Agency(code='A', descr='A')
+    flipped = Agency(code='B', descr='B', coords_flipped=True)
+    assert_equal(lat_lon(plain, -78.9, 36.0), (36.0, -78.9))
+    assert_equal(lat_lon(flipped, 36.0, -78.9), (36.0, -78.9))
+    assert_equal(lat_lon(plain, None, 36.0), (None, None))
+    assert_equal(lat_lon(plain, float('nan'), 36.0), (None, None))
+
+
+class ReprojectTest(TestCase):
+
+    @skipUnless(pyproj, "pyproj isn't installed")
+    def test_projected_coordinates(self):
+        # North Carolina State Plane, in US feet.
+        agency = Agency.objects.create(
+            code='A', descr='A', coords_flipped=True,
+            projection='+proj=lcc +lat_1=36.16666666666666 '
+                       '+lat_2=34.33333333333334 +lat_0=33.75 +lon_0=-79 '
+                       '+x_0=609601.22 +y_0=0 +ellps=GRS80 +datum=NAD83 '
+                       '+units=us-ft +no_defs')
+        call = create_call(call_id='1', time_received='2015-01-01T09:00',
+                           agency=agency, geox=2028000, geoy=816000)
+        self.assertAlmostEqual(call.lat, 35.99, places=1)
+        self.assertAlmostEqual(call.lon, -78.90, places=1)
+
+    @patch('core.geo.pyproj', None)
+    def test_projected_coordinates_without_pyproj(self):
+        transformer.cache_clear()
+        self.addCleanup(transformer.cache_clear)
+        agency = Agency.objects.create(code='A', descr='A',
+                                       projection='+proj=utm +zone=17')
+        call = create_call(call_id='1', time_received='2015-01-01T09:00',
+                           agency=agency, geox=690000, geoy=3985000)
+        self.assertEqual((call.lat, call.lon), (None, None))
+
+        with self.assertRaises(ImproperlyConfigured):
+            reproject_calls(agency)
+
+    def test_reproject_calls(self):
+        agency = Agency.objects.create(code='A', descr='A')
+        create_call(call_id='1', time_received='2015-01-01T09:00',
+                    agency=agency, geox=-78.9, geoy=36.0)
+        create_call(call_id='2', time_received='2015-01-01T09:00',
+                    agency=agency, geox=float('nan'), geoy=36.0)
+
+        agency.coords_flipped = True
+        agency.save()
+        self.assertEqual(reproject_calls(agency), 2)
+        self.assertEqual(
+            list(Call.objects.order_by('call_id').values_list('lat', 'lon')),
+            [(-78.9, 36.0), (None, None)])
+
+
+class CallMapOverviewTest(TestCase):
+
+    def setUp(self):
+        self.agency = Agency.objects.create(code='A', descr='A')
+        robbery = Nature.objects.create(nature_id=1, descr='Robbery')
+        theft = Nature.objects.create(nature_id=2, descr='Theft')
+
+        # Three calls near (0, 0), mostly robberies, and one far away.
+        create_call(call_id='1', time_received='2015-01-01T09:00',
+                    agency=self.agency, geox=0.1, geoy=0.1, nature=robbery,
+                    street_address='1 MAIN ST')
+        create_call(call_id='2', time_received='2015-01-01T10:00',
+                    agency=self.agency, geox=0.2, geoy=0.3, nature=robbery,
+                    street_address='1 MAIN ST')
+        create_call(call_id='3', time_received='2015-01-01T11:00',
+                    agency=self.agency, geox=0.3, geoy=0.2, nature=theft,
+                    street_address='2 MAIN ST', business='Store')
+        create_call(call_id='4', time_received='2015-01-01T12:00',
+                    agency=self.agency, geox=90, geoy=90,
+                    street_address='3 MAIN ST')
+        create_call(call_id='5', time_received='2015-01-01T13:00',
+                    agency=self.agency)
+
+    def overview(self, **map_view):
+        overview = CallMapOverview(self.agency, filters=q(''))
+        overview.map_view = MapView(**dict({'zoom': None, 'bbox': None},
+                                           **map_view))
+        return overview
+
+    def test_few_calls_are_points(self):
+        overview = self.overview()
+        self.assertEqual(len(overview.locations()), 4)
+        self.assertEqual(overview.clusters(), [])
+
+    def test_bbox_limits_the_calls(self):
+        overview = self.overview(bbox=(0, 0, 1, 1))
+        self.assertEqual(sorted(loc[2] for loc in overview.locations()),
+                         ['1 MAIN ST', '1 MAIN ST', '2 MAIN ST'])
+        self.assertEqual(overview.top_locations()[0],
+                         {'address': '1 MAIN ST', 'business': None,
+                          'total': 2})
+
+    @patch('core.summaries.CLUSTER_POINT_LIMIT', 2)
+    def test_many_calls_are_clustered(self):
+        overview = self.overview()
+        self.assertEqual(overview.locations(), [])
+
+        clusters = overview.clusters()
+        self.assertEqual([cluster[2:] for cluster in clusters],
+                         [[3, 'Robbery'], [1, None]])
+        self.assertAlmostEqual(clusters[0][0], 0.2)
+        self.assertAlmostEqual(clusters[0][1], 0.2)
+
+    @patch('core.summaries.CLUSTER_POINT_LIMIT', 2)
+    def test_closest_zoom_is_points(self):
+        overview = self.overview(zoom=18)
+        self.assertEqual(len(overview.locations()), 4)
+        self.assertEqual(overview.clusters(), [])
+
+
+class CallMapAPITest(APITestCase):
+
+    def setUp(self):
+        Agency.objects.create(code='A', descr='A')
+
+    def test_bad_map_view(self):
+        response = self.client.get('/api/A/call_map/?bbox=1,2&zoom=x')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.data), ['bbox', 'zoom'])
+
+    def test_map_view_is_not_a_filter(self):
+        response = self.client.get('/api/A/call_map/?bbox=0,0,1,1&zoom=12')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['locations'], [])
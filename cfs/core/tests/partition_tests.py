@@ -0,0 +1,73 @@
+from datetime import date, datetime
+
+from unittest import SkipTest
+
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+
+from ..partitions import (ensure_partitions, is_partitioned, month_starts,
+                          partition_name, partition_table,
+                          supports_partitioning)
+
+
+def test_month_starts():
+    months = list(month_starts(datetime(2015, 11, 30, 23),
+                               datetime(2016, 2, 1)))
+    assert months == [date(2015, 11, 1), date(2015, 12, 1),
+                      date(2016, 1, 1), date(2016, 2, 1)]
+
+
+def test_month_starts_within_a_month():
+    assert list(month_starts(date(2015, 3, 2), date(2015, 3, 30))) == \
+        [date(2015, 3, 1)]
+
+
+def test_partition_name():
+    assert partition_name('call', date(2015, 3, 1)) == 'call_y2015m03'
+
+
+class EnsurePartitionsTest(TestCase):
+
+    def test_unpartitioned_tables_are_left_alone(self):
+        assert not is_partitioned('call')
+        ensure_partitions('call', [datetime(2015, 1, 1), None])
+        assert not is_partitioned('call')
+
+
+class PartitionTableTest(TestCase):
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+            CREATE TABLE partition_test (
+              id integer PRIMARY KEY,
+              code text NOT NULL,
+              time timestamp with time zone NOT NULL
+            )""")
+            cursor.execute("CREATE UNIQUE INDEX partition_test_code_key "
+                           "ON partition_test (code)")
+            cursor.execute("INSERT INTO partition_test "
+                           "VALUES (1, 'a', '2015-01-05')")
+
+    def insert(self, id, code, time):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("INSERT INTO partition_test VALUES (%s, %s, %s)",
+                           [id, code, time])
+
+    def test_unique_indexes_get_the_partition_column(self):
+        if not supports_partitioning():
+            raise SkipTest("Partitioning needs PostgreSQL 11 or later.")
+        partition_table('partition_test', 'time')
+        assert is_partitioned('partition_test')
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexdef FROM pg_indexes "
+                           "WHERE indexname = 'partition_test_code_key'")
+            assert 'UNIQUE' in cursor.fetchone()[0]
+
+        with self.assertRaises(IntegrityError):
+            self.insert(2, 'a', '2015-01-05')
+        with self.assertRaises(IntegrityError):
+            self.insert(1, 'b', '2015-01-05')
+        # Only unique within the same time once partitioned.
+        self.insert(1, 'a', '2015-02-05')
@@ -0,0 +1,109 @@
+import time
+from collections import OrderedDict
+from unittest.mock import patch
+
+from dateutil.parser import parse as dtparse
+from django.test import TestCase, TransactionTestCase
+
+from ..models import Agency, Beat
+from ..parallel import run_sections
+from ..summaries import CallResponseTimeOverview, CallVolumeOverview
+from .test_helpers import create_call, q
+
+
+class OverviewSectionsTest(TestCase):
+    def setUp(self):
+        self.agency = Agency.objects.create(code='A', descr='Agency A')
+        b1 = Beat.objects.create(beat_id=1, descr="B1")
+        create_call(call_id=1, time_received='2015-01-01T09:00',
+                    agency=self.agency, beat=b1)
+        create_call(call_id=2, time_received='2015-01-02T09:00',
+                    agency=self.agency, beat=b1)
+
+    def test_returns_only_requested_sections(self):
+        overview = CallVolumeOverview(self.agency, q(""))
+        results = overview.to_dict(sections=['count', 'beat_ids'])
+
+        assert set(results) == {'count', 'beat_ids'}
+        assert results['count'] == 2
+        assert results['beat_ids'] == {'B1': 1}
+
+    def test_returns_every_section_by_default(self):
+        overview = CallVolumeOverview(self.agency, q(""))
+        assert set(overview.to_dict()) == \
+            set(CallVolumeOverview.section_names())
+
+    def test_rejects_unknown_sections(self):
+        overview = CallVolumeOverview(self.agency, q(""))
+        with self.assertRaises(ValueError):
+            overview.to_dict(sections=['count', 'nonsense'])
+
+
+class ParallelSectionsTest(TransactionTestCase):
+    def setUp(self):
+        # Worker threads use their own connections, so the calls have to be
+        # committed for them to see.
+        self.agency = Agency.objects.create(code='A', descr='Agency A')
+        b1 = Beat.objects.create(beat_id=1, descr="B1")
+        b2 = Beat.objects.create(beat_id=2, descr="B2")
+        create_call(call_id=1, time_received='2015-01-01T09:00',
+                    first_unit_dispatch=dtparse('2015-01-01T09:01'),
+                    first_unit_arrive=dtparse('2015-01-01T09:06'),
+                    agency=self.agency, beat=b1)
+        create_call(call_id=2, time_received='2015-01-02T09:00',
+                    first_unit_dispatch=dtparse('2015-01-02T09:02'),
+                    first_unit_arrive=dtparse('2015-01-02T09:12'),
+                    agency=self.agency, beat=b2)
+        create_call(call_id=3, time_received='2015-01-02T18:00',
+                    agency=self.agency, beat=b2)
+
+    def test_matches_serial_sections(self):
+        # The response time overview's breakdowns are each their own
+        # section, unlike the call volume overview's grouped ones.
+        with self.settings(SUMMARY_SECTION_WORKERS=0):
+            serial = CallResponseTimeOverview(self.agency, q("")).to_dict()
+        with self.settings(SUMMARY_SECTION_WORKERS=4):
+            parallel = CallResponseTimeOverview(self.agency,
+                                                q("")).to_dict()
+
+        assert list(parallel) == list(serial)
+        assert parallel == serial
+
+    def test_shared_properties_are_computed_once(self):
+        overview = CallVolumeOverview(self.agency, q(""))
+        with patch.object(overview, 'get_bounds',
+                          wraps=overview.get_bounds) as get_bounds, \
+                self.settings(SUMMARY_SECTION_WORKERS=4):
+            overview.to_dict(sections=['bounds', 'precision'])
+        assert get_bounds.call_count == 1
+
+        overview = CallResponseTimeOverview(self.agency, q(""))
+        with patch('core.summaries.count_rows',
+                   return_value=(3, True)) as count_rows, \
+                self.settings(SUMMARY_SECTION_WORKERS=4):
+            results = overview.to_dict(sections=['count', 'count_exact'])
+        assert results == {'count': 3, 'count_exact': True}
+        assert count_rows.call_count == 1
+
+    def test_keeps_the_sections_order(self):
+        # The first section finishes last.
+        sections = OrderedDict([
+            ('slow', lambda: time.sleep(0.05) or 'slow'),
+            ('fast', lambda: 'fast'),
+            ('query', lambda: Beat.objects.order_by('beat_id')
+                                          .values_list('descr', flat=True)),
+        ])
+        with self.settings(SUMMARY_SECTION_WORKERS=4):
+            results = run_sections(sections)
+
+        assert list(results.items()) == [('slow', 'slow'), ('fast', 'fast'),
+                                         ('query', ['B1', 'B2'])]
+
+    def test_raises_section_errors(self):
+        def broken():
+            raise ZeroDivisionError
+
+        sections = OrderedDict([('fine', lambda: 1), ('broken', broken)])
+        with self.settings(SUMMARY_SECTION_WORKERS=4):
+            with self.assertRaises(ZeroDivisionError):
+                run_sections(sections)
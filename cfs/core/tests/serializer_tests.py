@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.test import TestCase
+
+from ..models import Call, CallUnit, City, District, Nature, NatureGroup, Squad
+from ..serializers import CallCompactSerializer, CallExportSerializer, \
+    CallSerializer, RowSerializer
+from .test_helpers import create_call
+
+
+class RowSerializerTest(TestCase):
+
+    def setUp(self):
+        squad = Squad.objects.create(squad_id=1, descr="S1")
+        cu1 = CallUnit.objects.create(call_unit_id=1, descr="CU1", squad=squad)
+        cu2 = CallUnit.objects.create(call_unit_id=2, descr="CU2")
+        group = NatureGroup.objects.create(nature_group_id=1, descr="G1")
+        nature = Nature.objects.create(nature_id=1, descr="N1",
+                                       nature_group=group)
+        create_call(call_id='1', time_received='2015-01-01T09:00',
+                    district=District.objects.create(district_id=1,
+                                                     descr="D1"),
+                    city=City.objects.create(city_id=1, descr="Durham"),
+                    nature=nature, primary_unit=cu1, reporting_unit=cu2,
+                    street_address="100 MAIN ST",
+                    officer_response_time=timedelta(minutes=5))
+        create_call(call_id='2', time_received='2015-01-02T10:30')
+
+    def assertSameAsSerializer(self, serializer_class, **kwargs):
+        calls = Call.objects.order_by('call_id')
+        expected = serializer_class(calls, many=True, **kwargs).data
+        rows = RowSerializer(serializer_class, **kwargs)
+        self.assertEqual([dict(row) for row in rows.serialize(calls)],
+                         [dict(call) for call in expected])
+
+    def test_call_serializer(self):
+        self.assertSameAsSerializer(CallSerializer)
+
+    def test_sparse_fields(self):
+        self.assertSameAsSerializer(
+            CallSerializer, fields=['call_id', 'primary_unit', 'nature_group'])
+
+    def test_compact_serializer(self):
+        self.assertSameAsSerializer(CallCompactSerializer)
+
+    def test_export_serializer(self):
+        self.assertSameAsSerializer(CallExportSerializer)
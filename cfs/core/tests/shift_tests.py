@@ -0,0 +1,106 @@
+from datetime import date, datetime, time
+
+from django.http import QueryDict
+from django.test import TestCase
+
+from ..filters import CallFilterSet
+from ..models import Agency, Call, ShiftPeriod, ShiftSchedule
+from ..shifts import recompute_shifts, shift_number
+from .test_helpers import create_call
+
+
+def schedule(starts_on, periods, rotation_days=1):
+    return ({'starts_on': starts_on, 'rotation_days': rotation_days},
+            [{'shift_number': number, 'descr': str(number),
+              'rotation_day': rotation_day, 'start_time': start,
+              'end_time': end}
+             for number, rotation_day, start, end in periods])
+
+
+EIGHT_HOUR_SHIFTS = schedule(date(2015, 1, 1), [
+    (0, 0, time(7), time(15)),
+    (1, 0, time(15), time(23)),
+    (2, 0, time(23), time(7)),
+])
+
+# Alternating days where the day shift starts at 0600 and 0800.
+ROTATING_SHIFTS = schedule(date(2015, 1, 1), [
+    (0, 0, time(6), time(18)),
+    (1, 0, time(18), time(8)),
+    (0, 1, time(8), time(18)),
+    (1, 1, time(18), time(6)),
+], rotation_days=2)
+
+
+def test_default_shifts():
+    assert shift_number(None, datetime(2015, 1, 1, 6), []) == 0
+    assert shift_number(None, datetime(2015, 1, 1, 17, 59), []) == 0
+    assert shift_number(None, datetime(2015, 1, 1, 18), []) == 1
+    assert shift_number(None, datetime(2015, 1, 1, 5, 59), []) == 1
+
+
+def test_shifts_past_midnight():
+    schedules = [EIGHT_HOUR_SHIFTS]
+    assert shift_number(None, datetime(2015, 3, 1, 7), schedules) == 0
+    assert shift_number(None, datetime(2015, 3, 1, 22, 59), schedules) == 1
+    assert shift_number(None, datetime(2015, 3, 1, 23), schedules) == 2
+    assert shift_number(None, datetime(2015, 3, 2, 3), schedules) == 2
+
+
+def test_rotating_shifts():
+    schedules = [ROTATING_SHIFTS]
+    # 2015-01-01 is day 0 of the rotation and 2015-01-02 is day 1.
+    assert shift_number(None, datetime(2015, 1, 1, 7), schedules) == 0
+    assert shift_number(None, datetime(2015, 1, 2, 7), schedules) == 1
+    assert shift_number(None, datetime(2015, 1, 3, 7), schedules) == 0
+    assert shift_number(None, datetime(2015, 1, 3, 5), schedules) == 1
+
+
+def test_later_schedules_take_over():
+    schedules = [schedule(date(2015, 1, 1), [(0, 0, time(0), time(0))]),
+                 schedule(date(2015, 6, 1), [(5, 0, time(0), time(0))])]
+    assert shift_number(None, datetime(2014, 12, 31), schedules) == 0
+    assert shift_number(None, datetime(2015, 5, 31, 23), schedules) == 0
+    assert shift_number(None, datetime(2015, 6, 1), schedules) == 5
+
+
+def test_uncovered_times_have_no_shift():
+    schedules = [schedule(date(2015, 1, 1), [(0, 0, time(9), time(17))])]
+    assert shift_number(None, datetime(2015, 1, 1, 8), schedules) is None
+
+
+def test_calls_use_the_schedules_they_are_given():
+    call = Call(time_received=datetime(2015, 3, 1, 16))
+    call.update_derived_fields(unit_squads={}, schedules=[EIGHT_HOUR_SHIFTS])
+    assert call.shift_received == 1
+
+
+class ShiftScheduleTest(TestCase):
+
+    def setUp(self):
+        self.agency = Agency.objects.create(code='A', descr='A')
+        for call_id, hour in enumerate([8, 16, 23], 1):
+            create_call(call_id=call_id, agency=self.agency,
+                        time_received='2015-01-01T{:02d}:00'.format(hour))
+
+    def shift_count(self, shift):
+        return CallFilterSet(data=QueryDict("shift={}".format(shift)),
+                             queryset=Call.objects.all()).filter().count()
+
+    def test_recomputing_after_a_schedule_change(self):
+        assert self.shift_count(0) == 2
+        assert self.shift_count(2) == 0
+
+        schedule = ShiftSchedule.objects.create(agency=self.agency,
+                                                starts_on=date(2015, 1, 1))
+        for number, start, end in [(0, 7, 15), (1, 15, 23), (2, 23, 7)]:
+            ShiftPeriod.objects.create(shift_schedule=schedule,
+                                       shift_number=number,
+                                       descr="Shift {}".format(number + 1),
+                                       start_time=time(start),
+                                       end_time=time(end))
+
+        assert recompute_shifts(self.agency) == 2
+        assert self.shift_count(0) == 1
+        assert self.shift_count(1) == 1
+        assert self.shift_count(2) == 1
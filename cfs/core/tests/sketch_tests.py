@@ -0,0 +1,94 @@
+import math
+import random
+
+from dateutil.parser import parse as dtparse
+from django.test import TestCase, override_settings
+
+from ..models import Agency, Beat, CallResponseTimeSketch
+from ..summaries import CallResponseTimeOverview
+from ..sketches import ResponseTimeHistogram, RELATIVE_ERROR, bucket_for, \
+    bucket_value
+from .test_helpers import create_call, q
+
+
+def exact_quantile(values, q):
+    values = sorted(values)
+    return values[math.floor(q * (len(values) - 1))]
+
+
+def test_bucket_value_is_within_error_of_bucket_contents():
+    for secs in (1, 1.5, 30, 61, 600, 3599):
+        estimate = bucket_value(bucket_for(secs))
+        assert abs(estimate - secs) <= RELATIVE_ERROR * secs + 1e-9
+
+
+def test_quantiles_are_within_relative_error():
+    rng = random.Random(42)
+    values = [rng.lognormvariate(6, 1) for _ in range(5000)]
+
+    histogram = ResponseTimeHistogram()
+    for value in values:
+        histogram.add_value(value)
+
+    for quantile in (0.1, 0.25, 0.5, 0.75, 0.9):
+        exact = exact_quantile(values, quantile)
+        assert abs(histogram.quantile(quantile) - exact) <= \
+            RELATIVE_ERROR * exact + 1e-9
+
+
+def test_merged_histograms_match_a_single_histogram():
+    rng = random.Random(7)
+    values = [rng.uniform(1, 3600) for _ in range(1000)]
+
+    whole = ResponseTimeHistogram()
+    for value in values:
+        whole.add_value(value)
+
+    first, second = ResponseTimeHistogram(), ResponseTimeHistogram()
+    for value in values[:400]:
+        first.add_value(value)
+    for value in values[400:]:
+        second.add_value(value)
+    first.merge(second)
+
+    assert first.counts == whole.counts
+    assert first.max == whole.max
+    assert math.isclose(first.total, whole.total)
+    assert first.quartiles() == whole.quartiles()
+
+
+def test_empty_histogram_has_no_summary():
+    assert ResponseTimeHistogram().summary() == {}
+    assert ResponseTimeHistogram().quantile(0.5) is None
+
+
+@override_settings(USE_RESPONSE_TIME_SKETCHES=True)
+class SketchQuartilesTest(TestCase):
+    def setUp(self):
+        self.agency = Agency.objects.create(code='A', descr='A')
+        self.beat = Beat.objects.create(beat_id=1, descr='B1')
+        create_call(call_id='1', time_received='2015-01-01T09:00',
+                    first_unit_dispatch=dtparse('2015-01-01T09:01'),
+                    first_unit_arrive=dtparse('2015-01-01T09:06'),
+                    agency=self.agency, beat=self.beat)
+        CallResponseTimeSketch.update_view()
+
+    def by_beat(self, filters):
+        overview = CallResponseTimeOverview(self.agency, q(filters))
+        return overview.by_field('beat')
+
+    def test_sketches_need_whole_days(self):
+        days = CallResponseTimeOverview(
+            self.agency, q('time_received__gte=2015-01-01'))
+        hours = CallResponseTimeOverview(
+            self.agency, q('time_received__gte=2015-01-01T08:00'))
+        assert days.sketch_filter is not None
+        assert hours.sketch_filter is None
+
+    def test_rows_have_quartiles_either_way(self):
+        [sketched] = self.by_beat('time_received__gte=2015-01-01')
+        [exact] = self.by_beat('time_received__gte=2015-01-01T08:00')
+
+        assert set(sketched) == set(exact)
+        assert abs(sketched['quartiles'][1] - 300) <= RELATIVE_ERROR * 300
+        assert exact['quartiles'] is None
@@ -0,0 +1,171 @@
+import struct
+
+from nose.tools import assert_almost_equal, assert_equal
+from rest_framework.test import APITestCase
+
+from ..models import Agency, Nature
+from ..tiles import CONTENT_TYPE, encode_layer, tile_bounds, tile_exists, \
+    tile_position, varint, zigzag
+from .test_helpers import create_call
+
+
+def test_varint_and_zigzag():
+    assert_equal(varint(1), b'\x01')
+    assert_equal(varint(300), b'\xac\x02')
+    assert_equal([zigzag(n) for n in (0, -1, 1, -2)], [0, 1, 2, 3])
+
+
+def test_tile_bounds():
+    west, south, east, north = tile_bounds(1, 0, 0)
+    assert_equal((west, east), (-180, 0))
+    assert_almost_equal(south, 0)
+    assert_almost_equal(north, 85.0511, places=4)
+
+
+def test_tile_position():
+    assert_equal(tile_position(1, 0, 0, -180, 85.0511), (0, 0))
+    assert_equal(tile_position(1, 0, 0, -90, 0), (2048, 4096))
+
+
+def test_tile_exists():
+    assert tile_exists(2, 3, 3)
+    assert not tile_exists(2, 4, 0)
+    assert not tile_exists(23, 0, 0)
+
+
+def test_encode_layer():
+    layer = encode_layer('calls', [((1, 2), {'count': 3, 'nature': None})])
+    # Version 2, then the name.
+    assert layer.startswith(b'\x78\x02\x0a\x05calls')
+    assert b'count' in layer
+    assert b'nature' not in layer
+
+
+def read_varint(data, i):
+    """The varint at `data[i]`, and where the next field starts."""
+    n = shift = 0
+    while True:
+        byte = data[i]
+        i += 1
+        n |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return n, i
+
+
+def read_packed(data):
+    values, i = [], 0
+    while i < len(data):
+        value, i = read_varint(data, i)
+        values.append(value)
+    return values
+
+
+def read_fields(data):
+    """The (field number, value) pairs of a protocol buffer message, with
+    length-delimited values as bytes."""
+    fields, i = [], 0
+    while i < len(data):
+        key, i = read_varint(data, i)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, i = read_varint(data, i)
+        elif wire_type == 1:
+            value = struct.unpack('<d', data[i:i + 8])[0]
+            i += 8
+        else:
+            length, i = read_varint(data, i)
+            value = data[i:i + length]
+            i += length
+        fields.append((number, value))
+    return fields
+
+
+def decode_value(data):
+    [(number, value)] = read_fields(data)
+    if number == 1:
+        return value.decode('utf-8')
+    if number == 6:
+        return (value >> 1) ^ -(value & 1)
+    if number == 7:
+        return bool(value)
+    return value
+
+
+def decode_layer(layer):
+    """Each point feature's properties, looked up from its tags."""
+    fields = read_fields(layer)
+    keys = [value.decode('utf-8') for number, value in fields
+            if number == 3]
+    values = [decode_value(value) for number, value in fields
+              if number == 4]
+
+    features = []
+    for number, feature in fields:
+        if number == 2:
+            [tags] = [value for n, value in read_fields(feature) if n == 2]
+            tags = read_packed(tags)
+            features.append({keys[k]: values[v]
+                             for k, v in zip(tags[::2], tags[1::2])})
+    return features
+
+
+def test_layer_tags_decode_to_the_properties():
+    properties = [
+        {'count': 1, 'call_id': 'c1', 'address': '1 MAIN ST',
+         'nature': 'Robbery'},
+        {'count': 5, 'nature': 'Theft', 'mean': 2.5, 'cancelled': True},
+        {'count': 1, 'call_id': 'c2', 'address': None, 'nature': 'Robbery',
+         'offset': -3},
+    ]
+    layer = encode_layer('calls', [((i, i), props)
+                                   for i, props in enumerate(properties)])
+    assert_equal(decode_layer(layer),
+                 [{key: value for key, value in props.items()
+                   if value is not None} for props in properties])
+
+
+class CallTileTestCase(APITestCase):
+
+    def setUp(self):
+        self.agency = Agency.objects.create(code='A', descr='A')
+        robbery = Nature.objects.create(nature_id=1, descr='Robbery')
+        # Durham, NC.
+        create_call(call_id='1', time_received='2015-01-01T09:00',
+                    agency=self.agency, geox=-78.9, geoy=36.0,
+                    street_address='1 MAIN ST', nature=robbery)
+        create_call(call_id='2', time_received='2015-01-01T10:00',
+                    agency=self.agency, geox=-78.9, geoy=36.0,
+                    street_address='1 MAIN ST', nature=robbery)
+
+    def test_low_zoom_tiles_have_clusters(self):
+        response = self.client.get('/api/A/call_tiles/4/4/6.pbf')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], CONTENT_TYPE)
+        self.assertIn('ETag', response)
+        self.assertIn(b'Robbery', response.content)
+        self.assertNotIn(b'1 MAIN ST', response.content)
+
+    def test_high_zoom_tiles_have_calls(self):
+        # The tile at zoom 14 covering the calls.
+        response = self.client.get('/api/A/call_tiles/14/4601/6433.pbf')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'1 MAIN ST', response.content)
+
+    def test_empty_tile(self):
+        response = self.client.get('/api/A/call_tiles/4/0/0.pbf')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'Robbery', response.content)
+
+    def test_tiles_that_dont_exist(self):
+        response = self.client.get('/api/A/call_tiles/1/2/0.pbf')
+        self.assertEqual(response.status_code, 404)
+
+    def test_flipped_coordinates(self):
+        agency = Agency.objects.create(code='B', descr='B',
+                                       coords_flipped=True)
+        create_call(call_id='3', time_received='2015-01-01T09:00',
+                    agency=agency, geox=36.0, geoy=-78.9,
+                    street_address='2 MAIN ST')
+        response = self.client.get('/api/B/call_tiles/14/4601/6433.pbf')
+        self.assertIn(b'2 MAIN ST', response.content)
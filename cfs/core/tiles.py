@@ -0,0 +1,165 @@
+"""
+Mapbox Vector Tiles of call locations.
+
+`call_tile` answers /api/<agency>/call_tiles/{z}/{x}/{y}.pbf with a tile
+holding one layer, "calls", of points. Below TILE_POINT_ZOOM, the calls in
+a tile are grouped in SQL into a grid of TILE_GRID_CELLS by
+TILE_GRID_CELLS cells (see core.geo) and each cell is a point with a
+`count` and the most common `nature`; from that zoom on, each call is a
+point of its own. Tiles are encoded here, following version 2.1 of the
+Vector Tile specification, so neither PostGIS nor a protobuf library is
+needed.
+
+Calls are placed by their WGS84 `lat` and `lon`; see core.geo.
+"""
+import math
+import struct
+from collections import OrderedDict
+
+from .geo import grid_clusters, in_bbox, located
+
+# The zoom from which calls are sent one by one rather than in clusters.
+TILE_POINT_ZOOM = 14
+
+# How many grid cells span a tile below TILE_POINT_ZOOM.
+TILE_GRID_CELLS = 64
+
+# The extent of a tile's own coordinates.
+TILE_EXTENT = 4096
+
+MAX_ZOOM = 22
+
+LAYER_NAME = 'calls'
+
+CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+
+
+def tile_exists(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_bounds(z, x, y):
+    """The (west, south, east, north) longitudes and latitudes of a
+    tile."""
+    n = 2 ** z
+
+    def lat(y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def tile_position(z, x, y, lon, lat):
+    """Where a longitude and latitude fall in a tile's coordinates."""
+    n = 2 ** z
+    lat = max(min(lat, 85.0511), -85.0511)
+    tile_x = (lon + 180) / 360 * n
+    tile_y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+    return (int(round((tile_x - x) * TILE_EXTENT)),
+            int(round((tile_y - y) * TILE_EXTENT)))
+
+
+# Protocol buffer encoding, just enough for vector tiles.
+
+def varint(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7f
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def field(number, wire_type):
+    return varint(number << 3 | wire_type)
+
+
+def varint_field(number, n):
+    return field(number, 0) + varint(n)
+
+
+def bytes_field(number, data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return field(number, 2) + varint(len(data)) + data
+
+
+def packed_field(number, values):
+    return bytes_field(number, b''.join(varint(v) for v in values))
+
+
+def encode_value(value):
+    """A Value message."""
+    if isinstance(value, bool):
+        return varint_field(7, int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return varint_field(5, value)
+        return varint_field(6, zigzag(value))
+    if isinstance(value, float):
+        return field(3, 1) + struct.pack('<d', value)
+    return bytes_field(1, str(value))
+
+
+def encode_layer(name, features, extent=TILE_EXTENT):
+    """
+    A Layer message of point features, each a ((x, y), properties) pair
+    in tile coordinates. Properties that are None are left out.
+    """
+    # A feature's tags are indexes into these, in the order they're added.
+    keys, values = OrderedDict(), OrderedDict()
+    encoded = []
+
+    for (x, y), properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+
+        # One MoveTo command with one point.
+        geometry = [1 | 1 << 3, zigzag(x), zigzag(y)]
+        encoded.append(bytes_field(2, packed_field(2, tags) +
+                                   varint_field(3, 1) +
+                                   packed_field(4, geometry)))
+
+    return b''.join(
+        [varint_field(15, 2), bytes_field(1, name)] + encoded +
+        [bytes_field(3, key) for key in keys] +
+        [bytes_field(4, encode_value(value)) for _, value in values] +
+        [varint_field(5, extent)])
+
+
+def encode_tile(layers):
+    """A Tile message of already-encoded layers."""
+    return b''.join(bytes_field(3, layer) for layer in layers)
+
+
+def call_tile(queryset, z, x, y):
+    """The tile of the calls in `queryset`, as bytes."""
+    calls = in_bbox(located(queryset), tile_bounds(z, x, y))
+
+    features = []
+    if z < TILE_POINT_ZOOM:
+        size = 360 / 2 ** z / TILE_GRID_CELLS
+        for lat, lon, count, nature in grid_clusters(calls, size):
+            features.append((tile_position(z, x, y, lon, lat),
+                             {'count': count, 'nature': nature}))
+    else:
+        rows = calls.values_list('lat', 'lon', 'call_id', 'street_address',
+                                 'nature__descr')
+        for lat, lon, call_id, address, nature in rows:
+            features.append((tile_position(z, x, y, lon, lat),
+                             {'count': 1, 'call_id': call_id,
+                              'address': address or None,
+                              'nature': nature}))
+
+    return encode_tile([encode_layer(LAYER_NAME, features)])
@@ -1,74 +1,393 @@
+import time
+from functools import partial
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import Paginator as DjangoPaginator
+from django.core.urlresolvers import reverse
+from django.http import HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
-from rest_framework import viewsets
+from django.utils.functional import cached_property
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status, viewsets
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.filters import OrderingFilter
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
+from url_filter.filtersets import StrictMode
 from url_filter.integrations.drf import DjangoFilterBackend
 
 from .. import serializers
+from ..caching import cached_summary, data_etag, normalize_filters
+from ..counts import EXACT_QUERY_PARAM, count_rows, wants_exact_count
+from ..export_jobs import export_jobs_enabled
+from ..exports import COLUMNAR_FORMATS, columnar_exports_available
+from ..filter_usage import log_filter_usage
 from ..filters import CallFilterSet
-from ..models import Call, Agency
+from ..geo import MapView, parse_bbox, parse_zoom
+from ..models import Call, Agency, ExportJob
+from ..pagination import KeysetPagination
 from ..summaries import CallResponseTimeOverview, \
     CallVolumeOverview, CallMapOverview
+from ..tiles import CONTENT_TYPE as TILE_CONTENT_TYPE, call_tile, \
+    tile_exists
+
+
+class EstimatingPaginator(DjangoPaginator):
+    """A paginator whose count may be an estimate; see core.counts."""
+
+    def __init__(self, *args, exact=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.exact = exact
+
+    @cached_property
+    def count(self):
+        count, self.count_exact = count_rows(self.object_list, self.exact)
+        return count
 
 
 class CallPagination(PageNumberPagination):
     page_size = 50
 
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(
+            EstimatingPaginator, exact=wants_exact_count(request.GET))
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_exact'] = self.page.paginator.count_exact
+        return response
+
+
+class CompactJSONRenderer(JSONRenderer):
+    """JSON selected with `format=compact`, for flat serializers."""
+    format = 'compact'
+
 
 class AgencyMixin:
+    """
+    Looks up the agency from the URL and handles conditional GETs against
+    that agency's data version, answering with a 304 before any query runs
+    when the client's copy is current.
+    """
 
     def dispatch(self, request, agency_code, *args, **kwargs):
         self.agency = get_object_or_404(Agency, code=agency_code)
-        return super().dispatch(request, *args, **kwargs)
+
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        etag = data_etag(self.agency, request)
+        last_modified = None
+        if self.agency.data_updated:
+            last_modified = int(time.mktime(
+                self.agency.data_updated.timetuple()))
+
+        if self.not_modified(request, etag, last_modified):
+            response = HttpResponseNotModified()
+        else:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = [e.strip() for e in if_none_match.split(',')]
+            return '*' in etags or etag in etags or 'W/' + etag in etags
+
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return bool(last_modified and if_modified_since and
+                    last_modified <= if_modified_since)
 
 
 class CallViewSet(AgencyMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows calls to be viewed.
+
+    Pages are numbered unless the request has a `cursor` parameter, in
+    which case they're keyset pages; see core.pagination.
+
+    A `fields` parameter (comma-separated) limits each call to the named
+    fields, and only joins the tables those need. `format=compact` gives
+    the ids of related objects instead of nesting them.
     """
 
     serializer_class = serializers.CallSerializer
+    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + \
+        (CompactJSONRenderer,)
     filter_backends = (DjangoFilterBackend, OrderingFilter)
     filter_class = CallFilterSet
     pagination_class = CallPagination
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if KeysetPagination.cursor_query_param in self.request.GET:
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def list(self, request, *args, **kwargs):
+        filters = request.GET.copy()
+        for param in (CallPagination.page_query_param,
+                      KeysetPagination.cursor_query_param,
+                      KeysetPagination.count_query_param,
+                      EXACT_QUERY_PARAM,
+                      OrderingFilter.ordering_param,
+                      api_settings.URL_FORMAT_OVERRIDE, 'fields'):
+            filters.pop(param, None)
+        log_filter_usage(self.filter_class, self.agency, filters)
+
+        # Serialize from values() rows rather than model instances, which
+        # is much cheaper for long pages. Keyset pages need each call's
+        # time received and id.
+        rows = serializers.RowSerializer(
+            self.get_serializer_class(), fields=self.get_fields(),
+            include=('call_id', 'time_received'))
+        queryset = rows.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                [rows.to_representation(row) for row in page])
+        return Response([rows.to_representation(row) for row in queryset])
+
+    def get_fields(self):
+        """
+        The fields named in the `fields` parameter, or None if it wasn't
+        given.
+        """
+        if not hasattr(self, '_fields'):
+            value = self.request.query_params.get('fields')
+            self._fields = None
+            if value:
+                self._fields = [name.strip() for name in value.split(',')
+                                if name.strip()]
+                unknown = set(self._fields) - \
+                    set(self.get_serializer_class().Meta.fields)
+                if unknown:
+                    raise ValidationError({'fields': [
+                        "Unknown field: {}".format(name)
+                        for name in sorted(unknown)]})
+        return self._fields
+
+    def get_serializer_class(self):
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        if renderer is not None and renderer.format == 'compact':
+            return serializers.CallCompactSerializer
+        return self.serializer_class
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_fields())
+        return super().get_serializer(*args, **kwargs)
+
     def get_queryset(self):
-        return Call.objects \
+        serializer_class = self.get_serializer_class()
+        fields = self.get_fields()
+
+        qs = Call.objects \
             .filter(agency=self.agency) \
-            .order_by('time_received') \
-            .select_related('district') \
-            .select_related('beat') \
-            .select_related('city') \
-            .select_related('priority') \
-            .select_related('call_source') \
-            .select_related('nature') \
-            .select_related('nature__nature_group') \
-            .select_related('close_code') \
-            .select_related('primary_unit') \
-            .select_related('first_dispatched') \
-            .select_related('reporting_unit')
-
-
-class APICallResponseTimeView(AgencyMixin, APIView):
-    """Powers response time dashboard."""
+            .order_by('time_received')
+
+        related = serializer_class.related(fields)
+        if related:
+            qs = qs.select_related(*related)
+        if fields is not None:
+            # Pages are ordered and cut by time received and id.
+            qs = qs.only('call_id', 'time_received',
+                         *serializer_class.model_fields(fields))
+        return qs
+
+
+class OverviewMixin(AgencyMixin):
+    """
+    Serves an overview's `to_dict()`, cached per agency data version and
+    filters. Requests that miss the cache are recorded in the filter usage
+    log.
+
+    A `sections` parameter (comma-separated, or repeated) limits the
+    response to the named sections of the overview, and `exact=1` counts
+    calls even where the count would otherwise be estimated.
+    """
+    overview_class = None
+
+    def get_sections(self, filters):
+        """
+        Remove the `sections` parameter from `filters`, returning the
+        section names it lists, or None if it wasn't given.
+        """
+        values = filters.pop('sections', None)
+        if values is None:
+            return None
+
+        sections = sorted({name.strip() for value in values
+                           for name in value.split(',') if name.strip()})
+        unknown = set(sections) - set(self.overview_class.section_names())
+        if unknown:
+            raise ValidationError({'sections': [
+                "Unknown section: {}".format(name)
+                for name in sorted(unknown)]})
+        return sections
+
+    def get_options(self, filters):
+        """
+        Remove the parameters that aren't filters from `filters`,
+        returning the attributes of the overview they set.
+        """
+        exact_count = wants_exact_count(filters)
+        filters.pop(EXACT_QUERY_PARAM, None)
+        return {'exact_count': exact_count}
 
     def get(self, request, format=None):
-        overview = CallResponseTimeOverview(self.agency, filters=request.GET)
-        return Response(overview.to_dict())
+        filters = request.GET.copy()
+        sections = self.get_sections(filters)
+        options = self.get_options(filters)
+
+        cache_data = filters.copy()
+        if sections is not None:
+            cache_data['sections'] = ','.join(sections)
+        for name, value in sorted(options.items()):
+            if value:
+                cache_data[name] = str(value)
 
+        def compute():
+            log_filter_usage(self.overview_class.filter_set_class,
+                             self.agency, filters)
+            overview = self.overview_class(self.agency, filters=filters)
+            for name, value in options.items():
+                setattr(overview, name, value)
+            return overview.to_dict(sections=sections)
+
+        return Response(cached_summary(self.overview_class.__name__,
+                                       self.agency, cache_data, compute))
+
+
+class APICallResponseTimeView(OverviewMixin, APIView):
+    """Powers response time dashboard."""
+    overview_class = CallResponseTimeOverview
 
-class APICallVolumeView(AgencyMixin, APIView):
+
+class APICallVolumeView(OverviewMixin, APIView):
     """Powers call volume dashboard."""
+    overview_class = CallVolumeOverview
 
-    def get(self, request, format=None):
-        overview = CallVolumeOverview(self.agency, filters=request.GET)
-        return Response(overview.to_dict())
 
+class APICallMapView(OverviewMixin, APIView):
+    """
+    Powers the call map. `bbox` (west, south, east, north) and `zoom`
+    describe the part of the map in view; see core.geo.
+    """
+    overview_class = CallMapOverview
+
+    def get_options(self, filters):
+        options = super().get_options(filters)
+        errors = {}
+        try:
+            zoom = parse_zoom(filters.pop('zoom', [None])[-1])
+        except ValueError:
+            errors['zoom'] = ["Must be a whole number."]
+        try:
+            bbox = parse_bbox(filters.pop('bbox', [None])[-1])
+        except ValueError:
+            errors['bbox'] = ["Must be west, south, east and north, "
+                              "separated by commas."]
+        if errors:
+            raise ValidationError(errors)
 
-class APICallMapView(AgencyMixin, APIView):
+        options['map_view'] = MapView(zoom=zoom, bbox=bbox)
+        return options
 
-    def get(self, request, format=None):
-        overview = CallMapOverview(self.agency, filters=request.GET)
-        return Response(overview.to_dict())
+
+class APICallTileView(AgencyMixin, APIView):
+    """
+    Mapbox Vector Tiles of the calls matching the filters; see core.tiles.
+    Tiles are cached per agency data version, and their ETags change with
+    it.
+    """
+
+    def get(self, request, z, x, y, format=None):
+        z, x, y = int(z), int(x), int(y)
+        if not tile_exists(z, x, y):
+            raise NotFound("No such tile.")
+
+        filters = request.GET.copy()
+        cache_data = filters.copy()
+        cache_data.update({'z': z, 'x': x, 'y': y})
+
+        def compute():
+            filter_set = CallFilterSet(
+                data=filters, queryset=Call.objects.filter(agency=self.agency),
+                strict_mode=StrictMode.fail)
+            try:
+                queryset = filter_set.filter()
+            except DjangoValidationError as e:
+                raise ValidationError({'filters': e.messages})
+            log_filter_usage(CallFilterSet, self.agency, filters)
+            return call_tile(queryset, z, x, y)
+
+        tile = cached_summary('CallTile', self.agency, cache_data, compute)
+        return HttpResponse(tile, content_type=TILE_CONTENT_TYPE)
+
+
+class ExportJobListView(APIView):
+    """
+    Submits a background export of the calls matching the filters in the
+    query string; see core.export_jobs. `file_format` is csv (the
+    default), parquet or arrow. Answers with the job, which can be polled
+    at the URL in the Location header until it has a `download_url`.
+    """
+
+    def post(self, request, agency_code, format=None):
+        agency = get_object_or_404(Agency, code=agency_code)
+        if not export_jobs_enabled():
+            raise NotFound("Export jobs are disabled.")
+
+        filters = request.query_params.copy()
+        filters.pop(api_settings.URL_FORMAT_OVERRIDE, None)
+        file_format = filters.pop('file_format', ['csv'])[-1]
+        if file_format not in dict(ExportJob.FORMAT_CHOICES):
+            raise ValidationError({'file_format': [
+                "Unknown format: {}".format(file_format)]})
+        if file_format in COLUMNAR_FORMATS and \
+                not columnar_exports_available():
+            raise ValidationError({'file_format': [
+                "Parquet and Arrow exports need pyarrow."]})
+
+        filter_set = CallFilterSet(data=filters,
+                                   queryset=Call.objects.filter(agency=agency),
+                                   strict_mode=StrictMode.fail)
+        try:
+            filter_set.filter()
+        except DjangoValidationError as e:
+            raise ValidationError({'filters': e.messages})
+
+        job = ExportJob.objects.create(agency=agency, file_format=file_format,
+                                       query=normalize_filters(filters))
+        url = reverse('export_job', kwargs={'agency_code': agency.code,
+                                            'export_job_id': job.pk})
+        serializer = serializers.ExportJobSerializer(
+            job, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED,
+                        headers={'Location': request.build_absolute_uri(url)})
+
+
+class ExportJobView(APIView):
+    """The status and progress of an export job."""
+
+    def get(self, request, agency_code, export_job_id, format=None):
+        job = get_object_or_404(ExportJob.objects.select_related('agency'),
+                                agency__code=agency_code, pk=export_job_id)
+        serializer = serializers.ExportJobSerializer(
+            job, context={'request': request})
+        return Response(serializer.data)
@@ -1,23 +1,41 @@
-import itertools
 import csv
-from io import StringIO
+import os
 
 from django.conf import settings
 from django.core.urlresolvers import reverse
-from django.http import StreamingHttpResponse
+from django.http import FileResponse, Http404, HttpResponse, \
+    StreamingHttpResponse
 from django.shortcuts import render_to_response, get_object_or_404, redirect
+from django.utils.http import http_date, quote_etag
 from django.views.generic import View
 from url_filter.filtersets import StrictMode
 
 from core import models
-from core.models import Call, Agency
+from core.dimensions import DIMENSION_MODELS, dimension_choices
+from core.export_jobs import UnsatisfiableRange, byte_range, job_path, \
+    read_range
+from core.exports import columnar_exports_available, copy_sql, \
+    stream_columnar, stream_copy
+from core.models import Call, Agency, ExportJob
+from core.shifts import shift_choices
 from core.serializers import CallExportSerializer
 from ..filters import CallFilterSet
 
 
-def build_filter(filter_set):
+def agency_options(field_name, agency_id):
+    """The options for a filter whose choices depend on the agency."""
+    if field_name == 'shift':
+        return [[row['id'], row['name']] for row in shift_choices(agency_id)]
+    raise ValueError("No options for {}".format(field_name))
+
+
+def build_filter(filter_set, agency=None):
     fields = filter_set.definition
-    out = {"fields": [f for f in fields if not f['name'] == 'call']}
+    agency_id = agency.pk if agency is not None else None
+    out = {"fields": [
+        dict(f, options=agency_options(f['name'], agency_id))
+        if f.get('agency_options') else f
+        for f in fields if not f['name'] == 'call']}
     refs = {}
 
     for field in fields:
@@ -28,6 +46,13 @@ def build_filter(filter_set):
             if field['rel'] == 'Call':
                 continue
 
+            if field['rel'] in DIMENSION_MODELS:
+                refs[field['rel']] = [
+                    (row['id'], row['name']) for row in
+                    sorted(dimension_choices(field['rel']),
+                           key=lambda row: row['name'])]
+                continue
+
             model = getattr(models, field['rel'])
             pk_name = model._meta.pk.name
             refs[field['rel']] = list(
@@ -64,7 +89,8 @@ class ViewWithAgencies(View):
         context = kwargs.copy()
         context.update({
             'agency': self.agency,
-            'agencies': self.agencies
+            'agencies': self.agencies,
+            'columnar_exports': columnar_exports_available(),
         })
         return context
 
@@ -85,7 +111,8 @@ class CallListView(ViewWithAgencies):
         return render_to_response("dashboard.html",
                                   self.get_context(
                                       asset_chunk="call_list",
-                                      form=build_filter(CallFilterSet)))
+                                      form=build_filter(CallFilterSet,
+                                                        self.agency)))
 
 
 class CallVolumeView(ViewWithAgencies):
@@ -94,7 +121,8 @@ class CallVolumeView(ViewWithAgencies):
         return render_to_response("dashboard.html",
                                   self.get_context(
                                       asset_chunk="call_volume",
-                                      form=build_filter(CallFilterSet)))
+                                      form=build_filter(CallFilterSet,
+                                                        self.agency)))
 
 
 class ResponseTimeView(ViewWithAgencies):
@@ -103,7 +131,8 @@ class ResponseTimeView(ViewWithAgencies):
         return render_to_response("dashboard.html",
                                   self.get_context(
                                       asset_chunk="response_time",
-                                      form=build_filter(CallFilterSet)))
+                                      form=build_filter(CallFilterSet,
+                                                        self.agency)))
 
 
 class MapView(ViewWithAgencies):
@@ -112,7 +141,8 @@ class MapView(ViewWithAgencies):
         return render_to_response("dashboard.html",
                                   self.get_context(
                                       asset_chunk="call_map",
-                                      form=build_filter(CallFilterSet)))
+                                      form=build_filter(CallFilterSet,
+                                                        self.agency)))
 
 
 class Echo(object):
@@ -143,90 +173,92 @@ class CSVIterator:
 class CallExportView(ViewWithAgencies):
 
     def get(self, request, *args, **kwargs):
-        qs = Call.objects \
-            .select_related('district') \
-            .select_related('beat') \
-            .select_related('city') \
-            .select_related('priority') \
-            .select_related('call_source') \
-            .select_related('nature') \
-            .select_related('nature__nature_group') \
-            .select_related('close_code') \
-            .select_related('primary_unit') \
-            .select_related('first_dispatched') \
-            .select_related('reporting_unit')
-
         filter_set = CallFilterSet(data=request.GET,
-                                   queryset=qs,
+                                   queryset=Call.objects.all(),
                                    strict_mode=StrictMode.fail)
 
-        fields = [
-            'call_id',
-            'case_id',
-            'cancelled',
-            'report_only',
-            'priority',
-            'call_source',
-            'nature',
-            'nature_group',
-            'close_code',
-
-            'time_received',
-            'month_received',
-            'week_received',
-            'dow_received',
-            'hour_received',
-
-            'time_routed',
-            'time_finished',
-            'first_unit_dispatch',
-            'first_unit_enroute',
-            'first_unit_arrive',
-            'first_unit_transport',
-            'last_unit_clear',
-            'time_closed',
-            'officer_response_time',
-            'overall_response_time',
-
-            'district',
-            'beat',
-            'business',
-            'street_address',
-            'city',
-            'zip_code',
-            'geox',
-            'geoy',
-
-            'primary_unit',
-            'first_dispatched',
-            'reporting_unit',
-        ]
-
-        def grouper(n, iterable):
-            it = iter(iterable)
-            while True:
-                chunk = tuple(itertools.islice(it, n))
-                if not chunk:
-                    return
-                yield chunk
-
-        def data():
-            csvfile = StringIO()
-            csvwriter = csv.DictWriter(csvfile, fieldnames=fields)
-            csvwriter.writerow(dict(zip(fields, fields)))
-            yield csvfile.getvalue()
-
-            for records in grouper(2000, filter_set.filter().iterator()):
-                csvfile = StringIO()
-                csvwriter = csv.DictWriter(csvfile, fieldnames=fields)
-                serializer = CallExportSerializer(records, many=True)
-
-                for record in serializer.data:
-                    csvwriter.writerow(record)
-
-                yield csvfile.getvalue()
-
-        response = StreamingHttpResponse(data(), content_type='text/csv')
+        sql = copy_sql(filter_set.filter())
+        response = StreamingHttpResponse(stream_copy(sql),
+                                         content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="calls.csv"'
 
         return response
+
+
+class CallColumnarExportView(ViewWithAgencies):
+    """Exports calls as Parquet or Arrow; see core.exports."""
+
+    content_types = {
+        'parquet': 'application/octet-stream',
+        'arrow': 'application/vnd.apache.arrow.file',
+    }
+
+    def get(self, request, format, *args, **kwargs):
+        if not columnar_exports_available():
+            raise Http404("Parquet and Arrow exports need pyarrow.")
+
+        filter_set = CallFilterSet(data=request.GET,
+                                   queryset=Call.objects.all(),
+                                   strict_mode=StrictMode.fail)
+
+        response = StreamingHttpResponse(
+            stream_columnar(filter_set.filter(), format),
+            content_type=self.content_types[format])
+        response['Content-Disposition'] = \
+            'attachment; filename="calls.{}"'.format(format)
+
+        return response
+
+
+class ExportJobDownloadView(ViewWithAgencies):
+    """
+    Serves a finished export job's file; see core.export_jobs. A single
+    byte range can be requested, with If-Range, to resume a download.
+    """
+
+    content_types = dict(CallColumnarExportView.content_types, csv='text/csv')
+
+    def get(self, request, export_job_id, *args, **kwargs):
+        job = get_object_or_404(ExportJob, agency=self.agency,
+                                pk=export_job_id, status=ExportJob.FINISHED)
+        path = job_path(job)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise Http404("The export's file has been removed.")
+
+        size = stat.st_size
+        etag = quote_etag('{}-{}-{}'.format(job.pk, size, int(stat.st_mtime)))
+        last_modified = http_date(stat.st_mtime)
+
+        # A range is only for the file the client already has part of.
+        bytes_range = None
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range or if_range in (etag, last_modified):
+            try:
+                bytes_range = byte_range(request.META.get('HTTP_RANGE'), size)
+            except UnsatisfiableRange:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */{}'.format(size)
+                return response
+
+        content_type = self.content_types[job.file_format]
+        if bytes_range is None:
+            response = FileResponse(open(path, 'rb'),
+                                    content_type=content_type)
+            response['Content-Length'] = size
+        else:
+            first, last = bytes_range
+            response = StreamingHttpResponse(read_range(path, first, last),
+                                             status=206,
+                                             content_type=content_type)
+            response['Content-Range'] = 'bytes {}-{}/{}'.format(first, last,
+                                                                size)
+            response['Content-Length'] = last - first + 1
+
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Last-Modified'] = last_modified
+        response['Content-Disposition'] = \
+            'attachment; filename="{}"'.format(job.filename)
+        return response
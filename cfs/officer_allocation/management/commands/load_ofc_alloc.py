@@ -4,8 +4,12 @@ import pandas as pd
 from django.core.management import call_command
 from django.core.management.base import BaseCommand
 
+from core.columnar import refresh_column_store
+from core.dimensions import invalidate_dimensions
+from core.partitions import ensure_partitions
 from core.models import (Call, CallLog, Transaction, CallUnit, ShiftUnit, Shift,
-                         Agency, update_materialized_views, Department)
+                         Agency, update_materialized_views, Department,
+                         bump_data_version)
 from officer_allocation.models import (OfficerActivityType)
 
 def isnan(x):
@@ -79,14 +83,21 @@ class Command(BaseCommand):
         self.create_departments()
         self.create_units()
 
+        ensure_partitions('call_log', self.call_log['Timestamp'].dropna())
         self.create_call_log(ignore_unmatched=options['ignore_unmatched_call_log'])
         self.create_shifts()
 
         self.create_officer_activity_types()
+        invalidate_dimensions()
 
         if not options['skip_view_refresh']:
             self.log("Updating materialized views")
-            update_materialized_views()
+            update_materialized_views(bump_versions=False)
+
+        bump_data_version(self.agency)
+        # No calls changed, so this just carries the column store forward to
+        # the new data version.
+        refresh_column_store(self.agency)
 
     def create_transactions(self):
         self.log("Creating transactions")
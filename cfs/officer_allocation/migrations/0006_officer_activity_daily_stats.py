@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+
+from django.db import migrations, models
+import django.db.models.deletion
+import core.models
+
+base_dir = os.path.realpath(os.path.dirname(__file__))
+
+def sql_path(filename):
+    return os.path.join(base_dir, "sql", filename)
+
+with open(sql_path("officer_activity_daily_stats.sql")) as f:
+    daily_stats_sql = f.read()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0056_call_daily_stats'),
+        ('officer_allocation', '0005_update_generalized_officer_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfficerActivityDailyStats',
+            fields=[
+                ('officer_activity_daily_stats_id', models.IntegerField(serialize=False, primary_key=True)),
+                ('day', models.DateField()),
+                ('row_count', models.IntegerField()),
+                ('min_time', core.models.DateTimeNoTZField()),
+                ('max_time', core.models.DateTimeNoTZField()),
+                ('agency', models.ForeignKey(related_name='+', blank=True, null=True, to='core.Agency', on_delete=django.db.models.deletion.DO_NOTHING)),
+            ],
+            options={
+                'db_table': 'officer_activity_daily_stats',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(daily_stats_sql,
+                          "DROP MATERIALIZED VIEW IF EXISTS officer_activity_daily_stats;"),
+    ]
@@ -0,0 +1,31 @@
+/*
+The number of discrete officer activity samples for each agency on each day,
+with the first and last sample time that day.
+
+Officer allocation requests that only filter by date take their bounds from
+this view rather than scanning discrete_officer_activity. Refresh it after
+refreshing discrete_officer_activity.
+*/
+
+DROP MATERIALIZED VIEW IF EXISTS officer_activity_daily_stats;
+
+CREATE MATERIALIZED VIEW officer_activity_daily_stats AS
+SELECT
+  ROW_NUMBER() OVER (ORDER BY agency_id, day) AS officer_activity_daily_stats_id,
+  stats.*
+FROM (
+  SELECT
+    cu.agency_id,
+    doa.time_::date AS day,
+    COUNT(*) AS row_count,
+    MIN(doa.time_) AS min_time,
+    MAX(doa.time_) AS max_time
+  FROM discrete_officer_activity doa
+    INNER JOIN call_unit cu ON cu.call_unit_id = doa.call_unit_id
+  GROUP BY
+    cu.agency_id,
+    doa.time_::date
+) stats;
+
+CREATE UNIQUE INDEX oads_officer_activity_daily_stats_id_ndx ON officer_activity_daily_stats (officer_activity_daily_stats_id);
+CREATE INDEX oads_agency_day_ndx ON officer_activity_daily_stats (agency_id, day);
@@ -1,7 +1,8 @@
 from django.db import models
 from django.db import connection
-from pg.view import MaterializedView
-from core.models import DateTimeNoTZField, Call, CallUnit, ModelWithDescr, Shift
+from pg.view import MaterializedView, ViewManager
+from core.models import DateTimeNoTZField, Call, CallUnit, ModelWithDescr, \
+    Shift, DailyStatsQuerySet
 
 
 class OfficerActivity(MaterializedView):
@@ -36,6 +37,31 @@ class OfficerActivity(MaterializedView):
                 "REFRESH MATERIALIZED VIEW discrete_officer_activity")
 
 
+class OfficerActivityDailyStats(MaterializedView):
+    """
+    The number of discrete officer activity samples for each agency each
+    day, and the first and last sample time.
+    """
+    objects = ViewManager.from_queryset(DailyStatsQuerySet)()
+
+    officer_activity_daily_stats_id = models.IntegerField(primary_key=True)
+    agency = models.ForeignKey('core.Agency', blank=True, null=True,
+                               related_name="+",
+                               on_delete=models.DO_NOTHING)
+    day = models.DateField()
+    row_count = models.IntegerField()
+    min_time = DateTimeNoTZField()
+    max_time = DateTimeNoTZField()
+
+    class Meta:
+        db_table = 'officer_activity_daily_stats'
+        managed = False
+
+    @classmethod
+    def dependencies(cls):
+        return [OfficerActivity]
+
+
 class OfficerActivityType(ModelWithDescr):
     officer_activity_type_id = models.AutoField(primary_key=True)
 
@@ -1,22 +1,39 @@
-from collections import Counter
+from collections import Counter, OrderedDict
 from datetime import timedelta
+from operator import attrgetter, methodcaller
 
+from django.conf import settings
 from django.db import connection
 from django.db.models import Min, Max, Count
+from django.utils.functional import cached_property
 
+from core.filters import date_range_filter
+from core.summaries import Overview
 from officer_allocation.filters import OfficerActivityFilterSet
-from officer_allocation.models import OfficerActivity, OfficerActivityType
+from officer_allocation.models import OfficerActivity, OfficerActivityType, \
+    OfficerActivityDailyStats
 
 
-class OfficerActivityOverview:
+class OfficerActivityOverview(Overview):
+    filter_set_class = OfficerActivityFilterSet
+
+    sections = OrderedDict([
+        ('filter', attrgetter('filter.data')),
+        ('bounds', attrgetter('bounds')),
+        ('allocation_over_time', methodcaller('allocation_over_time')),
+        # Not using these on the front-end anymore
+        # ('on_duty_by_beat', methodcaller('on_duty_by_beat')),
+        # ('on_duty_by_district', methodcaller('on_duty_by_district')),
+    ])
+
+    shared_properties = {'bounds': ('bounds', 'allocation_over_time')}
 
     def __init__(self, agency, filters):
+        self.agency = agency
         self._filters = filters
-        self.filter = OfficerActivityFilterSet(
+        self.filter = self.filter_set_class(
             data=filters,
             queryset=OfficerActivity.objects.filter(call_unit__agency=agency))
-        self.bounds = self.qs.aggregate(min_time=Min('time'),
-                                        max_time=Max('time'))
 
         # The interval between discrete time samples in the database
         # in secondes
@@ -26,6 +43,20 @@ class OfficerActivityOverview:
     def qs(self):
         return self.filter.filter()
 
+    @cached_property
+    def bounds(self):
+        return self.get_bounds()
+
+    def get_bounds(self):
+        if settings.USE_DAILY_STATS:
+            days = date_range_filter(self.filter.get_specs(), 'time')
+            if days is not None:
+                return OfficerActivityDailyStats.objects \
+                    .filter(agency=self.agency) \
+                    .bounds(*days)
+
+        return self.qs.aggregate(min_time=Min('time'), max_time=Max('time'))
+
     def round_datetime(self, d, decimals=-1):
         """
         Round the given date time to the given decimal precision (defaults to
@@ -217,16 +248,6 @@ class OfficerActivityOverview:
 
         return results
 
-    def to_dict(self):
-        return {
-            'filter': self.filter.data,
-            'bounds': self.bounds,
-            'allocation_over_time': self.allocation_over_time(),
-            # Not using these on the front-end anymore
-            # 'on_duty_by_beat': self.on_duty_by_beat(),
-            # 'on_duty_by_district': self.on_duty_by_district(),
-        }
-
 
 def dictfetchall(cursor):
     "Returns all rows from a cursor as a dict"
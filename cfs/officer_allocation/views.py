@@ -1,25 +1,19 @@
-from django.shortcuts import render, render_to_response, get_object_or_404
+from django.shortcuts import render, render_to_response
 
 # Create your views here.
 from django.views.generic import View
-from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from core import models
-from core.models import Agency
-from core.views import ViewWithAgencies
+from core.dimensions import dimension_filter, dimension_rows
+from core.views import ViewWithAgencies, OverviewMixin
 from core.views import build_filter
 from officer_allocation.filters import OfficerActivityFilterSet
 from officer_allocation.summaries import OfficerActivityOverview
 
 
-class APIOfficerAllocationView(APIView):
+class APIOfficerAllocationView(OverviewMixin, APIView):
     """Powers officer allocation dashboard."""
-
-    def get(self, request, agency_code, format=None):
-        self.agency = get_object_or_404(Agency, code=agency_code)
-        overview = OfficerActivityOverview(self.agency, request.GET)
-        return Response(overview.to_dict())
+    overview_class = OfficerActivityOverview
 
 
 class OfficerAllocationDashboardView(ViewWithAgencies):
@@ -29,11 +23,14 @@ class OfficerAllocationDashboardView(ViewWithAgencies):
 
         # We want only the values of CallUnit where squad isn't null.
         # We don't want to show a bunch of bogus units for filtering.
-        filter_obj['refs']['CallUnit'] = list(
-            models.CallUnit.objects
-            .filter(district__agency=self.agency, squad__isnull=False)
-            .order_by('descr')
-            .values_list('call_unit_id', 'descr'))
+        district_ids = {row['district_id'] for row in
+                        dimension_filter('District', agency_id=self.agency.pk)}
+        filter_obj['refs']['CallUnit'] = sorted(
+            ((row['call_unit_id'], row['descr'])
+             for row in dimension_rows('CallUnit')
+             if row['squad_id'] is not None and
+             row['district_id'] in district_ids),
+            key=lambda unit: unit[1])
 
         return render_to_response("officer_allocation.html",
                                   self.get_context(